@@ -1,81 +1,1455 @@
 # -*- coding: utf-8 -*-
 import os
-import math
 import datetime
 import json
-from flask import Flask, render_template, request, redirect, url_for, Response, flash
+import math
+import csv
+import hashlib
+import io
+import queue
+import subprocess
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from decimal import Decimal, ROUND_HALF_UP
+from functools import wraps
+import click
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, Response, flash, jsonify, abort, stream_with_context, send_from_directory, session
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, or_, and_, case, insert, select, update, delete, literal, event, text, column, DDL
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from config import Config, opcoes_engine
+from metricas import Metricas
+from consultas import GuardaConsultas, orcamento_consultas
+from ativos import Ativos, compilar_tailwind, construir_ativos
+from pdf import FilaPdf, FilaCheia, LinhasDemais, VERSAO_LAYOUT, pdf_disponivel
 
 # --- Configuração do Flask e Extensões ---
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'uma-chave-secreta-muito-segura-e-dificil-de-adivinhar'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-bcrypt = Bcrypt(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
+db = SQLAlchemy()
+bcrypt = Bcrypt()
+login_manager = LoginManager()
+metricas = Metricas()
+guarda_consultas = GuardaConsultas()
+ativos = Ativos()
+login_manager.login_view = 'main.login'
 login_manager.login_message = "Por favor, faça o login para acessar esta página."
 login_manager.login_message_category = "info"
 
-# --- Modelos do Banco de Dados ---
+bp = Blueprint('main', __name__, cli_group=None)
+
+def configurar_sqlite(engine, config):
+    # WAL permite leituras simultâneas a uma escrita; busy_timeout faz a conexão esperar
+    # pelo lock em vez de falhar com "database is locked"; synchronous=NORMAL é seguro em WAL.
+    @event.listens_for(engine, 'connect')
+    def _aplicar_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        cursor.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+        cursor.close()
+
+def create_app(config=None, migracoes=True):
+    """Cria a aplicação. O gunicorn usa `migracoes=False`: o Flask-Migrate (e o Alembic) só
+    servem aos comandos `flask db` e não precisam de ser importados em cada worker."""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', opcoes_engine(app.config))
+    # Tem de ser definido antes do primeiro acesso a app.jinja_env (feito pelo blueprint).
+    if app.config['JINJA_CACHE_BYTECODE']:
+        pasta_cache = os.path.join(app.instance_path, 'cache_jinja')
+        os.makedirs(pasta_cache, exist_ok=True)
+        app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(pasta_cache)}
+
+    cache_usuarios.configurar(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+    cache_catalogo.configurar(app.config['CATALOGO_VERIFICAR_SEGUNDOS'])
+    cache_folha.configurar(app.config['FOLHA_CACHE_SIZE'])
+    limite_bcrypt.configurar(app.config['BCRYPT_SIMULTANEOS'])
+    fila_pdf.configurar(app.config['PDF_PROCESSOS'], app.config['PDF_FILA'], app.config['PDF_ESPERA_SEGUNDOS'])
+    limite_login_usuario.configurar(app.config['LOGIN_MAX_TENTATIVAS_USUARIO'], app.config['LOGIN_JANELA_SEGUNDOS'])
+    limite_login_ip.configurar(app.config['LOGIN_MAX_TENTATIVAS_IP'], app.config['LOGIN_JANELA_SEGUNDOS'])
+    db.init_app(app)
+    if migracoes:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    bcrypt.init_app(app)
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        with app.app_context():
+            configurar_sqlite(db.engine, app.config)
+    metricas.init_app(app, db)
+    guarda_consultas.init_app(app, db)
+    ativos.init_app(app)
+    cache_relatorios.configurar(app.config['RELATORIO_CACHE_BYTES'],
+                                os.path.join(app.instance_path, 'cache_relatorios') if app.config['RELATORIO_CACHE_DISCO'] else None,
+                                versao_templates(app))
+    if app.config['TEMPLATES_PRE_COMPILAR']:
+        pre_compilar_templates(app)
+    if app.config['PROXY_SALTOS']:
+        # Atrás de um proxy reverso, request.remote_addr seria o do proxy para todos os clientes
+        # (e o limite de logins por IP bloquearia toda a gente de uma vez).
+        saltos = app.config['PROXY_SALTOS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=saltos, x_proto=saltos, x_host=saltos)
+    if app.config['ARQUIVAMENTO_RETOMAR'] and not app.config['ARQUIVAMENTO_SINCRONO']:
+        app.before_request(fila_arquivamento.retomar_no_primeiro_pedido)
+    return app
+
+def pre_compilar_templates(app):
+    """Compila todos os templates no arranque do worker, para que o primeiro pedido a cada
+    página não pague a compilação. Com o cache de bytecode só o primeiro worker após uma
+    alteração compila de facto; os outros carregam o código já gerado de instance/cache_jinja."""
+    for nome in app.jinja_env.list_templates():
+        app.jinja_env.get_template(nome)
+
+# --- Cache de Identidades de Utilizador ---
+# O user_loader corre em todos os pedidos autenticados. Em vez de carregar o modelo User
+# a cada vez, guardamos por alguns segundos apenas o que as rotas precisam (id, nome e
+# perfil) num LRU por processo. Alterações de senha ou de perfil invalidam a entrada;
+# nos outros workers ela expira pelo TTL.
+class IdentidadeUsuario(UserMixin):
+    def __init__(self, id, username, is_admin):
+        self.id = id
+        self.username = username
+        self.is_admin = is_admin
+
+class CacheUsuarios:
+    def __init__(self, tamanho_maximo=1024, ttl=60):
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.configurar(tamanho_maximo, ttl)
+
+    def configurar(self, tamanho_maximo, ttl):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+
+    def obter(self, user_id):
+        with self._lock:
+            entrada = self._entradas.get(user_id)
+            if entrada is None:
+                return None
+            expira_em, identidade = entrada
+            if expira_em < time.monotonic():
+                del self._entradas[user_id]
+                return None
+            self._entradas.move_to_end(user_id)
+            return identidade
+
+    def guardar(self, identidade):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entradas[identidade.id] = (time.monotonic() + self.ttl, identidade)
+            self._entradas.move_to_end(identidade.id)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(user_id, None)
+
+cache_usuarios = CacheUsuarios()
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    identidade = cache_usuarios.obter(user_id)
+    if identidade is None:
+        linha = db.session.execute(select(User.id, User.username, User.is_admin).where(User.id == user_id)).first()
+        if linha is None:
+            return None
+        identidade = IdentidadeUsuario(*linha)
+        cache_usuarios.guardar(identidade)
+    return identidade
+
+# --- Hash de Senhas e Limite de Tentativas de Login ---
+# O bcrypt é propositadamente lento (~250ms no custo 12) e corre na própria thread do pedido
+# (liberta o GIL). Um semáforo por processo limita os hashes simultâneos a BCRYPT_SIMULTANEOS,
+# por omissão uma thread a menos que as do worker do gunicorn: uma rajada de logins deixa
+# sempre uma thread livre para o resto do tráfego. Sem vaga, o pedido é recusado na hora (503).
+class ServidorOcupado(RuntimeError):
+    pass
+
+class LimiteBcrypt:
+    def __init__(self, simultaneos=1):
+        self.configurar(simultaneos)
+
+    def configurar(self, simultaneos):
+        self._vagas = threading.BoundedSemaphore(max(simultaneos, 1))
+
+    def executar(self, funcao, *args):
+        if not self._vagas.acquire(blocking=False):
+            raise ServidorOcupado()
+        try:
+            return funcao(*args)
+        finally:
+            self._vagas.release()
+
+limite_bcrypt = LimiteBcrypt()
+
+class LimiteTentativas:
+    # Janela deslizante em memória, por processo: com N workers o limite efetivo
+    # pode chegar a N vezes o configurado, o que é suficiente contra rajadas.
+    def __init__(self, maximo=5, janela=300):
+        self._tentativas = {}
+        self._lock = threading.Lock()
+        self.configurar(maximo, janela)
+
+    def configurar(self, maximo, janela):
+        self.maximo = maximo
+        self.janela = janela
+
+    def _recentes(self, chave, agora):
+        tentativas = self._tentativas.get(chave)
+        if tentativas is None:
+            return None
+        while tentativas and tentativas[0] <= agora - self.janela:
+            tentativas.popleft()
+        if not tentativas:
+            del self._tentativas[chave]
+            return None
+        return tentativas
+
+    def bloqueado(self, chave):
+        with self._lock:
+            tentativas = self._recentes(chave, time.monotonic())
+            return tentativas is not None and len(tentativas) >= self.maximo
+
+    def registrar_falha(self, chave):
+        with self._lock:
+            agora = time.monotonic()
+            tentativas = self._recentes(chave, agora)
+            if tentativas is None:
+                tentativas = self._tentativas[chave] = deque()
+            tentativas.append(agora)
+
+    def limpar(self, chave):
+        with self._lock:
+            self._tentativas.pop(chave, None)
+
+limite_login_usuario = LimiteTentativas()
+limite_login_ip = LimiteTentativas()
+
+# --- Modelos do Banco de Dados ---
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
     password_hash = db.Column(db.String(150), nullable=False)
+    is_admin = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Incrementada sempre que as instalações ou relatórios do técnico mudam (ver marcar_dados_alterados).
+    versao_dados = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     instalacoes = db.relationship('Instalacao', backref='author', lazy=True)
     relatorios = db.relationship('RelatorioHistorico', backref='author', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = limite_bcrypt.executar(bcrypt.generate_password_hash, password).decode('utf-8')
+        if self.id is not None:
+            cache_usuarios.invalidar(self.id)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return limite_bcrypt.executar(bcrypt.check_password_hash, self.password_hash, password)
+
+    def precisa_rehash(self):
+        # O hash tem o formato $2b$<custo>$..., por isso o custo usado está no próprio hash.
+        try:
+            custo_atual = int(self.password_hash.split('$')[2])
+        except (IndexError, ValueError):
+            return True
+        return custo_atual != current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
 
 class Instalacao(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     tipo_combo = db.Column(db.String(50), nullable=False)
     descricao_combo = db.Column(db.String(100), nullable=False)
-    valor_original = db.Column(db.Float, nullable=False)
-    valor_arredondado = db.Column(db.Float, nullable=False)
+    # Valores monetários em centavos inteiros (ver "Valores em centavos"). O valor do combo fica
+    # vazio nas instalações vindas de relatórios antigos, que não o guardavam.
+    valor_original_centavos = db.Column(db.Integer, nullable=True)
+    valor_arredondado_centavos = db.Column(db.Integer, nullable=True)
     login_cliente = db.Column(db.String(100), nullable=False)
-    data_instalacao = db.Column(db.String(20), nullable=False)
+    data_instalacao = db.Column(db.Date, nullable=False)
     porcentagem_comissao = db.Column(db.Float, nullable=False, default=15.0)
-    comissao = db.Column(db.Float, nullable=False)
+    comissao_centavos = db.Column(db.Integer, nullable=False)
     observacoes = db.Column(db.String(300), nullable=True)
     data_registro = db.Column(db.DateTime, default=datetime.datetime.now)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    catalogo_versao_id = db.Column(db.Integer, db.ForeignKey('catalogo_versao.id'), nullable=True)
+    # Identificador gerado pela PWA para registos feitos offline; torna o reenvio idempotente.
+    id_cliente = db.Column(db.String(36), nullable=True)
+    # Período (relatório) em que a instalação foi fechada; vazio enquanto está aberta.
+    relatorio_id = db.Column(db.Integer, db.ForeignKey('relatorio_historico.id'), nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'id_cliente', name='uq_instalacao_user_id_id_cliente'),
+        db.Index('ix_instalacao_user_id_data_instalacao', 'user_id', 'data_instalacao'),
+        # Índice parcial: o painel só lista as instalações abertas, que são uma fração da tabela.
+        db.Index('ix_instalacao_abertas_user_id_data_registro', 'user_id', 'data_registro',
+                 sqlite_where=db.text('relatorio_id IS NULL'), postgresql_where=db.text('relatorio_id IS NULL')),
+        db.Index('ix_instalacao_relatorio_id_data_instalacao', 'relatorio_id', 'data_instalacao'),
+        db.Index('ix_instalacao_data_instalacao', 'data_instalacao'),
+    )
 
 class RelatorioHistorico(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     data_inicio = db.Column(db.String(20), nullable=False)
     data_fim = db.Column(db.String(20), nullable=False)
-    total_comissoes = db.Column(db.Float, nullable=False)
+    total_comissoes_centavos = db.Column(db.Integer, nullable=False)
     num_instalacoes = db.Column(db.Integer, nullable=False)
     data_salva = db.Column(db.DateTime, default=datetime.datetime.now)
-    instalacoes_json = db.Column(db.String, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Fica False enquanto o fecho em segundo plano ainda está a marcar as linhas, ou depois de o
+    # período ser reaberto para correções (reaberto=True) até ser fechado de novo.
+    concluido = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    reaberto = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Incrementada a cada fecho; faz parte da chave do HTML em cache (ver resposta_relatorio_arquivado).
+    versao = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    instalacoes = db.relationship('Instalacao', backref='relatorio', lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_relatorio_historico_user_id_data_salva', 'user_id', 'data_salva'),
+    )
+
+    def contem_data(self, data):
+        return self.data_inicio <= data.isoformat() <= self.data_fim
+
+class ResumoDiario(db.Model):
+    # Totais acumulados por técnico e por dia de instalação, mantidos a cada inclusão,
+    # edição ou exclusão, para que os totais do painel e dos períodos somem dias e não linhas.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    data = db.Column(db.Date, primary_key=True)
+    total_comissoes_centavos = db.Column(db.Integer, nullable=False, default=0)
+    num_instalacoes = db.Column(db.Integer, nullable=False, default=0)
+
+class TarefaArquivamento(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    data_inicio = db.Column(db.Date, nullable=False)
+    data_fim = db.Column(db.Date, nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, em_andamento, concluida, erro
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processadas = db.Column(db.Integer, nullable=False, default=0)
+    relatorio_id = db.Column(db.Integer, db.ForeignKey('relatorio_historico.id'), nullable=True)
+    erro = db.Column(db.String(500), nullable=True)
+    data_criacao = db.Column(db.DateTime, default=datetime.datetime.now)
+    data_conclusao = db.Column(db.DateTime, nullable=True)
+    # Renovada a cada lote pelo worker que executa a tarefa; parada há mais de
+    # ARQUIVAMENTO_PRAZO_SEGUNDOS, a tarefa é retomada por outro worker.
+    atualizada_em = db.Column(db.DateTime, nullable=True)
+
+class CatalogoVersao(db.Model):
+    # Cada alteração de preços publica uma versão nova e completa do catálogo; as versões
+    # antigas nunca são alteradas, por isso podem ficar em cache pelo seu id.
+    id = db.Column(db.Integer, primary_key=True)
+    descricao = db.Column(db.String(200), nullable=True)
+    data_publicacao = db.Column(db.DateTime, default=datetime.datetime.now)
+
+class Combo(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    versao_id = db.Column(db.Integer, db.ForeignKey('catalogo_versao.id'), nullable=False, index=True)
+    tipo_combo = db.Column(db.String(50), nullable=False)
+    chave = db.Column(db.String(50), nullable=False)
+    descricao = db.Column(db.String(100), nullable=False)
+    preco_centavos = db.Column(db.Integer, nullable=False)
+    porcentagem_padrao = db.Column(db.Float, nullable=False, default=15.0)
 
-# --- Dicionário de Combos e Funções Auxiliares ---
-COMBOS = {
+    __table_args__ = (
+        db.UniqueConstraint('versao_id', 'tipo_combo', 'chave', name='uq_combo_versao_tipo_chave'),
+    )
+
+# --- Índice de Texto (SQLite FTS5) ---
+# Tabela FTS5 de conteúdo externo sobre instalacao (abertas e de períodos fechados), mantida
+# por triggers, para pesquisar por cliente, combo ou observações sem varrer a tabela. É criada
+# pelas migrações e, em bancos criados com db.create_all(), pelos eventos abaixo, que também a
+# apagam em db.drop_all() (senão o create_all seguinte falha com a tabela FTS já existente).
+# Noutros bancos a pesquisa usa LIKE.
+def ddl_indice_texto(tabela):
+    colunas = 'login_cliente, descricao_combo, observacoes'
+    novos = 'new.login_cliente, new.descricao_combo, new.observacoes'
+    antigos = 'old.login_cliente, old.descricao_combo, old.observacoes'
+    return [
+        f"CREATE VIRTUAL TABLE {tabela}_fts USING fts5({colunas}, content='{tabela}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {tabela}_fts_ai AFTER INSERT ON {tabela} BEGIN "
+        f"INSERT INTO {tabela}_fts(rowid, {colunas}) VALUES (new.id, {novos}); END",
+        f"CREATE TRIGGER {tabela}_fts_ad AFTER DELETE ON {tabela} BEGIN "
+        f"INSERT INTO {tabela}_fts({tabela}_fts, rowid, {colunas}) VALUES ('delete', old.id, {antigos}); END",
+        f"CREATE TRIGGER {tabela}_fts_au AFTER UPDATE OF {colunas} ON {tabela} BEGIN "
+        f"INSERT INTO {tabela}_fts({tabela}_fts, rowid, {colunas}) VALUES ('delete', old.id, {antigos}); "
+        f"INSERT INTO {tabela}_fts(rowid, {colunas}) VALUES (new.id, {novos}); END",
+    ]
+
+def ddl_apagar_indice_texto(tabela):
+    return [f"DROP TRIGGER IF EXISTS {tabela}_fts_{sufixo}" for sufixo in ('ai', 'ad', 'au')] + [f"DROP TABLE IF EXISTS {tabela}_fts"]
+
+for _instrucao in ddl_indice_texto(Instalacao.__tablename__):
+    event.listen(Instalacao.__table__, 'after_create', DDL(_instrucao).execute_if(dialect='sqlite'))
+for _instrucao in ddl_apagar_indice_texto(Instalacao.__tablename__):
+    event.listen(Instalacao.__table__, 'before_drop', DDL(_instrucao).execute_if(dialect='sqlite'))
+
+# --- Catálogo de Combos e Funções Auxiliares ---
+# Catálogo usado enquanto nenhuma versão tiver sido publicada no banco.
+COMBOS_PADRAO = {
     "CIDADE_FIBRA": { "300_MEGAS": {"preco": 99.90, "descricao": "300 MEGAS - CIDADE FIBRA ÓPTICA"}, "650_MEGAS": {"preco": 119.90, "descricao": "650 MEGAS - CIDADE FIBRA ÓPTICA"}, "800_MEGAS": {"preco": 139.90, "descricao": "800 MEGAS - CIDADE FIBRA ÓPTICA"}},
     "RURAL_FIBRA": { "300_MEGAS": {"preco": 109.90, "descricao": "300 MEGAS - RURAL FIBRA ÓPTICA"}, "650_MEGAS": {"preco": 129.90, "descricao": "650 MEGAS - RURAL FIBRA ÓPTICA"}, "800_MEGAS": {"preco": 149.90, "descricao": "800 MEGAS - RURAL FIBRA ÓPTICA"}},
     "RURAL_RADIO": { "4_MEGAS": {"preco": 109.90, "descricao": "4 MEGAS - RURAL VIA RÁDIO"}, "8_MEGAS": {"preco": 129.90, "descricao": "8 MEGAS - RURAL VIA RÁDIO"}, "14_MEGAS": {"preco": 159.90, "descricao": "14 MEGAS - RURAL VIA RÁDIO"}}
 }
 
-def arredondar_valor(valor):
-    return math.ceil(valor) if valor % 1 != 0 else valor
+class VersaoCatalogo:
+    def __init__(self, id, combos):
+        self.id = id
+        self.combos = combos
+        # Serializado uma única vez por versão, em vez de a cada renderização.
+        self.combos_json = json.dumps(combos)
+
+    def combo(self, tipo_combo, chave):
+        return self.combos.get(tipo_combo, {}).get(chave)
+
+class CacheCatalogo:
+    # Cada worker guarda a versão atual em memória e só pergunta ao banco qual é a versão
+    # mais recente a cada `intervalo` segundos; uma publicação noutro worker é assim
+    # vista por todos sem reinício.
+    def __init__(self, intervalo=5):
+        self._versao = None
+        self._verificado_em = 0.0
+        self._lock = threading.Lock()
+        self.configurar(intervalo)
+
+    def configurar(self, intervalo):
+        self.intervalo = intervalo
+
+    def atual(self):
+        if self._versao is not None and time.monotonic() - self._verificado_em < self.intervalo:
+            return self._versao
+        with self._lock:
+            versao_id = db.session.query(func.max(CatalogoVersao.id)).scalar()
+            if self._versao is None or self._versao.id != versao_id:
+                self._versao = carregar_versao_catalogo(versao_id)
+            self._verificado_em = time.monotonic()
+            return self._versao
+
+    def invalidar(self):
+        with self._lock:
+            self._versao = None
+
+cache_catalogo = CacheCatalogo()
+
+def carregar_versao_catalogo(versao_id):
+    if versao_id is None:
+        return VersaoCatalogo(None, {tipo: {chave: dict(combo, preco_centavos=para_centavos(combo['preco']), porcentagem=15.0) for chave, combo in combos.items()}
+                                     for tipo, combos in COMBOS_PADRAO.items()})
+    combos = {}
+    for combo in Combo.query.filter_by(versao_id=versao_id).order_by(Combo.id):
+        combos.setdefault(combo.tipo_combo, {})[combo.chave] = {'preco': para_reais(combo.preco_centavos), 'preco_centavos': combo.preco_centavos,
+                                                                'descricao': combo.descricao, 'porcentagem': combo.porcentagem_padrao}
+    return VersaoCatalogo(versao_id, combos)
+
+def publicar_catalogo(combos, descricao=None):
+    versao = CatalogoVersao(descricao=descricao)
+    db.session.add(versao)
+    db.session.flush()
+    for tipo_combo, combos_do_tipo in combos.items():
+        for chave, combo in combos_do_tipo.items():
+            db.session.add(Combo(versao_id=versao.id, tipo_combo=tipo_combo, chave=chave, descricao=combo['descricao'],
+                                 preco_centavos=para_centavos(combo['preco']), porcentagem_padrao=ler_porcentagem(combo.get('porcentagem', 15.0))))
+    db.session.commit()
+    cache_catalogo.invalidar()
+    return versao
+
+# --- Valores em centavos ---
+# Preços, comissões e totais são guardados em centavos inteiros, para que somas de milhares
+# de linhas sejam exatas. Só a percentagem continua decimal; o cálculo usa-a em pontos-base
+# (15% = 1500) e arredonda a comissão ao centavo (meio centavo para cima).
+def para_centavos(valor):
+    """Converte reais (número ou texto, com vírgula ou ponto) em centavos inteiros."""
+    return int((Decimal(str(valor).replace(',', '.')) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def para_reais(centavos):
+    return float(Decimal(centavos) / 100)
+
+@bp.app_template_filter('reais')
+def formatar_reais(centavos):
+    return f"{Decimal(centavos or 0) / 100:.2f}"
+
+def arredondar_centavos(centavos):
+    # Arredonda para cima até ao real inteiro (R$ 99,90 -> R$ 100,00).
+    return -(-centavos // 100) * 100
+
+def ler_porcentagem(valor):
+    """Lê a percentagem de comissão (número ou texto, com vírgula ou ponto). Recusa, com
+    ValueError, valores fora de 0 a 100 e os não finitos ('inf', '1e400', 'nan'), que não têm
+    conversão para pontos-base."""
+    try:
+        porcentagem = float(str(valor).replace(',', '.'))
+    except ValueError:
+        raise ValueError(f"Percentagem de comissão inválida: '{valor}'")
+    if not math.isfinite(porcentagem) or not 0 <= porcentagem <= 100:
+        raise ValueError(f"Percentagem de comissão inválida: '{valor}' (use um valor de 0 a 100)")
+    return porcentagem
+
+def pontos_base(porcentagem):
+    return int((Decimal(str(porcentagem)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def calcular_comissao_centavos(valor_arredondado_centavos, porcentagem):
+    return (valor_arredondado_centavos * pontos_base(porcentagem) + 5000) // 10000
+
+def registrar_no_resumo(user_id, data, comissao_centavos, quantidade=1):
+    # Use quantidade=-1 (e a comissão negativa) para retirar uma instalação do resumo.
+    resumo = db.session.get(ResumoDiario, (user_id, data))
+    if resumo is None:
+        resumo = ResumoDiario(user_id=user_id, data=data, total_comissoes_centavos=0, num_instalacoes=0)
+        db.session.add(resumo)
+    resumo.total_comissoes_centavos += comissao_centavos
+    resumo.num_instalacoes += quantidade
+    if resumo.num_instalacoes <= 0:
+        # Um resumo criado nesta mesma sessão ainda não existe no banco: basta retirá-lo.
+        if resumo in db.session.new:
+            db.session.expunge(resumo)
+        else:
+            db.session.delete(resumo)
+
+def registrar_diferencas_no_resumo(user_id, diferencas):
+    # `diferencas` é {data: (comissao_centavos, quantidade)}. Os resumos dos dias afetados são
+    # carregados numa só consulta e registrar_no_resumo encontra-os depois na sessão (a lista
+    # mantém-nos vivos: o identity map só guarda referências fracas).
+    datas = [data for data, (total, quantidade) in diferencas.items() if total or quantidade]
+    carregados = ResumoDiario.query.filter(ResumoDiario.user_id == user_id, ResumoDiario.data.in_(datas)).all() if datas else []
+    for data in datas:
+        registrar_no_resumo(user_id, data, *diferencas[data])
+
+class DiferencasTotais:
+    """Acumula as diferenças de uma ou mais alterações e aplica só o saldo de cada dia e de cada
+    relatório. Uma instalação aberta conta no resumo diário; uma de um período fechado (e
+    reaberto para correções) conta diretamente nos totais do relatório.
+
+    Editar a única instalação de um dia sem mudar a data dá saldo zero nesse dia: retirar e
+    voltar a somar a mesma linha em separado apagaria o resumo do dia pelo caminho."""
+
+    def __init__(self):
+        self.resumo = {}
+        self.relatorios = {}
+
+    def contabilizar(self, relatorio_id, data, comissao_centavos, sinal=1):
+        destino, chave = (self.resumo, data) if relatorio_id is None else (self.relatorios, relatorio_id)
+        total, quantidade = destino.get(chave, (0, 0))
+        destino[chave] = (total + sinal * comissao_centavos, quantidade + sinal)
+
+    def contabilizar_instalacao(self, instalacao, sinal=1):
+        self.contabilizar(instalacao.relatorio_id, instalacao.data_instalacao, instalacao.comissao_centavos, sinal)
+
+    def aplicar(self, user_id):
+        registrar_diferencas_no_resumo(user_id, self.resumo)
+        for relatorio_id, (total, quantidade) in self.relatorios.items():
+            if total or quantidade:
+                db.session.execute(update(RelatorioHistorico).where(RelatorioHistorico.id == relatorio_id).values(
+                    total_comissoes_centavos=RelatorioHistorico.total_comissoes_centavos + total,
+                    num_instalacoes=RelatorioHistorico.num_instalacoes + quantidade))
+
+def marcar_dados_alterados(user_id):
+    # Faz parte da mesma transação que a alteração, por isso a versão nunca fica à frente dos dados.
+    db.session.execute(update(User).where(User.id == user_id).values(versao_dados=User.versao_dados + 1))
+
+def totais_resumo(user_id, data_inicio=None, data_fim=None):
+    query = db.session.query(
+        func.coalesce(func.sum(ResumoDiario.total_comissoes_centavos), 0),
+        func.coalesce(func.sum(ResumoDiario.num_instalacoes), 0)
+    ).filter(ResumoDiario.user_id == user_id)
+    if data_inicio and data_fim:
+        query = query.filter(ResumoDiario.data.between(data_inicio, data_fim))
+    total_comissoes_centavos, num_instalacoes = query.one()
+    return total_comissoes_centavos, num_instalacoes
+
+def reconstruir_resumo(user_id=None, data_inicio=None, data_fim=None):
+    # Recalcula o resumo diário a partir das instalações abertas, num único INSERT ... SELECT.
+    filtros_resumo, filtros_instalacao = [], [Instalacao.relatorio_id.is_(None)]
+    if user_id is not None:
+        filtros_resumo.append(ResumoDiario.user_id == user_id)
+        filtros_instalacao.append(Instalacao.user_id == user_id)
+    if data_inicio and data_fim:
+        filtros_resumo.append(ResumoDiario.data.between(data_inicio, data_fim))
+        filtros_instalacao.append(Instalacao.data_instalacao.between(data_inicio, data_fim))
+    ResumoDiario.query.filter(*filtros_resumo).delete(synchronize_session=False)
+    db.session.execute(insert(ResumoDiario).from_select(
+        ['user_id', 'data', 'total_comissoes_centavos', 'num_instalacoes'],
+        select(Instalacao.user_id, Instalacao.data_instalacao, func.sum(Instalacao.comissao_centavos), func.count(Instalacao.id))
+        .where(*filtros_instalacao).group_by(Instalacao.user_id, Instalacao.data_instalacao)
+    ))
+
+# --- Importação em lote (CSV/XLSX) ---
+# As linhas são lidas do arquivo uma a uma e gravadas em lotes (executemany), com um
+# commit por lote, para que arquivos grandes não fiquem inteiros em memória.
+TAMANHO_LOTE_IMPORTACAO = 5000
+
+def ler_linhas_importacao(arquivo):
+    if arquivo.filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError('A importação de XLSX requer o pacote openpyxl.')
+        livro = load_workbook(arquivo.stream, read_only=True, data_only=True)
+        linhas = livro.active.iter_rows(values_only=True)
+        cabecalho = [str(celula or '').strip().lower() for celula in next(linhas, ())]
+        for valores in linhas:
+            yield dict(zip(cabecalho, valores))
+        livro.close()
+    else:
+        texto = io.TextIOWrapper(arquivo.stream, encoding='utf-8-sig', newline='')
+        primeira_linha = texto.readline()
+        delimitador = ';' if primeira_linha.count(';') > primeira_linha.count(',') else ','
+        cabecalho = [coluna.strip().lower() for coluna in next(csv.reader([primeira_linha], delimiter=delimitador), [])]
+        for linha in csv.DictReader(texto, fieldnames=cabecalho, delimiter=delimitador):
+            yield linha
+
+def ler_data_importacao(valor):
+    if isinstance(valor, datetime.datetime):
+        return valor.date()
+    if isinstance(valor, datetime.date):
+        return valor
+    texto = str(valor or '').strip()
+    try:
+        if '/' in texto:
+            dia, mes, ano = texto.split('/')
+            return datetime.date(int(ano), int(mes), int(dia))
+        return datetime.date.fromisoformat(texto)
+    except ValueError:
+        raise ValueError(f"Data de instalação inválida: '{texto}'")
+
+def preparar_linha_importacao(linha, user_id, catalogo):
+    """Valida uma linha (da importação, da fila offline ou das alterações em lote) e devolve os
+    valores a gravar. Qualquer problema levanta ValueError, TypeError ou ArithmeticError, que
+    quem chama regista como erro da linha."""
+    tipo_combo = str(linha.get('tipo_combo') or '').strip().upper()
+    combo_key = str(linha.get('combo_key') or '').strip().upper()
+    combo = catalogo.combo(tipo_combo, combo_key)
+    if combo is None:
+        raise ValueError(f"Combo desconhecido: '{tipo_combo}' / '{combo_key}'")
+    login_cliente = str(linha.get('login_cliente') or '').strip()
+    if not login_cliente or len(login_cliente) > 100:
+        raise ValueError('Login do cliente em falta ou com mais de 100 caracteres')
+    observacoes = str(linha.get('observacoes') or '').strip()
+    if len(observacoes) > 300:
+        raise ValueError('Observações com mais de 300 caracteres')
+    porcentagem = linha.get('porcentagem_comissao')
+    porcentagem_comissao = ler_porcentagem(porcentagem) if porcentagem not in (None, '') else combo['porcentagem']
+    valor_arredondado_centavos = arredondar_centavos(combo['preco_centavos'])
+    return {
+        'tipo_combo': tipo_combo,
+        'descricao_combo': combo['descricao'],
+        'valor_original_centavos': combo['preco_centavos'],
+        'valor_arredondado_centavos': valor_arredondado_centavos,
+        'login_cliente': login_cliente,
+        'data_instalacao': ler_data_importacao(linha.get('data_instalacao')),
+        'porcentagem_comissao': porcentagem_comissao,
+        'comissao_centavos': calcular_comissao_centavos(valor_arredondado_centavos, porcentagem_comissao),
+        'observacoes': observacoes,
+        'user_id': user_id,
+        'catalogo_versao_id': catalogo.id,
+    }
+
+def gravar_lote_importacao(lote, user_id):
+    db.session.execute(Instalacao.__table__.insert(), lote)
+    por_dia = {}
+    for dados in lote:
+        total, quantidade = por_dia.get(dados['data_instalacao'], (0, 0))
+        por_dia[dados['data_instalacao']] = (total + dados['comissao_centavos'], quantidade + 1)
+    registrar_diferencas_no_resumo(user_id, por_dia)
+    marcar_dados_alterados(user_id)
+    db.session.commit()
+
+def importar_instalacoes(linhas, user_id):
+    importadas, erros, lote = 0, [], []
+    catalogo = cache_catalogo.atual()
+    # A linha 1 do arquivo é o cabeçalho.
+    for numero_linha, linha in enumerate(linhas, start=2):
+        if not any(valor not in (None, '') for valor in linha.values()):
+            continue
+        try:
+            lote.append(preparar_linha_importacao(linha, user_id, catalogo))
+        except (ValueError, TypeError, ArithmeticError) as e:
+            erros.append({'linha': numero_linha, 'erro': str(e)})
+            continue
+        if len(lote) >= TAMANHO_LOTE_IMPORTACAO:
+            gravar_lote_importacao(lote, user_id)
+            importadas += len(lote)
+            lote = []
+    if lote:
+        gravar_lote_importacao(lote, user_id)
+        importadas += len(lote)
+    return importadas, erros
+
+# Registos feitos offline pela PWA chegam em lotes com um id_cliente por instalação. Os ids
+# já gravados são respondidos como 'duplicada' (o aparelho pode reenviar o mesmo lote se a
+# ligação cair antes da resposta); as restantes instalações são gravadas numa só transação.
+LOTE_OFFLINE_MAXIMO = 500
+
+def registrar_lote_offline(entradas, user_id):
+    catalogo = cache_catalogo.atual()
+    ids_cliente = [str(entrada.get('id_cliente') or '').strip() for entrada in entradas]
+    existentes = set(db.session.execute(
+        select(Instalacao.id_cliente).where(Instalacao.user_id == user_id, Instalacao.id_cliente.in_([i for i in ids_cliente if i]))
+    ).scalars())
+    resultados, lote = [], []
+    for id_cliente, entrada in zip(ids_cliente, entradas):
+        if not id_cliente or len(id_cliente) > 36:
+            resultados.append({'id_cliente': id_cliente, 'estado': 'erro', 'erro': 'id_cliente em falta ou com mais de 36 caracteres'})
+            continue
+        if id_cliente in existentes:
+            resultados.append({'id_cliente': id_cliente, 'estado': 'duplicada'})
+            continue
+        try:
+            dados = preparar_linha_importacao(entrada, user_id, catalogo)
+        except (ValueError, TypeError, ArithmeticError) as e:
+            resultados.append({'id_cliente': id_cliente, 'estado': 'erro', 'erro': str(e)})
+            continue
+        dados['id_cliente'] = id_cliente
+        existentes.add(id_cliente)
+        lote.append(dados)
+        resultados.append({'id_cliente': id_cliente, 'estado': 'criada'})
+    if lote:
+        gravar_lote_importacao(lote, user_id)
+    return resultados
+
+# --- Alterações em lote ---
+# Correções de vários registos num só pedido. Cada operação é validada contra o estado atual
+# (carregado numa única consulta) e o lote é aplicado numa só transação, tudo ou nada: um INSERT
+# (executemany), um UPDATE por chave primária (executemany) e um DELETE ... WHERE id IN, todos
+# restritos ao dono. O resumo diário e os totais dos relatórios reabertos são ajustados uma
+# vez por dia e por relatório, pela soma das diferenças. Com `versao` (a versão dos dados em que
+# o cliente se baseou), o lote só é aplicado se nada mudou entretanto.
+LOTE_ALTERACOES_MAXIMO = 500
+
+class ConflitoVersao(Exception):
+    pass
+
+def aplicar_alteracoes(operacoes, user_id, versao=None):
+    """Devolve o resultado de cada operação. Se alguma for inválida, nada é gravado e as
+    restantes ficam como 'ignorada'; se `versao` não for a atual, levanta ConflitoVersao."""
+    catalogo = cache_catalogo.atual()
+    ids_alvo = {op.get('id') for op in operacoes if op.get('acao') in ('editar', 'excluir') and type(op.get('id')) is int}
+    atuais = {linha.id: linha for linha in db.session.execute(
+        select(Instalacao.id, Instalacao.data_instalacao, Instalacao.comissao_centavos, Instalacao.relatorio_id,
+               RelatorioHistorico.reaberto, RelatorioHistorico.data_inicio, RelatorioHistorico.data_fim)
+        .outerjoin(RelatorioHistorico, RelatorioHistorico.id == Instalacao.relatorio_id)
+        .where(Instalacao.user_id == user_id, Instalacao.id.in_(ids_alvo))
+    )} if ids_alvo else {}
+
+    resultados, criar, editar, excluir, usados = [], [], [], [], set()
+    diferencas = DiferencasTotais()
+
+    for op in operacoes:
+        acao, instalacao_id = op.get('acao'), op.get('id')
+        resultado = {'acao': acao, 'id': instalacao_id}
+        resultados.append(resultado)
+        try:
+            if acao == 'criar':
+                dados = preparar_linha_importacao(op, user_id, catalogo)
+                criar.append((resultado, dados))
+                diferencas.contabilizar(None, dados['data_instalacao'], dados['comissao_centavos'], 1)
+                resultado['estado'] = 'criada'
+                continue
+            if acao not in ('editar', 'excluir'):
+                raise ValueError("Ação inválida; use 'criar', 'editar' ou 'excluir'")
+            atual = atuais.get(instalacao_id) if type(instalacao_id) is int else None
+            if atual is None:
+                raise ValueError('Instalação não encontrada')
+            if atual.relatorio_id is not None and not atual.reaberto:
+                raise ValueError('A instalação pertence a um período fechado')
+            if instalacao_id in usados:
+                raise ValueError('A instalação aparece mais de uma vez no lote')
+            if acao == 'editar':
+                dados = preparar_linha_importacao(op, user_id, catalogo)
+                del dados['user_id']
+                dados['id'] = instalacao_id
+                # Uma data fora do período reaberto devolve a instalação às abertas.
+                fora_do_periodo = atual.relatorio_id is not None and not (atual.data_inicio <= dados['data_instalacao'].isoformat() <= atual.data_fim)
+                dados['relatorio_id'] = None if fora_do_periodo else atual.relatorio_id
+                editar.append(dados)
+                diferencas.contabilizar(dados['relatorio_id'], dados['data_instalacao'], dados['comissao_centavos'], 1)
+                resultado['estado'] = 'atualizada'
+            else:
+                excluir.append(instalacao_id)
+                resultado['estado'] = 'excluida'
+            usados.add(instalacao_id)
+            diferencas.contabilizar(atual.relatorio_id, atual.data_instalacao, atual.comissao_centavos, -1)
+        except (ValueError, TypeError, ArithmeticError) as e:
+            resultado['estado'] = 'erro'
+            resultado['erro'] = str(e)
+
+    if any(resultado['estado'] == 'erro' for resultado in resultados):
+        for resultado in resultados:
+            if resultado['estado'] != 'erro':
+                resultado['estado'] = 'ignorada'
+        return resultados
+    if not (criar or editar or excluir):
+        return resultados
+    try:
+        _gravar_alteracoes(user_id, versao, criar, editar, excluir, diferencas)
+    except Exception:
+        db.session.rollback()
+        raise
+    return resultados
+
+def _gravar_alteracoes(user_id, versao, criar, editar, excluir, diferencas):
+    if versao is None:
+        marcar_dados_alterados(user_id)
+    else:
+        # Primeira escrita da transação: compara e incrementa a versão de uma vez, por isso dois
+        # lotes baseados na mesma versão nunca são ambos aplicados.
+        atualizado = db.session.execute(update(User).where(User.id == user_id, User.versao_dados == versao)
+                                        .values(versao_dados=User.versao_dados + 1)).rowcount
+        if atualizado != 1:
+            raise ConflitoVersao()
+    if criar:
+        linhas = [dados for _, dados in criar]
+        if db.engine.dialect.name == 'sqlite':
+            # O SQLite não serve de sentinela para sort_by_parameter_order (o SQLAlchemy passaria a
+            # um INSERT por linha), mas dá rowids crescentes pela ordem dos VALUES: basta ordenar.
+            novos_ids = sorted(db.session.execute(insert(Instalacao).returning(Instalacao.id), linhas).scalars())
+        else:
+            novos_ids = db.session.execute(insert(Instalacao).returning(Instalacao.id, sort_by_parameter_order=True),
+                                           linhas).scalars().all()
+        for (resultado, _), novo_id in zip(criar, novos_ids):
+            resultado['id'] = novo_id
+    if editar:
+        db.session.execute(update(Instalacao).where(Instalacao.user_id == user_id).execution_options(synchronize_session=None), editar)
+    if excluir:
+        db.session.execute(delete(Instalacao).where(Instalacao.user_id == user_id, Instalacao.id.in_(excluir))
+                           .execution_options(synchronize_session=False))
+    diferencas.aplicar(user_id)
+    db.session.commit()
+
+# --- Exportação em fluxo (CSV/JSON) ---
+# As linhas vêm do banco em blocos (yield_per) e são enviadas ao cliente à medida que
+# são lidas, por isso a memória fica constante mesmo em exportações de vários anos.
+LINHAS_POR_BLOCO_EXPORTACAO = 1000
+
+def consulta_exportacao(tipo, user_id=None):
+    if tipo == 'instalacoes':
+        colunas = [Instalacao.id, User.username.label('tecnico'), Instalacao.tipo_combo, Instalacao.descricao_combo,
+                   Instalacao.login_cliente, Instalacao.data_instalacao, Instalacao.valor_original_centavos, Instalacao.valor_arredondado_centavos,
+                   Instalacao.porcentagem_comissao, Instalacao.comissao_centavos, Instalacao.observacoes, Instalacao.data_registro]
+        query = (select(*colunas).join(User, User.id == Instalacao.user_id).where(Instalacao.relatorio_id.is_(None))
+                 .order_by(Instalacao.user_id, Instalacao.data_instalacao, Instalacao.id))
+        if user_id is not None:
+            query = query.where(Instalacao.user_id == user_id)
+    else:
+        colunas = [Instalacao.relatorio_id, User.username.label('tecnico'), RelatorioHistorico.data_inicio, RelatorioHistorico.data_fim,
+                   RelatorioHistorico.data_salva, Instalacao.tipo_combo, Instalacao.descricao_combo, Instalacao.login_cliente,
+                   Instalacao.data_instalacao, Instalacao.porcentagem_comissao, Instalacao.comissao_centavos, Instalacao.observacoes]
+        query = (select(*colunas)
+                 .join(RelatorioHistorico, RelatorioHistorico.id == Instalacao.relatorio_id)
+                 .join(User, User.id == RelatorioHistorico.user_id)
+                 .where(RelatorioHistorico.concluido.is_(True))
+                 .order_by(RelatorioHistorico.user_id, Instalacao.relatorio_id, Instalacao.data_instalacao, Instalacao.id))
+        if user_id is not None:
+            query = query.where(RelatorioHistorico.user_id == user_id)
+    return query.execution_options(yield_per=LINHAS_POR_BLOCO_EXPORTACAO)
+
+def valor_exportacao(valor):
+    return valor.isoformat() if isinstance(valor, (datetime.date, datetime.datetime)) else valor
+
+def gerar_csv(resultado):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(resultado.keys())
+    for bloco in resultado.partitions():
+        escritor.writerows([valor_exportacao(valor) for valor in linha] for linha in bloco)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+def gerar_json(resultado):
+    colunas = list(resultado.keys())
+    separador = '['
+    for bloco in resultado.partitions():
+        partes = [json.dumps({coluna: valor_exportacao(valor) for coluna, valor in zip(colunas, linha)}) for linha in bloco]
+        yield separador + ','.join(partes)
+        separador = ','
+    yield '[]' if separador == '[' else ']'
+
+# --- Fecho de Períodos em Segundo Plano ---
+# salvar_periodo apenas regista uma TarefaArquivamento; uma thread do próprio processo marca
+# as instalações abertas do período com o id do relatório (um UPDATE por intervalo de ids),
+# somando a cada lote a comissão e a contagem aos totais do relatório, com um commit por lote
+# para que o lock de escrita do SQLite seja libertado entre lotes. As linhas ficam na mesma
+# tabela: nada é copiado nem apagado. Um período fechado pode ser reaberto para correções;
+# voltar a fechá-lo só marca as instalações que entretanto foram incluídas no intervalo, e as
+# editadas ou excluídas já ajustaram os totais pela diferença (DiferencasTotais).
+# O estado fica no banco, por isso qualquer worker responde ao polling. A thread corre num
+# worker do gunicorn, que pode ser reciclado a meio (max_requests): cada worker verifica, ao
+# arrancar e depois a cada ARQUIVAMENTO_PRAZO_SEGUNDOS, se há tarefas paradas e retoma-as.
+
+class FilaArquivamento:
+    def __init__(self):
+        self._fila = queue.Queue()
+        self._thread = None
+        self._app = None
+        self._lock = threading.Lock()
+
+    def iniciar(self, app):
+        # Chamado no primeiro pedido do worker (e não em create_app, que também serve aos
+        # comandos `flask`, ex.: antes de `flask db upgrade` criar a tabela).
+        with self._lock:
+            self._app = app
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._trabalhar, name='arquivamento', daemon=True)
+                self._thread.start()
+
+    def retomar_no_primeiro_pedido(self):
+        if self._thread is None:
+            self.iniciar(current_app._get_current_object())
+
+    def enfileirar(self, app, tarefa_id, reserva):
+        # `reserva` é o atualizada_em visto por quem enfileirou: se entretanto outro worker
+        # retomou a tarefa, o valor mudou e esta entrada da fila é ignorada.
+        if app.config['ARQUIVAMENTO_SINCRONO']:
+            executar_arquivamento(tarefa_id, app.config['ARQUIVAMENTO_LOTE'], reserva)
+            return
+        self.iniciar(app)
+        self._fila.put((tarefa_id, reserva))
+
+    def _trabalhar(self):
+        app = self._app
+        espera = app.config['ARQUIVAMENTO_PRAZO_SEGUNDOS']
+        proxima_verificacao = time.monotonic() if app.config['ARQUIVAMENTO_RETOMAR'] else float('inf')
+        while True:
+            if time.monotonic() >= proxima_verificacao:
+                with app.app_context():
+                    try:
+                        for tarefa_id, reserva in reservar_tarefas_paradas(espera):
+                            app.logger.warning("A retomar a tarefa de arquivamento %s, parada há mais de %ss", tarefa_id, espera)
+                            self._fila.put((tarefa_id, reserva))
+                    except Exception:
+                        app.logger.exception("Falha ao procurar tarefas de arquivamento paradas")
+                    finally:
+                        db.session.remove()
+                proxima_verificacao = time.monotonic() + espera
+            try:
+                tarefa_id, reserva = self._fila.get(timeout=min(max(proxima_verificacao - time.monotonic(), 0.1), espera))
+            except queue.Empty:
+                continue
+            with app.app_context():
+                try:
+                    executar_arquivamento(tarefa_id, app.config['ARQUIVAMENTO_LOTE'], reserva)
+                except Exception:
+                    app.logger.exception("Falha no arquivamento da tarefa %s", tarefa_id)
+                finally:
+                    db.session.remove()
+                    self._fila.task_done()
+
+fila_arquivamento = FilaArquivamento()
+
+ESTADOS_EM_CURSO = ('pendente', 'em_andamento')
+
+def renovar_reserva(tarefa_id, reserva, estados=ESTADOS_EM_CURSO, **valores):
+    """UPDATE condicional da tarefa: só se aplica se `atualizada_em` ainda for `reserva` (nenhum
+    outro worker a retomou) e o estado for um de `estados`. Devolve a nova reserva, ou None se a
+    tarefa já não é deste worker. Não faz commit."""
+    agora = datetime.datetime.now()
+    resultado = db.session.execute(update(TarefaArquivamento).where(
+        TarefaArquivamento.id == tarefa_id,
+        TarefaArquivamento.estado.in_(estados),
+        TarefaArquivamento.atualizada_em.is_(None) if reserva is None else TarefaArquivamento.atualizada_em == reserva,
+    ).values(atualizada_em=agora, **valores).execution_options(synchronize_session=False))
+    return agora if resultado.rowcount == 1 else None
+
+def reservar_tarefas_paradas(prazo_segundos, estados=ESTADOS_EM_CURSO):
+    """Devolve `(id, reserva)` das tarefas por concluir cuja última atualização tem mais de
+    `prazo_segundos` (ex.: o worker que as executava foi reciclado), já reservadas para quem chama."""
+    limite = datetime.datetime.now() - datetime.timedelta(seconds=prazo_segundos)
+    paradas = db.session.execute(select(TarefaArquivamento.id, TarefaArquivamento.atualizada_em).where(
+        TarefaArquivamento.estado.in_(estados),
+        or_(TarefaArquivamento.atualizada_em.is_(None), TarefaArquivamento.atualizada_em < limite),
+    ).order_by(TarefaArquivamento.id)).all()
+    reservadas = []
+    for tarefa_id, vista in paradas:
+        # Se vários workers encontrarem a mesma tarefa, só um fica com ela.
+        reserva = renovar_reserva(tarefa_id, vista, estados)
+        db.session.commit()
+        if reserva is not None:
+            reservadas.append((tarefa_id, reserva))
+    return reservadas
+
+def fecho_em_curso(user_id, data_inicio, data_fim):
+    return TarefaArquivamento.query.filter(
+        TarefaArquivamento.user_id == user_id, TarefaArquivamento.estado.in_(ESTADOS_EM_CURSO),
+        TarefaArquivamento.data_inicio <= data_fim, TarefaArquivamento.data_fim >= data_inicio,
+    ).first()
 
-@app.template_filter('strftime')
+def executar_arquivamento(tarefa_id, tamanho_lote, reserva, estados=ESTADOS_EM_CURSO):
+    """Fecha o período da tarefa. `reserva` é o `atualizada_em` visto quando a tarefa foi
+    enfileirada: a tarefa é reservada com um UPDATE condicional e, se já foi concluída ou
+    retomada por outro worker, não faz nada e devolve False. A reserva é renovada em cada lote,
+    no mesmo commit, por isso um worker que perdeu a tarefa para a logo no lote seguinte."""
+    reserva = renovar_reserva(tarefa_id, reserva, estados, estado='em_andamento')
+    db.session.commit()
+    if reserva is None:
+        current_app.logger.info("Tarefa de arquivamento %s ignorada: concluída ou retomada por outro worker", tarefa_id)
+        return False
+    tarefa = db.session.get(TarefaArquivamento, tarefa_id)
+    try:
+        # Só as instalações registadas até ao pedido de fecho; as criadas depois ficam abertas.
+        filtro_periodo = (Instalacao.user_id == tarefa.user_id, Instalacao.data_instalacao.between(tarefa.data_inicio, tarefa.data_fim),
+                          Instalacao.relatorio_id.is_(None), Instalacao.data_registro <= tarefa.data_criacao)
+        if tarefa.relatorio_id is None:
+            relatorio = RelatorioHistorico(data_inicio=tarefa.data_inicio.isoformat(), data_fim=tarefa.data_fim.isoformat(),
+                                           total_comissoes_centavos=0, num_instalacoes=0, user_id=tarefa.user_id, concluido=False)
+            db.session.add(relatorio)
+            db.session.flush()
+            tarefa.relatorio_id = relatorio.id
+        tarefa.total = tarefa.processadas + db.session.query(func.count(Instalacao.id)).filter(*filtro_periodo).scalar()
+        db.session.commit()
+
+        while True:
+            reserva = renovar_reserva(tarefa_id, reserva)
+            if reserva is None:
+                db.session.rollback()
+                current_app.logger.warning("Tarefa de arquivamento %s retomada por outro worker; este para", tarefa_id)
+                return False
+            # Os totais somam as linhas que o próprio UPDATE marcou (RETURNING); o filtro
+            # relatorio_id IS NULL garante que uma linha marcada por outra tarefa não volta a contar.
+            lote = select(Instalacao.id).where(*filtro_periodo).order_by(Instalacao.id).limit(tamanho_lote)
+            comissoes = db.session.execute(
+                update(Instalacao).where(*filtro_periodo, Instalacao.id.in_(lote)).values(relatorio_id=tarefa.relatorio_id)
+                .returning(Instalacao.comissao_centavos).execution_options(synchronize_session=False)
+            ).scalars().all()
+            if not comissoes:
+                break
+            db.session.execute(update(RelatorioHistorico).where(RelatorioHistorico.id == tarefa.relatorio_id).values(
+                total_comissoes_centavos=RelatorioHistorico.total_comissoes_centavos + sum(comissoes),
+                num_instalacoes=RelatorioHistorico.num_instalacoes + len(comissoes)))
+            tarefa.processadas += len(comissoes)
+            marcar_dados_alterados(tarefa.user_id)
+            db.session.commit()
+
+        # A última renovação (a do lote vazio) ainda está por gravar e vai no mesmo commit.
+        relatorio = db.session.get(RelatorioHistorico, tarefa.relatorio_id)
+        if relatorio.versao == 0 and relatorio.num_instalacoes == 0:
+            # Outra tarefa marcou todas as linhas do período primeiro: não fica um relatório vazio.
+            tarefa.relatorio_id = None
+            db.session.delete(relatorio)
+        else:
+            relatorio.concluido = True
+            relatorio.reaberto = False
+            relatorio.versao += 1
+        # O resumo diário do período volta a ter só as instalações que (eventualmente) ficaram abertas.
+        reconstruir_resumo(tarefa.user_id, tarefa.data_inicio, tarefa.data_fim)
+        tarefa.estado = 'concluida'
+        tarefa.data_conclusao = datetime.datetime.now()
+        marcar_dados_alterados(tarefa.user_id)
+        db.session.commit()
+        return True
+    except Exception as e:
+        # Os lotes já gravados ficam marcados no relatório (ainda não concluído); voltar a
+        # executar a mesma tarefa continua a partir do ponto onde parou.
+        db.session.rollback()
+        renovar_reserva(tarefa_id, reserva, estado='erro', erro=str(e)[:500])
+        db.session.commit()
+        raise
+
+def agendar_fecho(user_id, data_inicio, data_fim, total, relatorio_id=None):
+    # Com relatorio_id, volta a fechar um período reaberto, no mesmo relatório.
+    tarefa = TarefaArquivamento(user_id=user_id, data_inicio=data_inicio, data_fim=data_fim, total=total, relatorio_id=relatorio_id,
+                                atualizada_em=datetime.datetime.now())
+    db.session.add(tarefa)
+    db.session.commit()
+    fila_arquivamento.enfileirar(current_app._get_current_object(), tarefa.id, tarefa.atualizada_em)
+    return tarefa
+
+def serializar_tarefa(tarefa):
+    return {
+        'id': tarefa.id,
+        'estado': tarefa.estado,
+        'total': tarefa.total,
+        'processadas': tarefa.processadas,
+        'relatorio_id': tarefa.relatorio_id,
+        'erro': tarefa.erro,
+    }
+
+# --- Folha de Pagamento (Administração) ---
+# Totais de todos os técnicos num intervalo, calculados numa única consulta agrupada sobre as
+# instalações, abertas ou de períodos já fechados. O resultado fica em cache por
+# (intervalo, versão dos dados): a versão é a soma de User.versao_dados, que cresce a cada
+# alteração de qualquer técnico, por isso uma entrada antiga nunca volta a ser servida.
+class CacheFolha:
+    def __init__(self, tamanho_maximo=64):
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.configurar(tamanho_maximo)
+
+    def configurar(self, tamanho_maximo):
+        self.tamanho_maximo = tamanho_maximo
+
+    def obter(self, chave):
+        with self._lock:
+            folha = self._entradas.get(chave)
+            if folha is not None:
+                self._entradas.move_to_end(chave)
+            return folha
+
+    def guardar(self, chave, folha):
+        if self.tamanho_maximo <= 0:
+            return
+        with self._lock:
+            self._entradas[chave] = folha
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+
+cache_folha = CacheFolha()
+
+def versao_dados_global():
+    return db.session.query(func.coalesce(func.sum(User.versao_dados), 0)).scalar()
+
+def calcular_folha(data_inicio, data_fim):
+    linhas = db.session.execute(
+        select(Instalacao.user_id, User.username, Instalacao.tipo_combo, Instalacao.descricao_combo,
+               func.sum(Instalacao.comissao_centavos), func.count())
+        .join(User, User.id == Instalacao.user_id)
+        .where(Instalacao.data_instalacao.between(data_inicio, data_fim))
+        .group_by(Instalacao.user_id, User.username, Instalacao.tipo_combo, Instalacao.descricao_combo)
+        .order_by(User.username, Instalacao.descricao_combo)
+    )
+    tecnicos = {}
+    for user_id, username, tipo_combo, descricao_combo, total_centavos, num_instalacoes in linhas:
+        tecnico = tecnicos.get(user_id)
+        if tecnico is None:
+            tecnico = tecnicos[user_id] = {'user_id': user_id, 'username': username, 'total_comissoes_centavos': 0, 'num_instalacoes': 0, 'combos': []}
+        tecnico['combos'].append({'tipo_combo': tipo_combo, 'descricao_combo': descricao_combo,
+                                  'num_instalacoes': num_instalacoes, 'total_comissoes_centavos': total_centavos})
+        tecnico['total_comissoes_centavos'] += total_centavos
+        tecnico['num_instalacoes'] += num_instalacoes
+    return {
+        'data_inicio': data_inicio.isoformat(),
+        'data_fim': data_fim.isoformat(),
+        'total_comissoes_centavos': sum(t['total_comissoes_centavos'] for t in tecnicos.values()),
+        'num_instalacoes': sum(t['num_instalacoes'] for t in tecnicos.values()),
+        'tecnicos': list(tecnicos.values()),
+    }
+
+def folha_pagamento(data_inicio, data_fim):
+    chave = (data_inicio, data_fim, versao_dados_global())
+    folha = cache_folha.obter(chave)
+    if folha is None:
+        folha = calcular_folha(data_inicio, data_fim)
+        cache_folha.guardar(chave, folha)
+    return folha
+
+# --- Recálculo de Comissões em Lote ---
+# Quando um preço ou uma regra de percentagem muda, as instalações ainda abertas são
+# recalculadas com um único UPDATE (em aritmética inteira, no próprio banco) em vez de um
+# ciclo de objetos em Python. As instalações de períodos fechados não são alteradas.
+def expressao_comissao_centavos(valor_arredondado_centavos, porcentagem):
+    pontos = func.cast(func.round(porcentagem * 100), db.Integer)
+    return (valor_arredondado_centavos * pontos + 5000) // 10000
+
+def recalcular_comissoes(versao_id=None, user_id=None, data_inicio=None, data_fim=None, porcentagem=None):
+    """Aplica os preços da versão `versao_id` do catálogo (combos encontrados pelo tipo e pela
+    descrição) e, se indicada, uma nova percentagem às instalações abertas que passam nos
+    filtros. Devolve o número de instalações alteradas."""
+    filtros = [Instalacao.relatorio_id.is_(None)]
+    if user_id is not None:
+        filtros.append(Instalacao.user_id == user_id)
+    if data_inicio and data_fim:
+        filtros.append(Instalacao.data_instalacao.between(data_inicio, data_fim))
+    nova_porcentagem = Instalacao.porcentagem_comissao if porcentagem is None else literal(ler_porcentagem(porcentagem))
+
+    if versao_id is not None:
+        arredondado = (Combo.preco_centavos + 99) // 100 * 100
+        query = (update(Instalacao)
+                 .where(Combo.versao_id == versao_id, Combo.tipo_combo == Instalacao.tipo_combo,
+                        Combo.descricao == Instalacao.descricao_combo, *filtros)
+                 .values(valor_original_centavos=Combo.preco_centavos, valor_arredondado_centavos=arredondado,
+                         porcentagem_comissao=nova_porcentagem, catalogo_versao_id=versao_id,
+                         comissao_centavos=expressao_comissao_centavos(arredondado, nova_porcentagem)))
+    else:
+        query = (update(Instalacao).where(*filtros)
+                 .values(porcentagem_comissao=nova_porcentagem,
+                         comissao_centavos=expressao_comissao_centavos(Instalacao.valor_arredondado_centavos, nova_porcentagem)))
+    alteradas = db.session.execute(query.execution_options(synchronize_session=False)).rowcount
+
+    reconstruir_resumo(user_id, data_inicio, data_fim)
+    afetados = select(Instalacao.user_id).where(*filtros).distinct()
+    db.session.execute(update(User).where(User.id.in_(afetados)).values(versao_dados=User.versao_dados + 1))
+    db.session.commit()
+    return alteradas
+    return alteradas
+
+# --- Cache de Relatórios Arquivados ---
+# Um relatório concluído só muda se for reaberto, por isso o HTML das suas páginas é guardado
+# já renderizado, pela chave (relatório, fecho, template, página/filtro, versão dos templates), num LRU
+# limitado em bytes e, opcionalmente, em arquivos em instance/cache_relatorios, que
+# sobrevivem a reinícios e são partilhados pelos workers. Alterar um template (ou os
+# estáticos com hash) muda a versão e, com ela, todas as chaves.
+class CacheFragmentos:
+    def __init__(self, limite_bytes=32 * 1024 * 1024, pasta=None, versao=''):
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.configurar(limite_bytes, pasta, versao)
+
+    def configurar(self, limite_bytes, pasta, versao):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+        self.limite_bytes = limite_bytes
+        self.pasta = pasta
+        self.versao = versao
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+    def _arquivo(self, chave):
+        return os.path.join(self.pasta, hashlib.sha256(repr(chave).encode('utf-8')).hexdigest() + '.html')
+
+    def obter(self, chave):
+        with self._lock:
+            html = self._entradas.get(chave)
+            if html is not None:
+                self._entradas.move_to_end(chave)
+                return html
+        if not self.pasta:
+            return None
+        try:
+            with open(self._arquivo(chave), 'rb') as arquivo:
+                html = arquivo.read()
+        except FileNotFoundError:
+            return None
+        self._guardar_em_memoria(chave, html)
+        return html
+
+    def guardar(self, chave, html, em_disco=True):
+        self._guardar_em_memoria(chave, html)
+        if self.pasta and em_disco:
+            # Escreve num temporário e renomeia, para que outro worker nunca leia meio arquivo.
+            caminho = self._arquivo(chave)
+            temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temporario, 'wb') as arquivo:
+                arquivo.write(html)
+            os.replace(temporario, caminho)
+
+    def _guardar_em_memoria(self, chave, html):
+        if len(html) > self.limite_bytes:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._entradas[chave] = html
+            self._bytes += len(html)
+            while self._bytes > self.limite_bytes:
+                _, removido = self._entradas.popitem(last=False)
+                self._bytes -= len(removido)
+
+cache_relatorios = CacheFragmentos()
+
+def versao_templates(app):
+    resumo = hashlib.sha256()
+    for raiz, _, arquivos in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        for nome in sorted(arquivos):
+            with open(os.path.join(raiz, nome), 'rb') as arquivo:
+                resumo.update(nome.encode('utf-8') + arquivo.read())
+    resumo.update(json.dumps(ativos.manifesto, sort_keys=True).encode('utf-8'))
+    return resumo.hexdigest()[:16]
+
+# O "Gerado em" muda a cada pedido: o HTML em cache leva este marcador (data_hoje=None no
+# template), trocado pela hora atual ao responder.
+MARCADOR_DATA_HOJE = b'<!--data-hoje-->'
+MARCADOR_MENSAGENS = b'<!--mensagens-->'
+
+def resposta_relatorio_arquivado(relatorio, template, variante, contexto):
+    """Responde com o HTML do relatório, renderizado só na primeira vez; `contexto` é uma função
+    que carrega os dados do template e não é chamada quando a página já está em cache."""
+    agora = datetime.datetime.now()
+    if not relatorio.concluido:
+        return render_template(template, data_hoje=agora, **contexto())
+    chave = (relatorio.id, relatorio.versao, template, variante, cache_relatorios.versao)
+    etag = hashlib.sha256(repr(chave).encode('utf-8')).hexdigest()[:32]
+    # Com mensagens por mostrar (p. ex. depois de um redirecionamento) a página vai sempre inteira.
+    if request.if_none_match.contains_weak(etag) and not session.get('_flashes'):
+        resposta = Response(status=304)
+    else:
+        html = cache_relatorios.obter(chave)
+        if html is None:
+            html = render_template(template, data_hoje=None, **contexto()).encode('utf-8')
+            cache_relatorios.guardar(chave, html)
+        html = html.replace(MARCADOR_DATA_HOJE, agora.strftime('%d/%m/%Y às %H:%M').encode('utf-8'))
+        if MARCADOR_MENSAGENS in html:
+            html = html.replace(MARCADOR_MENSAGENS, render_template('_mensagens.html').encode('utf-8'))
+        resposta = Response(html, mimetype='text/html')
+    resposta.set_etag(etag)
+    # Um período concluído pode ser reaberto no mesmo endereço: o navegador revalida sempre e o
+    # ETag (que inclui o número do fecho) responde 304 enquanto o relatório não mudar.
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+# --- Relatórios em PDF ---
+# O PDF é gerado num pool de processos (ver pdf.py). As linhas são lidas aqui, em blocos, e
+# passadas ao pool como tuplas; o pedido espera até PDF_ESPERA_SEGUNDOS e, se o PDF ainda não
+# estiver pronto, responde 202 com uma página que se recarrega até ele ficar no cache. Como
+# todas as linhas ficam em memória (no worker e no processo do pool), um relatório com mais de
+# PDF_LINHAS_MAX linhas é recusado e o técnico é enviado para a exportação CSV.
+fila_pdf = FilaPdf()
+
+def linhas_pdf(*filtros):
+    maximo = current_app.config['PDF_LINHAS_MAX']
+    consulta = (select(Instalacao.data_instalacao, Instalacao.descricao_combo, Instalacao.login_cliente,
+                       Instalacao.observacoes, Instalacao.comissao_centavos, Instalacao.porcentagem_comissao)
+                .where(*filtros).order_by(Instalacao.data_instalacao, Instalacao.id).limit(maximo + 1)
+                .execution_options(yield_per=LINHAS_POR_BLOCO_EXPORTACAO))
+    linhas = [tuple(linha) for linha in db.session.execute(consulta)]
+    if len(linhas) > maximo:
+        raise LinhasDemais(maximo)
+    return linhas
+
+def resposta_pdf(chave, argumentos, nome_arquivo, imutavel):
+    """Responde com o PDF de `chave`. Só os relatórios concluídos (`imutavel`) vão para o disco;
+    os outros ficam no LRU em memória, com a versão dos dados do técnico na chave."""
+    if not pdf_disponivel():
+        flash('A geração de PDF requer o pacote fpdf2 (pip install fpdf2).', 'danger')
+        return redirect(url_for('main.index'))
+    etag = hashlib.sha256(repr(chave).encode('utf-8')).hexdigest()[:32]
+    if request.if_none_match.contains_weak(etag):
+        resposta = Response(status=304)
+        resposta.set_etag(etag)
+        return resposta
+    try:
+        conteudo = fila_pdf.obter(chave, cache_relatorios, argumentos, em_disco=imutavel)
+    except FilaCheia:
+        resposta = Response(render_template('pdf_aguarde.html', ocupado=True), status=503)
+        resposta.headers['Retry-After'] = '10'
+        return resposta
+    except LinhasDemais as erro:
+        flash(f'O relatório tem mais de {erro.args[0]} instalações, o limite do PDF. Use a exportação CSV.', 'warning')
+        return redirect(url_for('main.index'))
+    if conteudo is None:
+        resposta = Response(render_template('pdf_aguarde.html', ocupado=False), status=202)
+        resposta.headers['Retry-After'] = '3'
+        return resposta
+    resposta = Response(conteudo, mimetype='application/pdf',
+                        headers={'Content-Disposition': f'inline; filename="{nome_arquivo}"'})
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+# --- Paginação por cursor (keyset) ---
+# A lista do painel é ordenada por (data_registro, id) decrescente. Em vez de OFFSET,
+# cada página continua a partir da última linha vista, por isso o custo de cada
+# página não depende de quantas instalações abertas o técnico tem.
+ITENS_POR_PAGINA = 50
+
+def codificar_cursor(instalacao):
+    return f"{instalacao.data_registro.isoformat()}|{instalacao.id}"
+
+def decodificar_cursor(cursor):
+    data_str, id_str = cursor.rsplit('|', 1)
+    return datetime.datetime.fromisoformat(data_str), int(id_str)
+
+def pagina_instalacoes(user_id, cursor=None, limite=ITENS_POR_PAGINA):
+    query = Instalacao.query.filter(Instalacao.user_id == user_id, Instalacao.relatorio_id.is_(None))
+    if cursor:
+        data_registro, ultimo_id = decodificar_cursor(cursor)
+        query = query.filter(or_(
+            Instalacao.data_registro < data_registro,
+            and_(Instalacao.data_registro == data_registro, Instalacao.id < ultimo_id)
+        ))
+    # Busca uma linha a mais só para saber se existe uma próxima página.
+    itens = query.order_by(Instalacao.data_registro.desc(), Instalacao.id.desc()).limit(limite + 1).all()
+    proximo_cursor = codificar_cursor(itens[limite - 1]) if len(itens) > limite else None
+    return itens[:limite], proximo_cursor
+
+def serializar_instalacao(inst):
+    return {
+        'id': inst.id,
+        'tipo_combo': inst.tipo_combo,
+        'descricao_combo': inst.descricao_combo,
+        'login_cliente': inst.login_cliente,
+        'data_instalacao': inst.data_instalacao.isoformat(),
+        'porcentagem_comissao': inst.porcentagem_comissao,
+        'comissao': para_reais(inst.comissao_centavos),
+        'comissao_centavos': inst.comissao_centavos,
+        'observacoes': inst.observacoes,
+        'data_registro': inst.data_registro.isoformat() if inst.data_registro else None,
+    }
+
+# --- Pesquisa de Instalações (abertas e de períodos fechados) ---
+def termos_fts(texto):
+    # Cada palavra entre aspas (o FTS5 não interpreta operadores do utilizador) e com * para
+    # procurar por prefixo; as palavras são combinadas com AND.
+    return ' '.join('"' + palavra.replace('"', '""') + '"*' for palavra in texto.split())
+
+def filtro_texto(texto):
+    if db.engine.dialect.name == 'sqlite':
+        correspondencias = text("SELECT rowid FROM instalacao_fts WHERE instalacao_fts MATCH :termos").bindparams(termos=termos_fts(texto))
+        return Instalacao.id.in_(correspondencias.columns(column('rowid')))
+    return and_(*[or_(Instalacao.login_cliente.ilike(f'%{palavra}%'), Instalacao.descricao_combo.ilike(f'%{palavra}%'),
+                      Instalacao.observacoes.ilike(f'%{palavra}%')) for palavra in texto.split()])
+
+def buscar_instalacoes(user_id, texto='', data_inicio=None, data_fim=None, tipo_combo=None, comissao_min=None,
+                       comissao_max=None, origem='todas', cursor=None, limite=ITENS_POR_PAGINA):
+    """Pesquisa nas instalações do técnico, abertas ou de períodos fechados, da mais recente
+    para a mais antiga, paginada pelo cursor "data|id"."""
+    origem_linha = case((Instalacao.relatorio_id.is_(None), literal('aberta')), else_=literal('arquivada')).label('origem')
+    query = select(origem_linha, Instalacao.id, Instalacao.relatorio_id, Instalacao.tipo_combo, Instalacao.descricao_combo,
+                   Instalacao.login_cliente, Instalacao.data_instalacao, Instalacao.porcentagem_comissao,
+                   Instalacao.comissao_centavos, Instalacao.observacoes).where(Instalacao.user_id == user_id)
+    if origem == 'aberta':
+        query = query.where(Instalacao.relatorio_id.is_(None))
+    elif origem == 'arquivada':
+        query = query.where(Instalacao.relatorio_id.is_not(None))
+    elif origem != 'todas':
+        raise ValueError(f"Origem inválida: {origem!r}")
+    if texto.strip():
+        query = query.where(filtro_texto(texto))
+    if data_inicio:
+        query = query.where(Instalacao.data_instalacao >= data_inicio)
+    if data_fim:
+        query = query.where(Instalacao.data_instalacao <= data_fim)
+    if tipo_combo:
+        query = query.where(Instalacao.tipo_combo == tipo_combo)
+    if comissao_min is not None:
+        query = query.where(Instalacao.comissao_centavos >= comissao_min)
+    if comissao_max is not None:
+        query = query.where(Instalacao.comissao_centavos <= comissao_max)
+    if cursor:
+        data_str, id_str = cursor.split('|')
+        data_cursor, id_cursor = datetime.date.fromisoformat(data_str), int(id_str)
+        query = query.where(or_(
+            Instalacao.data_instalacao < data_cursor,
+            and_(Instalacao.data_instalacao == data_cursor, Instalacao.id < id_cursor),
+        ))
+    linhas = db.session.execute(query.order_by(Instalacao.data_instalacao.desc(), Instalacao.id.desc()).limit(limite + 1)).all()
+    proximo_cursor = None
+    if len(linhas) > limite:
+        ultima = linhas[limite - 1]
+        proximo_cursor = f"{ultima.data_instalacao.isoformat()}|{ultima.id}"
+    return linhas[:limite], proximo_cursor
+
+def serializar_resultado_busca(linha):
+    return {
+        'origem': linha.origem,
+        'id': linha.id,
+        'relatorio_id': linha.relatorio_id,
+        'tipo_combo': linha.tipo_combo,
+        'descricao_combo': linha.descricao_combo,
+        'login_cliente': linha.login_cliente,
+        'data_instalacao': linha.data_instalacao.isoformat(),
+        'porcentagem_comissao': linha.porcentagem_comissao,
+        'comissao': para_reais(linha.comissao_centavos),
+        'comissao_centavos': linha.comissao_centavos,
+        'observacoes': linha.observacoes,
+    }
+
+@bp.app_template_filter('strftime')
 def _jinja2_filter_datetime(date, fmt=None):
     if isinstance(date, str):
         try: date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
@@ -83,23 +1457,43 @@ def _jinja2_filter_datetime(date, fmt=None):
     return date.strftime(fmt or '%d/%m/%Y')
 
 # --- Rotas de Autenticação ---
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
+@orcamento_consultas(3)
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     if request.method == 'POST':
+        chave_usuario = request.form['username'].strip().lower()
+        chave_ip = request.remote_addr or ''
+        if limite_login_usuario.bloqueado(chave_usuario) or limite_login_ip.bloqueado(chave_ip):
+            flash('Demasiadas tentativas de login. Aguarde alguns minutos e tente novamente.', 'danger')
+            return render_template('login.html'), 429
         user = User.query.filter_by(username=request.form['username']).first()
-        if user and user.check_password(request.form['password']):
+        try:
+            senha_correta = user is not None and user.check_password(request.form['password'])
+            if senha_correta and user.precisa_rehash():
+                # O custo do bcrypt mudou desde que a senha foi gravada: aproveita a senha em claro para atualizar.
+                user.set_password(request.form['password'])
+                db.session.commit()
+        except ServidorOcupado:
+            flash('O servidor está ocupado. Tente novamente em instantes.', 'warning')
+            return render_template('login.html'), 503
+        if senha_correta:
+            limite_login_usuario.limpar(chave_usuario)
             login_user(user)
-            return redirect(url_for('index'))
+            cache_usuarios.guardar(IdentidadeUsuario(user.id, user.username, user.is_admin))
+            return redirect(url_for('main.index'))
         else:
+            limite_login_usuario.registrar_falha(chave_usuario)
+            limite_login_ip.registrar_falha(chave_ip)
             flash('Login inválido. Verifique o seu nome de utilizador e senha.', 'danger')
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
+@orcamento_consultas(3)
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
@@ -107,166 +1501,658 @@ def register():
 
         if password != confirm_password:
             flash('As senhas não coincidem!', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
         
         existing_user = User.query.filter_by(username=username).first()
         if existing_user:
             flash('Este nome de utilizador já existe. Por favor, escolha outro.', 'warning')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
 
         new_user = User(username=username)
-        new_user.set_password(password)
+        try:
+            new_user.set_password(password)
+        except ServidorOcupado:
+            flash('O servidor está ocupado. Tente novamente em instantes.', 'warning')
+            return redirect(url_for('main.register'))
         db.session.add(new_user)
         db.session.commit()
+        cache_usuarios.invalidar(new_user.id)
         flash('A sua conta foi criada com sucesso! Agora pode fazer o login.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('register.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    resposta = redirect(url_for('main.login'))
+    # Apaga o cache HTTP do navegador (páginas e relatórios do técnico). As cópias do service
+    # worker são apagadas por ele próprio ao intercetar /logout; "storage" não é usado porque
+    # apagaria também a fila offline de instalações por enviar.
+    resposta.headers['Clear-Site-Data'] = '"cache"'
+    return resposta
 
 # --- Rotas da Aplicação Principal (Protegidas) ---
-@app.route('/', methods=['GET', 'POST'])
+@bp.route('/', methods=['GET', 'POST'])
 @login_required
+@orcamento_consultas(6)
 def index():
     if request.method == 'POST':
         try:
+            catalogo = cache_catalogo.atual()
+            combo = catalogo.combos[request.form['tipo_combo']][request.form['combo_key']]
+            porcentagem_comissao = ler_porcentagem(request.form['porcentagem_comissao'])
+            valor_arredondado_centavos = arredondar_centavos(combo["preco_centavos"])
             nova_instalacao = Instalacao(
                 tipo_combo=request.form['tipo_combo'],
-                descricao_combo=COMBOS[request.form['tipo_combo']][request.form['combo_key']]["descricao"],
-                valor_original=COMBOS[request.form['tipo_combo']][request.form['combo_key']]["preco"],
-                valor_arredondado=arredondar_valor(COMBOS[request.form['tipo_combo']][request.form['combo_key']]["preco"]),
+                descricao_combo=combo["descricao"],
+                valor_original_centavos=combo["preco_centavos"],
+                valor_arredondado_centavos=valor_arredondado_centavos,
                 login_cliente=request.form['login_cliente'],
-                data_instalacao=request.form['data_instalacao'],
-                porcentagem_comissao=float(request.form['porcentagem_comissao']),
-                comissao=arredondar_valor(COMBOS[request.form['tipo_combo']][request.form['combo_key']]["preco"]) * (float(request.form['porcentagem_comissao']) / 100.0),
+                data_instalacao=datetime.date.fromisoformat(request.form['data_instalacao']),
+                porcentagem_comissao=porcentagem_comissao,
+                comissao_centavos=calcular_comissao_centavos(valor_arredondado_centavos, porcentagem_comissao),
                 observacoes=request.form.get('observacoes', ''),
-                author=current_user
+                user_id=current_user.id,
+                catalogo_versao_id=catalogo.id
             )
             db.session.add(nova_instalacao)
+            registrar_no_resumo(current_user.id, nova_instalacao.data_instalacao, nova_instalacao.comissao_centavos)
+            marcar_dados_alterados(current_user.id)
             db.session.commit()
             flash('Instalação registada com sucesso!', 'success')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('main.index'))
         except Exception as e:
+            db.session.rollback()
             return f"Ocorreu um erro: {e}", 500
 
-    instalacoes = Instalacao.query.filter_by(author=current_user).order_by(Instalacao.data_registro.desc()).all()
-    total_comissoes = sum(inst.comissao for inst in instalacoes)
-    historico = RelatorioHistorico.query.filter_by(author=current_user).order_by(RelatorioHistorico.data_salva.desc()).all()
+    instalacoes, proximo_cursor = pagina_instalacoes(current_user.id)
+    total_comissoes, _ = totais_resumo(current_user.id)
+    historico = (RelatorioHistorico.query.filter(RelatorioHistorico.user_id == current_user.id,
+                                                 or_(RelatorioHistorico.concluido, RelatorioHistorico.reaberto))
+                 .order_by(RelatorioHistorico.data_salva.desc()).all())
+    tarefas_ativas = TarefaArquivamento.query.filter(TarefaArquivamento.user_id == current_user.id, TarefaArquivamento.estado.in_(('pendente', 'em_andamento'))).all()
     
-    return render_template('index.html', instalacoes=instalacoes, total_comissoes=total_comissoes, historico=historico, COMBOS_JS=json.dumps(COMBOS))
+    return render_template('index.html', instalacoes=instalacoes, proximo_cursor=proximo_cursor, total_comissoes=total_comissoes, historico=historico, tarefas_ativas=tarefas_ativas, catalogo=cache_catalogo.atual())
+
+@bp.route('/instalacoes/pagina')
+@login_required
+@orcamento_consultas(3)
+def instalacoes_pagina():
+    try:
+        instalacoes, proximo_cursor = pagina_instalacoes(current_user.id, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'erro': 'Cursor inválido.'}), 400
+    itens = []
+    for inst in instalacoes:
+        item = serializar_instalacao(inst)
+        item['url_editar'] = url_for('main.editar', instalacao_id=inst.id)
+        item['url_excluir'] = url_for('main.excluir', instalacao_id=inst.id)
+        itens.append(item)
+    return jsonify({'instalacoes': itens, 'proximo_cursor': proximo_cursor})
+
+@bp.route('/importar', methods=['POST'])
+@login_required
+@orcamento_consultas(permitir_repeticoes=True)
+def importar():
+    quer_json = request.accept_mimetypes.best == 'application/json'
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        if quer_json:
+            return jsonify({'erro': 'Nenhum arquivo enviado.'}), 400
+        flash('Selecione um arquivo CSV ou XLSX para importar.', 'warning')
+        return redirect(url_for('main.index'))
+    try:
+        importadas, erros = importar_instalacoes(ler_linhas_importacao(arquivo), current_user.id)
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        if quer_json:
+            return jsonify({'erro': str(e)}), 400
+        flash(f'Não foi possível ler o arquivo: {e}', 'danger')
+        return redirect(url_for('main.index'))
+    if quer_json:
+        return jsonify({'importadas': importadas, 'erros': erros})
+    flash(f'{importadas} instalações importadas com sucesso.', 'success' if importadas else 'warning')
+    for erro in erros[:10]:
+        flash(f"Linha {erro['linha']}: {erro['erro']}", 'danger')
+    if len(erros) > 10:
+        flash(f'... e mais {len(erros) - 10} linhas com erro.', 'danger')
+    return redirect(url_for('main.index'))
 
-@app.route('/editar/<int:instalacao_id>', methods=['GET', 'POST'])
+@bp.route('/editar/<int:instalacao_id>', methods=['GET', 'POST'])
 @login_required
+@orcamento_consultas(8)
 def editar(instalacao_id):
     instalacao = Instalacao.query.get_or_404(instalacao_id)
-    if instalacao.author != current_user:
+    if instalacao.user_id != current_user.id:
         flash("Você não tem permissão para editar este registo.", "danger")
-        return redirect(url_for('index'))
-    
+        return redirect(url_for('main.index'))
+    if instalacao.relatorio is not None and not instalacao.relatorio.reaberto:
+        flash("Este registo pertence a um período fechado. Reabra o período para o corrigir.", "warning")
+        return redirect(url_for('main.index'))
+    destino = url_for('main.relatorio_historico', relatorio_id=instalacao.relatorio_id) if instalacao.relatorio_id else url_for('main.index')
+
     if request.method == 'POST':
         try:
+            diferencas = DiferencasTotais()
+            diferencas.contabilizar_instalacao(instalacao, -1)
             instalacao.tipo_combo = request.form['tipo_combo']
             combo_key = request.form['combo_key']
-            instalacao.porcentagem_comissao = float(request.form['porcentagem_comissao'])
-            instalacao.descricao_combo = COMBOS[instalacao.tipo_combo][combo_key]['descricao']
-            instalacao.valor_original = COMBOS[instalacao.tipo_combo][combo_key]['preco']
-            instalacao.valor_arredondado = arredondar_valor(instalacao.valor_original)
-            instalacao.comissao = instalacao.valor_arredondado * (instalacao.porcentagem_comissao / 100.0)
+            instalacao.porcentagem_comissao = ler_porcentagem(request.form['porcentagem_comissao'])
+            catalogo = cache_catalogo.atual()
+            combo = catalogo.combos[instalacao.tipo_combo][combo_key]
+            instalacao.descricao_combo = combo['descricao']
+            instalacao.valor_original_centavos = combo['preco_centavos']
+            instalacao.catalogo_versao_id = catalogo.id
+            instalacao.valor_arredondado_centavos = arredondar_centavos(instalacao.valor_original_centavos)
+            instalacao.comissao_centavos = calcular_comissao_centavos(instalacao.valor_arredondado_centavos, instalacao.porcentagem_comissao)
             instalacao.login_cliente = request.form['login_cliente']
-            instalacao.data_instalacao = request.form['data_instalacao']
+            instalacao.data_instalacao = datetime.date.fromisoformat(request.form['data_instalacao'])
             instalacao.observacoes = request.form.get('observacoes', '')
+            if instalacao.relatorio is not None and not instalacao.relatorio.contem_data(instalacao.data_instalacao):
+                # A nova data está fora do período reaberto: a instalação volta a ficar aberta.
+                instalacao.relatorio_id = None
+            diferencas.contabilizar_instalacao(instalacao)
+            diferencas.aplicar(instalacao.user_id)
+            marcar_dados_alterados(instalacao.user_id)
             db.session.commit()
             flash('Registo atualizado com sucesso!', 'success')
-            return redirect(url_for('index'))
+            return redirect(destino)
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return redirect(url_for('main.editar', instalacao_id=instalacao_id))
         except Exception as e:
             db.session.rollback()
             return f"Ocorreu um erro ao editar: {e}", 500
-    return render_template('editar.html', instalacao=instalacao, COMBOS_JS=json.dumps(COMBOS))
+    return render_template('editar.html', instalacao=instalacao, catalogo=cache_catalogo.atual())
 
-@app.route('/excluir/<int:instalacao_id>', methods=['POST'])
+@bp.route('/excluir/<int:instalacao_id>', methods=['POST'])
 @login_required
+@orcamento_consultas(6)
 def excluir(instalacao_id):
     instalacao = Instalacao.query.get_or_404(instalacao_id)
-    if instalacao.author != current_user:
+    if instalacao.user_id != current_user.id:
         flash("Você não tem permissão para excluir este registo.", "danger")
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
+    if instalacao.relatorio is not None and not instalacao.relatorio.reaberto:
+        flash("Este registo pertence a um período fechado. Reabra o período para o corrigir.", "warning")
+        return redirect(url_for('main.index'))
+    destino = url_for('main.relatorio_historico', relatorio_id=instalacao.relatorio_id) if instalacao.relatorio_id else url_for('main.index')
     try:
+        diferencas = DiferencasTotais()
+        diferencas.contabilizar_instalacao(instalacao, -1)
+        diferencas.aplicar(instalacao.user_id)
         db.session.delete(instalacao)
+        marcar_dados_alterados(instalacao.user_id)
         db.session.commit()
         flash('Registo excluído com sucesso!', 'success')
-        return redirect(url_for('index'))
+        return redirect(destino)
     except Exception as e:
+        db.session.rollback()
         return f"Ocorreu um erro ao excluir: {e}", 500
 
-@app.route('/salvar-periodo', methods=['POST'])
+@bp.route('/salvar-periodo', methods=['POST'])
 @login_required
+@orcamento_consultas(permitir_repeticoes=True)
 def salvar_periodo():
     try:
-        start_date_str = request.form['start_date']
-        end_date_str = request.form['end_date']
+        start_date = datetime.date.fromisoformat(request.form['start_date'])
+        end_date = datetime.date.fromisoformat(request.form['end_date'])
         
-        instalacoes_periodo = Instalacao.query.filter(
-            Instalacao.author == current_user,
-            Instalacao.data_instalacao.between(start_date_str, end_date_str)
-        ).all()
+        _, num_instalacoes_periodo = totais_resumo(current_user.id, start_date, end_date)
         
-        if instalacoes_periodo:
-            total_comissoes_periodo = sum(inst.comissao for inst in instalacoes_periodo)
-            instalacoes_list = [{'descricao_combo': i.descricao_combo, 'login_cliente': i.login_cliente, 'data_instalacao': i.data_instalacao, 'comissao': i.comissao, 'porcentagem_comissao': i.porcentagem_comissao, 'observacoes': i.observacoes} for i in instalacoes_periodo]
-            novo_relatorio = RelatorioHistorico(data_inicio=start_date_str, data_fim=end_date_str, total_comissoes=total_comissoes_periodo, num_instalacoes=len(instalacoes_periodo), instalacoes_json=json.dumps(instalacoes_list), author=current_user)
-            db.session.add(novo_relatorio)
-            Instalacao.query.filter(Instalacao.id.in_([i.id for i in instalacoes_periodo])).delete(synchronize_session=False)
-            db.session.commit()
-            flash('Período salvo no histórico com sucesso!', 'success')
+        if fecho_em_curso(current_user.id, start_date, end_date) is not None:
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({'erro': 'Já há um fecho em curso para este período.'}), 409
+            flash('Já há um fecho em curso que inclui este período. Aguarde que termine.', 'warning')
+        elif num_instalacoes_periodo:
+            tarefa = agendar_fecho(current_user.id, start_date, end_date, num_instalacoes_periodo)
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify(serializar_tarefa(tarefa)), 202
+            flash('O período está a ser fechado. O relatório aparecerá no histórico quando terminar.', 'success')
         else:
             flash('Nenhuma instalação encontrada no período selecionado.', 'warning')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     except Exception as e:
         db.session.rollback()
         return f"Ocorreu um erro ao salvar o período: {e}", 500
 
+@bp.route('/tarefas/<int:tarefa_id>')
+@login_required
+@orcamento_consultas(3)
+def estado_tarefa(tarefa_id):
+    tarefa = TarefaArquivamento.query.get_or_404(tarefa_id)
+    if tarefa.user_id != current_user.id:
+        abort(404)
+    return jsonify(serializar_tarefa(tarefa))
+
+@bp.route('/relatorio-historico/<int:relatorio_id>/reabrir', methods=['POST'])
+@login_required
+@orcamento_consultas(6)
+def reabrir_periodo(relatorio_id):
+    relatorio = RelatorioHistorico.query.get_or_404(relatorio_id)
+    if relatorio.user_id != current_user.id:
+        abort(404)
+    if not relatorio.concluido:
+        flash('Este período ainda está a ser fechado ou já foi reaberto.', 'warning')
+    else:
+        # As linhas continuam marcadas com o relatório; só passam a poder ser corrigidas.
+        relatorio.concluido = False
+        relatorio.reaberto = True
+        marcar_dados_alterados(current_user.id)
+        db.session.commit()
+        flash('Período reaberto. As instalações podem ser corrigidas até o período ser fechado de novo.', 'success')
+    return redirect(url_for('main.relatorio_historico', relatorio_id=relatorio.id))
+
+@bp.route('/relatorio-historico/<int:relatorio_id>/fechar', methods=['POST'])
+@login_required
+@orcamento_consultas(permitir_repeticoes=True)
+def fechar_periodo(relatorio_id):
+    relatorio = RelatorioHistorico.query.get_or_404(relatorio_id)
+    if relatorio.user_id != current_user.id:
+        abort(404)
+    em_curso = fecho_em_curso(current_user.id, datetime.date.fromisoformat(relatorio.data_inicio),
+                              datetime.date.fromisoformat(relatorio.data_fim))
+    if not relatorio.reaberto or em_curso is not None:
+        flash('Este período não está reaberto.', 'warning')
+        return redirect(url_for('main.relatorio_historico', relatorio_id=relatorio.id))
+    tarefa = agendar_fecho(current_user.id, datetime.date.fromisoformat(relatorio.data_inicio),
+                           datetime.date.fromisoformat(relatorio.data_fim), 0, relatorio.id)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(serializar_tarefa(tarefa)), 202
+    flash('O período está a ser fechado de novo.', 'success')
+    return redirect(url_for('main.index'))
+
 # --- Rotas de Relatório ---
-@app.route('/relatorio-historico/<int:relatorio_id>')
+@bp.route('/relatorio-historico/<int:relatorio_id>')
 @login_required
+@orcamento_consultas(5)
 def relatorio_historico(relatorio_id):
     relatorio = RelatorioHistorico.query.get_or_404(relatorio_id)
-    if relatorio.author != current_user:
+    if relatorio.user_id != current_user.id:
         flash("Você não tem permissão para ver este relatório.", "danger")
-        return redirect(url_for('index'))
-    instalacoes_lista = json.loads(relatorio.instalacoes_json)
-    data_hoje = datetime.datetime.now()
-    return render_template('relatorio_historico.html', relatorio=relatorio, instalacoes=instalacoes_lista, data_hoje=data_hoje)
+        return redirect(url_for('main.index'))
+    cliente = request.args.get('cliente', '').strip()
+    numero_pagina = request.args.get('page', 1, type=int)
+
+    def contexto():
+        query = Instalacao.query.filter_by(relatorio_id=relatorio.id)
+        if cliente:
+            query = query.filter(Instalacao.login_cliente.contains(cliente, autoescape=True))
+        pagina = db.paginate(query.order_by(Instalacao.data_instalacao, Instalacao.id), page=numero_pagina,
+                             per_page=ITENS_POR_PAGINA, max_per_page=ITENS_POR_PAGINA)
+        return {'relatorio': relatorio, 'instalacoes': pagina.items, 'pagina': pagina, 'cliente': cliente}
+    if cliente:
+        # O filtro é texto livre: cada valor seria uma entrada nova no cache (e no disco).
+        return render_template('relatorio_historico.html', data_hoje=datetime.datetime.now(), **contexto())
+    # Só páginas que existem chegam ao cache: uma página fora do relatório dá 404 em db.paginate.
+    return resposta_relatorio_arquivado(relatorio, 'relatorio_historico.html', numero_pagina, contexto)
 
-@app.route('/relatorio/imprimir')
+@bp.route('/relatorio/imprimir')
 @login_required
+@orcamento_consultas(4)
 def relatorio_imprimir():
-    instalacoes = Instalacao.query.filter_by(author=current_user).order_by(Instalacao.data_instalacao.asc()).all()
-    total_comissoes = sum(inst.comissao for inst in instalacoes)
+    instalacoes = Instalacao.query.filter_by(user_id=current_user.id, relatorio_id=None).order_by(Instalacao.data_instalacao.asc()).all()
+    total_comissoes, _ = totais_resumo(current_user.id)
     return render_template('relatorio_imprimir.html', instalacoes=instalacoes, total_comissoes=total_comissoes, data_hoje=datetime.datetime.now())
 
-@app.route('/relatorio-historico/<int:relatorio_id>/imprimir')
+@bp.route('/relatorio-historico/<int:relatorio_id>/imprimir')
 @login_required
+@orcamento_consultas(4)
 def relatorio_historico_imprimir(relatorio_id):
     relatorio = RelatorioHistorico.query.get_or_404(relatorio_id)
-    if relatorio.author != current_user:
+    if relatorio.user_id != current_user.id:
         flash("Você não tem permissão para ver este relatório.", "danger")
-        return redirect(url_for('index'))
-    instalacoes_lista = json.loads(relatorio.instalacoes_json)
-    return render_template('relatorio_historico_imprimir.html', relatorio=relatorio, instalacoes=instalacoes_lista, data_hoje=datetime.datetime.now())
+        return redirect(url_for('main.index'))
+
+    def contexto():
+        instalacoes = Instalacao.query.filter_by(relatorio_id=relatorio.id).order_by(Instalacao.data_instalacao, Instalacao.id).all()
+        return {'relatorio': relatorio, 'instalacoes': instalacoes}
+    return resposta_relatorio_arquivado(relatorio, 'relatorio_historico_imprimir.html', None, contexto)
+
+@bp.route('/relatorio/imprimir.pdf')
+@login_required
+@orcamento_consultas(5)
+def relatorio_imprimir_pdf():
+    user_id = current_user.id
+    chave = ('pdf', 'aberto', user_id, versao_dados_usuario(), VERSAO_LAYOUT)
+
+    def argumentos():
+        total_comissoes, _ = totais_resumo(user_id)
+        subtitulos = [f"Gerado em: {datetime.datetime.now().strftime('%d/%m/%Y às %H:%M')}"]
+        return ('Relatório de Comissões', subtitulos,
+                linhas_pdf(Instalacao.user_id == user_id, Instalacao.relatorio_id.is_(None)), total_comissoes)
+    return resposta_pdf(chave, argumentos, f'comissoes_{datetime.date.today().isoformat()}.pdf', imutavel=False)
+
+@bp.route('/relatorio-historico/<int:relatorio_id>/imprimir.pdf')
+@login_required
+@orcamento_consultas(4)
+def relatorio_historico_imprimir_pdf(relatorio_id):
+    relatorio = RelatorioHistorico.query.get_or_404(relatorio_id)
+    if relatorio.user_id != current_user.id:
+        flash("Você não tem permissão para ver este relatório.", "danger")
+        return redirect(url_for('main.index'))
+    if relatorio.concluido:
+        chave = ('pdf', relatorio.id, relatorio.versao, VERSAO_LAYOUT)
+    else:
+        # Reaberto ou ainda a fechar: muda com cada alteração (e cada lote do fecho).
+        chave = ('pdf', relatorio.id, 'aberto', versao_dados_usuario(), VERSAO_LAYOUT)
+
+    def argumentos():
+        subtitulos = [f"Período: {_jinja2_filter_datetime(relatorio.data_inicio)} a {_jinja2_filter_datetime(relatorio.data_fim)}",
+                      f"Fechado em: {relatorio.data_salva.strftime('%d/%m/%Y às %H:%M')}"]
+        return ('Relatório Histórico Detalhado', subtitulos,
+                linhas_pdf(Instalacao.relatorio_id == relatorio.id), relatorio.total_comissoes_centavos)
+    return resposta_pdf(chave, argumentos, f'relatorio_{relatorio.data_inicio}_{relatorio.data_fim}.pdf', imutavel=relatorio.concluido)
+
+# --- Rotas de Exportação ---
+@bp.route('/exportar/<tipo>.<formato>')
+@login_required
+@orcamento_consultas(3)
+def exportar(tipo, formato):
+    if tipo not in ('instalacoes', 'relatorios') or formato not in ('csv', 'json'):
+        abort(404)
+    # Administradores podem exportar os dados de todos os técnicos com ?todos=1.
+    todos = request.args.get('todos') == '1'
+    if todos and not current_user.is_admin:
+        abort(403)
+    resultado = db.session.execute(consulta_exportacao(tipo, None if todos else current_user.id))
+    gerador = gerar_csv(resultado) if formato == 'csv' else gerar_json(resultado)
+    nome_arquivo = f"{tipo}_{datetime.date.today().isoformat()}.{formato}"
+    return Response(stream_with_context(gerador), mimetype='text/csv' if formato == 'csv' else 'application/json',
+                    headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}"'})
+
+# --- API JSON (v1) ---
+# Só leitura, para a PWA. Cada resposta leva um ETag forte formado pelo utilizador, pela versão
+# dos seus dados (User.versao_dados) e pelo pedido (caminho + query string). Quando o cliente
+# envia o mesmo ETag em If-None-Match, a resposta é um 304 sem corpo e a rota nem chega a
+# consultar os dados, o que poupa transferência e trabalho em ligações lentas.
+def versao_dados_usuario():
+    return db.session.execute(select(User.versao_dados).where(User.id == current_user.id)).scalar()
+
+def versao_catalogo():
+    return cache_catalogo.atual().id or 0
+
+def rota_api(regra, versao=versao_dados_usuario):
+    def decorador(funcao):
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            if not current_user.is_authenticated:
+                return jsonify({'erro': 'Autenticação necessária.'}), 401
+            versao_atual = versao()
+            etag = f"{current_user.id}.{versao_atual}.{zlib.crc32(request.full_path.encode('utf-8')):08x}"
+            # Comparação fraca: as respostas comprimidas com gzip levam o mesmo ETag como W/"...".
+            if request.if_none_match.contains_weak(etag):
+                resposta = Response(status=304)
+            else:
+                resultado = funcao(*args, **kwargs)
+                if not isinstance(resultado, dict):
+                    return resultado
+                resposta = jsonify(resultado)
+            resposta.set_etag(etag)
+            resposta.headers['Cache-Control'] = 'private, no-cache'
+            if versao is versao_dados_usuario:
+                # A versão em que o cliente se baseia ao enviar alterações em lote.
+                resposta.headers['X-Versao-Dados'] = str(versao_atual)
+            return resposta
+        return bp.route('/api/v1' + regra)(envolvida)
+    return decorador
+
+def serializar_relatorio(relatorio):
+    return {
+        'id': relatorio.id,
+        'data_inicio': relatorio.data_inicio,
+        'data_fim': relatorio.data_fim,
+        'total_comissoes': para_reais(relatorio.total_comissoes_centavos),
+        'total_comissoes_centavos': relatorio.total_comissoes_centavos,
+        'num_instalacoes': relatorio.num_instalacoes,
+        'data_salva': relatorio.data_salva.isoformat() if relatorio.data_salva else None,
+    }
+
+def serializar_item_relatorio(item):
+    return {
+        'tipo_combo': item.tipo_combo,
+        'descricao_combo': item.descricao_combo,
+        'login_cliente': item.login_cliente,
+        'data_instalacao': item.data_instalacao.isoformat(),
+        'porcentagem_comissao': item.porcentagem_comissao,
+        'comissao': para_reais(item.comissao_centavos),
+        'comissao_centavos': item.comissao_centavos,
+        'observacoes': item.observacoes,
+    }
+
+@rota_api('/instalacoes')
+@orcamento_consultas(4)
+def api_instalacoes():
+    try:
+        instalacoes, proximo_cursor = pagina_instalacoes(current_user.id, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'erro': 'Cursor inválido.'}), 400
+    return {'instalacoes': [serializar_instalacao(inst) for inst in instalacoes], 'proximo_cursor': proximo_cursor}
+
+@rota_api('/totais')
+@orcamento_consultas(4)
+def api_totais():
+    try:
+        data_inicio = datetime.date.fromisoformat(request.args['inicio']) if request.args.get('inicio') else None
+        data_fim = datetime.date.fromisoformat(request.args['fim']) if request.args.get('fim') else None
+    except ValueError:
+        return jsonify({'erro': 'Datas inválidas; use o formato AAAA-MM-DD.'}), 400
+    total_comissoes_centavos, num_instalacoes = totais_resumo(current_user.id, data_inicio, data_fim)
+    return {'total_comissoes': para_reais(total_comissoes_centavos), 'total_comissoes_centavos': total_comissoes_centavos, 'num_instalacoes': num_instalacoes}
+
+@rota_api('/busca')
+@orcamento_consultas(4)
+def api_busca():
+    argumentos = request.args
+    try:
+        data_inicio = datetime.date.fromisoformat(argumentos['inicio']) if argumentos.get('inicio') else None
+        data_fim = datetime.date.fromisoformat(argumentos['fim']) if argumentos.get('fim') else None
+        comissao_min = para_centavos(argumentos['comissao_min']) if argumentos.get('comissao_min') else None
+        comissao_max = para_centavos(argumentos['comissao_max']) if argumentos.get('comissao_max') else None
+        linhas, proximo_cursor = buscar_instalacoes(
+            current_user.id, argumentos.get('q', ''), data_inicio, data_fim, argumentos.get('tipo_combo') or None,
+            comissao_min, comissao_max, argumentos.get('origem', 'todas'), argumentos.get('cursor'))
+    except (ValueError, ArithmeticError):
+        return jsonify({'erro': 'Parâmetros de pesquisa inválidos.'}), 400
+    resultados = []
+    for linha in linhas:
+        resultado = serializar_resultado_busca(linha)
+        if linha.origem == 'aberta':
+            resultado['url'] = url_for('main.editar', instalacao_id=linha.id)
+        else:
+            resultado['url'] = url_for('main.relatorio_historico', relatorio_id=linha.relatorio_id, cliente=linha.login_cliente)
+        resultados.append(resultado)
+    return {'resultados': resultados, 'proximo_cursor': proximo_cursor}
+
+@rota_api('/combos', versao=versao_catalogo)
+@orcamento_consultas(2)
+def api_combos():
+    catalogo = cache_catalogo.atual()
+    return {'versao': catalogo.id, 'combos': catalogo.combos}
+
+@rota_api('/relatorios')
+@orcamento_consultas(4)
+def api_relatorios():
+    relatorios = (RelatorioHistorico.query.filter_by(user_id=current_user.id, concluido=True)
+                  .order_by(RelatorioHistorico.data_salva.desc()).all())
+    return {'relatorios': [serializar_relatorio(relatorio) for relatorio in relatorios]}
+
+@rota_api('/relatorios/<int:relatorio_id>')
+@orcamento_consultas(6)
+def api_relatorio(relatorio_id):
+    relatorio = RelatorioHistorico.query.get_or_404(relatorio_id)
+    if relatorio.user_id != current_user.id or not relatorio.concluido:
+        abort(404)
+    pagina = db.paginate(Instalacao.query.filter_by(relatorio_id=relatorio.id).order_by(Instalacao.data_instalacao, Instalacao.id),
+                         per_page=ITENS_POR_PAGINA, max_per_page=ITENS_POR_PAGINA)
+    return dict(serializar_relatorio(relatorio), itens=[serializar_item_relatorio(item) for item in pagina.items],
+                pagina=pagina.page, paginas=pagina.pages)
+
+@bp.route('/api/v1/instalacoes/lote', methods=['POST'])
+@orcamento_consultas(7)
+def api_instalacoes_lote():
+    if not current_user.is_authenticated:
+        return jsonify({'erro': 'Autenticação necessária.'}), 401
+    dados = request.get_json(silent=True)
+    entradas = dados.get('instalacoes') if isinstance(dados, dict) else None
+    if not isinstance(entradas, list) or not all(isinstance(entrada, dict) for entrada in entradas):
+        return jsonify({'erro': 'Envie {"instalacoes": [...]} em JSON.'}), 400
+    if len(entradas) > LOTE_OFFLINE_MAXIMO:
+        return jsonify({'erro': f'No máximo {LOTE_OFFLINE_MAXIMO} instalações por pedido.'}), 413
+    try:
+        resultados = registrar_lote_offline(entradas, current_user.id)
+    except IntegrityError:
+        # Outro pedido gravou o mesmo id_cliente entre a verificação e o INSERT; na segunda
+        # passagem esses ids já aparecem como duplicados.
+        db.session.rollback()
+        resultados = registrar_lote_offline(entradas, current_user.id)
+    return jsonify({'resultados': resultados})
+
+@bp.route('/api/v1/instalacoes/alteracoes', methods=['POST'])
+@orcamento_consultas(12)
+def api_instalacoes_alteracoes():
+    if not current_user.is_authenticated:
+        return jsonify({'erro': 'Autenticação necessária.'}), 401
+    dados = request.get_json(silent=True)
+    operacoes = dados.get('operacoes') if isinstance(dados, dict) else None
+    if not isinstance(operacoes, list) or not all(isinstance(op, dict) for op in operacoes):
+        return jsonify({'erro': 'Envie {"operacoes": [{"acao": "criar" | "editar" | "excluir", ...}]} em JSON.'}), 400
+    if len(operacoes) > LOTE_ALTERACOES_MAXIMO:
+        return jsonify({'erro': f'No máximo {LOTE_ALTERACOES_MAXIMO} operações por pedido.'}), 413
+    versao = dados.get('versao')
+    if versao is not None and type(versao) is not int:
+        return jsonify({'erro': 'A versão deve ser um número inteiro.'}), 400
+    try:
+        resultados = aplicar_alteracoes(operacoes, current_user.id, versao)
+    except ConflitoVersao:
+        return jsonify({'erro': 'Os dados mudaram desde a versão enviada. Atualize e tente de novo.',
+                        'versao': versao_dados_usuario()}), 409
+    if any(resultado['estado'] == 'erro' for resultado in resultados):
+        return jsonify({'resultados': resultados}), 422
+    return jsonify({'resultados': resultados, 'versao': versao_dados_usuario()})
+
+# --- Rotas de Administração ---
+@bp.route('/admin/folha')
+@login_required
+@orcamento_consultas(4)
+def admin_folha():
+    if not current_user.is_admin:
+        abort(403)
+    quer_json = request.accept_mimetypes.best == 'application/json'
+    hoje = datetime.date.today()
+    try:
+        data_inicio = datetime.date.fromisoformat(request.args.get('inicio') or hoje.replace(day=1).isoformat())
+        data_fim = datetime.date.fromisoformat(request.args.get('fim') or hoje.isoformat())
+    except ValueError:
+        if quer_json:
+            return jsonify({'erro': 'Datas inválidas; use o formato AAAA-MM-DD.'}), 400
+        flash('Datas inválidas.', 'danger')
+        data_inicio, data_fim = hoje.replace(day=1), hoje
+    folha = folha_pagamento(data_inicio, data_fim)
+    if quer_json:
+        return jsonify(folha)
+    return render_template('admin_folha.html', folha=folha, data_hoje=datetime.datetime.now())
 
 # --- Rotas de PWA ---
-@app.route('/manifest.json')
+@bp.route('/manifest.json')
 def manifest():
     return Response(json.dumps({"name": "Gerenciador de Comissões", "short_name": "Comissões", "start_url": "/", "display": "standalone", "background_color": "#1e293b", "theme_color": "#1e293b", "icons": [{"src": "/static/img/ic_launcher.png", "sizes": "512x512", "type": "image/png"}]}), mimetype='application/json')
 
-@app.route('/service-worker.js')
+@bp.route('/service-worker.js')
 def service_worker():
-    return Response("self.addEventListener('fetch', (event) => { event.respondWith(fetch(event.request)); });", mimetype='application/javascript')
+    # Servido na raiz para que o seu âmbito cubra toda a aplicação; sem cache HTTP, para que
+    # o navegador encontre logo uma versão nova.
+    return send_from_directory(current_app.static_folder, 'service-worker.js', mimetype='application/javascript', max_age=0)
+
+# --- Comandos de Linha de Comando ---
+@bp.cli.command('tornar-admin')
+@click.argument('username')
+def tornar_admin(username):
+    """Concede permissões de administrador a um utilizador."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"Utilizador '{username}' não encontrado.")
+    user.is_admin = True
+    db.session.commit()
+    cache_usuarios.invalidar(user.id)
+    click.echo(f"'{username}' agora é administrador.")
+
+@bp.cli.command('catalogo-publicar')
+@click.argument('arquivo', type=click.File('r', encoding='utf-8'))
+@click.option('--descricao', default=None, help='Nota sobre a alteração (ex.: "Preços de novembro").')
+def catalogo_publicar(arquivo, descricao):
+    """Publica uma nova versão do catálogo a partir de um JSON {tipo: {chave: {preco, descricao, porcentagem}}}."""
+    combos = json.load(arquivo)
+    versao = publicar_catalogo(combos, descricao)
+    click.echo(f"Versão {versao.id} do catálogo publicada com {sum(len(c) for c in combos.values())} combos.")
+
+@bp.cli.command('catalogo-exportar')
+def catalogo_exportar():
+    """Mostra o catálogo atual em JSON (útil como ponto de partida para catalogo-publicar)."""
+    click.echo(json.dumps(cache_catalogo.atual().combos, ensure_ascii=False, indent=2))
+
+@bp.cli.command('arquivamento-retomar')
+def arquivamento_retomar():
+    """Executa de novo as tarefas de arquivamento interrompidas (ex.: worker reiniciado a meio) ou
+    com erro. As que tiveram progresso há menos de ARQUIVAMENTO_PRAZO_SEGUNDOS ainda estão a ser
+    executadas por um worker e ficam de fora."""
+    estados = ESTADOS_EM_CURSO + ('erro',)
+    tarefas = reservar_tarefas_paradas(current_app.config['ARQUIVAMENTO_PRAZO_SEGUNDOS'], estados)
+    concluidas = 0
+    for tarefa_id, reserva in tarefas:
+        click.echo(f"Tarefa {tarefa_id}...")
+        concluidas += executar_arquivamento(tarefa_id, current_app.config['ARQUIVAMENTO_LOTE'], reserva, estados)
+    click.echo(f"{concluidas} tarefas concluídas.")
+
+@bp.cli.command('ativos-construir')
+@click.option('--sem-tailwind', is_flag=True, help='Não recompila static/css/app.css (ex.: já gerado noutra máquina).')
+def ativos_construir(sem_tailwind):
+    """Compila o CSS do Tailwind e gera os arquivos estáticos com hash e comprimidos em static/dist."""
+    if not sem_tailwind:
+        try:
+            compilar_tailwind(current_app.config['TAILWIND_CLI'], current_app.root_path)
+        except FileNotFoundError:
+            raise click.ClickException(f"Executável '{current_app.config['TAILWIND_CLI']}' não encontrado; instale o Tailwind CLI ou defina TAILWIND_CLI.")
+        except subprocess.CalledProcessError as e:
+            raise click.ClickException(f"O Tailwind CLI terminou com o código {e.returncode}.")
+    manifesto = construir_ativos(current_app.static_folder)
+    click.echo(f"{len(manifesto)} arquivos gerados em static/dist. Reinicie a aplicação para os usar.")
+
+@bp.cli.command('comissoes-recalcular')
+@click.option('--versao', type=int, default=None, help='Versão do catálogo cujos preços são aplicados (por omissão, a atual).')
+@click.option('--manter-precos', is_flag=True, help='Não altera os preços; só recalcula a comissão (ex.: com --porcentagem).')
+@click.option('--porcentagem', type=float, default=None, help='Nova percentagem de comissão.')
+@click.option('--usuario', default=None, help='Só as instalações deste técnico.')
+@click.option('--inicio', type=click.DateTime(['%Y-%m-%d']), default=None)
+@click.option('--fim', type=click.DateTime(['%Y-%m-%d']), default=None)
+def comissoes_recalcular(versao, manter_precos, porcentagem, usuario, inicio, fim):
+    """Recalcula, num único UPDATE, as comissões das instalações ainda não arquivadas."""
+    user_id = None
+    if usuario:
+        user = User.query.filter_by(username=usuario).first()
+        if user is None:
+            raise click.ClickException(f"Utilizador '{usuario}' não encontrado.")
+        user_id = user.id
+    if (inicio is None) != (fim is None):
+        raise click.ClickException("Indique --inicio e --fim juntos.")
+    if porcentagem is not None:
+        try:
+            ler_porcentagem(porcentagem)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    if not manter_precos and versao is None:
+        versao = cache_catalogo.atual().id
+        if versao is None:
+            raise click.ClickException("Nenhuma versão do catálogo publicada; use --manter-precos ou publique uma com catalogo-publicar.")
+    alteradas = recalcular_comissoes(None if manter_precos else versao, user_id,
+                                     inicio.date() if inicio else None, fim.date() if fim else None, porcentagem)
+    click.echo(f"{alteradas} instalações recalculadas.")
 
 # --- Ponto de Entrada ---
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
\ No newline at end of file
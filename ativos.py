@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Arquivos estáticos com nome por conteúdo, pré-comprimidos e com cache de longa duração.
+
+``construir_ativos`` (chamado por ``flask ativos-construir``) copia cada arquivo de
+``static/`` para ``static/dist/`` com um hash do conteúdo no nome, grava as variantes
+``.gz`` e ``.br`` (esta só se o pacote ``brotli`` estiver instalado) e um ``manifest.json``.
+
+A extensão ``Ativos`` lê esse manifesto e faz com que ``url_for('static', filename=...)``
+aponte para o nome com hash, serve a variante comprimida que o navegador aceitar com
+``Cache-Control: immutable`` e comprime com gzip as respostas HTML e JSON geradas pela
+aplicação. Sem manifesto (ex.: em desenvolvimento) tudo funciona com os nomes originais.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import subprocess
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PASTA_DIST = 'dist'
+PASTAS_IGNORADAS = (PASTA_DIST, 'src')
+# Precisam de um endereço fixo: o service worker é servido pela sua própria rota.
+ARQUIVOS_IGNORADOS = ('service-worker.js',)
+EXTENSOES_COMPRIMIVEIS = ('.css', '.js', '.json', '.svg', '.html', '.txt', '.map')
+TIPOS_COMPRIMIVEIS = ('text/html', 'application/json', 'text/css', 'application/javascript')
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+
+def compilar_tailwind(cli, raiz_projeto):
+    """Gera ``static/css/app.css`` só com as classes usadas nos templates e scripts."""
+    subprocess.run([cli, '-c', 'tailwind.config.js', '-i', 'static/src/tailwind.css',
+                    '-o', 'static/css/app.css', '--minify'], cwd=raiz_projeto, check=True)
+
+
+def construir_ativos(pasta_static):
+    """Gera ``static/dist`` e devolve o manifesto {caminho original: caminho com hash}."""
+    pasta_dist = os.path.join(pasta_static, PASTA_DIST)
+    shutil.rmtree(pasta_dist, ignore_errors=True)
+    manifesto = {}
+    for raiz, pastas, arquivos in os.walk(pasta_static):
+        if raiz == pasta_static:
+            pastas[:] = [p for p in pastas if p not in PASTAS_IGNORADAS]
+        for nome in arquivos:
+            relativo = os.path.relpath(os.path.join(raiz, nome), pasta_static).replace(os.sep, '/')
+            if relativo in ARQUIVOS_IGNORADOS:
+                continue
+            with open(os.path.join(raiz, nome), 'rb') as arquivo:
+                conteudo = arquivo.read()
+            base, extensao = os.path.splitext(relativo)
+            destino = f"{PASTA_DIST}/{base}.{hashlib.sha256(conteudo).hexdigest()[:12]}{extensao}"
+            caminho_destino = os.path.join(pasta_static, *destino.split('/'))
+            os.makedirs(os.path.dirname(caminho_destino), exist_ok=True)
+            with open(caminho_destino, 'wb') as arquivo:
+                arquivo.write(conteudo)
+            if extensao.lower() in EXTENSOES_COMPRIMIVEIS:
+                with open(caminho_destino + '.gz', 'wb') as arquivo:
+                    arquivo.write(gzip.compress(conteudo, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(caminho_destino + '.br', 'wb') as arquivo:
+                        arquivo.write(brotli.compress(conteudo, quality=11))
+            manifesto[relativo] = destino
+    with open(os.path.join(pasta_dist, 'manifest.json'), 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2, sort_keys=True)
+    return manifesto
+
+
+class Ativos:
+    def __init__(self, app=None):
+        self.manifesto = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRIMIR_RESPOSTAS', True)
+        app.config.setdefault('COMPRIMIR_MINIMO_BYTES', 500)
+        self.manifesto = self.carregar_manifesto(app.static_folder)
+        app.url_defaults(self._url_com_hash)
+        app.view_functions['static'] = self._servir
+        app.jinja_env.globals['ativo_existe'] = self.existe
+        if app.config['COMPRIMIR_RESPOSTAS']:
+            app.after_request(self._comprimir)
+
+    @staticmethod
+    def carregar_manifesto(pasta_static):
+        try:
+            with open(os.path.join(pasta_static, PASTA_DIST, 'manifest.json'), encoding='utf-8') as arquivo:
+                return json.load(arquivo)
+        except FileNotFoundError:
+            return {}
+
+    def existe(self, caminho):
+        return caminho in self.manifesto
+
+    def _url_com_hash(self, endpoint, valores):
+        if endpoint == 'static' and valores.get('filename') in self.manifesto:
+            valores['filename'] = self.manifesto[valores['filename']]
+
+    def _servir(self, filename):
+        pasta = current_app.static_folder
+        if not filename.startswith(PASTA_DIST + '/'):
+            return send_from_directory(pasta, filename)
+        codificacoes = request.accept_encodings
+        for codificacao, sufixo in (('br', '.br'), ('gzip', '.gz')):
+            if codificacoes[codificacao] and os.path.isfile(os.path.join(pasta, filename + sufixo)):
+                resposta = send_from_directory(pasta, filename + sufixo, mimetype=_tipo(filename))
+                resposta.headers['Content-Encoding'] = codificacao
+                break
+        else:
+            resposta = send_from_directory(pasta, filename)
+        # O nome muda quando o conteúdo muda, por isso o navegador nunca precisa de revalidar.
+        resposta.headers['Cache-Control'] = CACHE_IMUTAVEL
+        resposta.vary.add('Accept-Encoding')
+        return resposta
+
+    def _comprimir(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 304) or response.direct_passthrough
+                or response.is_streamed or 'Content-Encoding' in response.headers
+                or response.mimetype not in TIPOS_COMPRIMIVEIS or not request.accept_encodings['gzip']):
+            return response
+        corpo = response.get_data()
+        if len(corpo) < current_app.config['COMPRIMIR_MINIMO_BYTES']:
+            return response
+        response.set_data(gzip.compress(corpo, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        # A variante comprimida tem outros bytes; o ETag passa a fraco (mesmo conteúdo).
+        etag, fraco = response.get_etag()
+        if etag and not fraco:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def _tipo(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""Benchmark das rotas principais.
+
+Cria um banco SQLite com dados sintéticos (técnicos, instalações e relatórios arquivados) e
+mede a latência (p50/p90/p99) e o número de instruções SQL por pedido de ``index``,
+``editar``, ``salvar_periodo``, ``relatorio_imprimir`` e ``relatorio_historico``:
+
+* com o cliente de testes do Flask, no próprio processo (latência e SQL por pedido);
+* opcionalmente (``--gunicorn``), contra um gunicorn com vários workers, com pedidos
+  concorrentes (latência e pedidos por segundo).
+
+O resultado é gravado em JSON. Com ``--comparar base.json`` o script termina com código 1
+se alguma rota ficou mais lenta (p90) que a tolerância ou passou a fazer mais SQL, para
+que regressões sejam detetadas antes do deploy. Exemplo:
+
+    python benchmark.py --usuarios 50 --instalacoes 2000 --saida atual.json --comparar base.json
+"""
+import argparse
+import datetime
+import http.cookiejar
+import json
+import os
+import platform
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+SENHA = 'benchmark'
+DATA_BASE = datetime.date(2024, 1, 1)
+
+
+# --- Dados sintéticos ---
+def popular_banco(app, usuarios, instalacoes, relatorios, itens_por_relatorio):
+    from app import db, User, Instalacao, RelatorioHistorico, cache_catalogo, arredondar_centavos, \
+        calcular_comissao_centavos, reconstruir_resumo
+
+    with app.app_context():
+        db.create_all()
+        combos = [(tipo, combo) for tipo, combos_do_tipo in cache_catalogo.atual().combos.items() for combo in combos_do_tipo.values()]
+        hash_senha = None
+        for numero in range(usuarios):
+            user = User(username=f'tecnico{numero}')
+            if hash_senha is None:
+                user.set_password(SENHA)
+                hash_senha = user.password_hash
+            user.password_hash = hash_senha
+            db.session.add(user)
+        db.session.commit()
+        user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+
+        agora = datetime.datetime.now()
+        for user_id in user_ids:
+            linhas = []
+            for i in range(instalacoes):
+                tipo, combo = combos[i % len(combos)]
+                arredondado = arredondar_centavos(combo['preco_centavos'])
+                linhas.append({
+                    'tipo_combo': tipo, 'descricao_combo': combo['descricao'], 'valor_original_centavos': combo['preco_centavos'],
+                    'valor_arredondado_centavos': arredondado, 'login_cliente': f'cliente{user_id}_{i}',
+                    # Um dia por instalação, a partir de DATA_BASE, para que salvar_periodo possa arquivar dia a dia.
+                    'data_instalacao': DATA_BASE + datetime.timedelta(days=i % 365), 'porcentagem_comissao': 15.0,
+                    'comissao_centavos': calcular_comissao_centavos(arredondado, 15.0), 'observacoes': '',
+                    'data_registro': agora - datetime.timedelta(seconds=i), 'user_id': user_id,
+                })
+            if linhas:
+                db.session.execute(Instalacao.__table__.insert(), linhas)
+            for r in range(relatorios):
+                relatorio = RelatorioHistorico(data_inicio='2023-01-01', data_fim='2023-01-31', total_comissoes_centavos=0,
+                                               num_instalacoes=itens_por_relatorio, user_id=user_id)
+                db.session.add(relatorio)
+                db.session.flush()
+                tipo, combo = combos[r % len(combos)]
+                arredondado = arredondar_centavos(combo['preco_centavos'])
+                comissao = calcular_comissao_centavos(arredondado, 15.0)
+                relatorio.total_comissoes_centavos = comissao * itens_por_relatorio
+                db.session.execute(Instalacao.__table__.insert(), [{
+                    'relatorio_id': relatorio.id, 'tipo_combo': tipo, 'descricao_combo': combo['descricao'],
+                    'valor_original_centavos': combo['preco_centavos'], 'valor_arredondado_centavos': arredondado,
+                    'login_cliente': f'arquivado{user_id}_{i}', 'data_instalacao': datetime.date(2023, 1, i % 31 + 1),
+                    'porcentagem_comissao': 15.0, 'comissao_centavos': comissao, 'observacoes': '',
+                    'data_registro': agora, 'user_id': user_id,
+                } for i in range(itens_por_relatorio)])
+            db.session.commit()
+        reconstruir_resumo()
+        db.session.commit()
+
+
+def ids_do_tecnico(app, username):
+    from app import db, User, Instalacao, RelatorioHistorico
+    with app.app_context():
+        user_id = db.session.query(User.id).filter_by(username=username).scalar()
+        instalacao_id = db.session.query(Instalacao.id).filter_by(user_id=user_id).order_by(Instalacao.id).limit(1).scalar()
+        relatorio_ids = [r for (r,) in db.session.query(RelatorioHistorico.id).filter_by(user_id=user_id).order_by(RelatorioHistorico.id)]
+    return instalacao_id, relatorio_ids
+
+
+def cenarios(instalacao_id, relatorio_ids):
+    """Pedidos de cada rota; recebem o número da repetição para variar os parâmetros."""
+    def dia(n):
+        return (DATA_BASE + datetime.timedelta(days=n % 365)).isoformat()
+    relatorios = relatorio_ids or [0]
+    return {
+        'index': lambda n: ('GET', '/', None),
+        'editar': lambda n: ('GET', f'/editar/{instalacao_id}', None),
+        'editar_salvar': lambda n: ('POST', f'/editar/{instalacao_id}', {
+            'tipo_combo': 'CIDADE_FIBRA', 'combo_key': '300_MEGAS', 'login_cliente': f'editado{n}',
+            'data_instalacao': DATA_BASE.isoformat(), 'porcentagem_comissao': '15'}),
+        # Arquiva um dia diferente em cada repetição (o dia 0 é o da instalação editada).
+        'salvar_periodo': lambda n: ('POST', '/salvar-periodo', {'start_date': dia(n + 1), 'end_date': dia(n + 1)}),
+        'relatorio_imprimir': lambda n: ('GET', '/relatorio/imprimir', None),
+        'relatorio_historico': lambda n: ('GET', f'/relatorio-historico/{relatorios[n % len(relatorios)]}', None),
+    }
+
+
+def resumir(latencias, sql=None, duracao_total=None):
+    ordenadas = sorted(latencias)
+
+    def percentil(p):
+        return round(ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))] * 1000, 2)
+    resumo = {
+        'pedidos': len(ordenadas),
+        'p50_ms': percentil(50),
+        'p90_ms': percentil(90),
+        'p99_ms': percentil(99),
+        'media_ms': round(statistics.fmean(ordenadas) * 1000, 2),
+        'max_ms': round(ordenadas[-1] * 1000, 2),
+    }
+    if sql is not None:
+        resumo['sql_media'] = round(statistics.fmean(sql), 2)
+        resumo['sql_max'] = max(sql)
+    if duracao_total:
+        resumo['pedidos_por_segundo'] = round(len(ordenadas) / duracao_total, 1)
+    return resumo
+
+
+# --- Cliente de testes do Flask ---
+def medir_cliente(app, rotas, repeticoes, aquecimento):
+    from app import db
+    contador = threading.local()
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def _contar(*args):
+            contador.total = getattr(contador, 'total', 0) + 1
+
+    cliente = app.test_client()
+    resposta = cliente.post('/login', data={'username': 'tecnico0', 'password': SENHA})
+    if resposta.status_code != 302:
+        raise RuntimeError('Falha no login do benchmark.')
+    resultados = {}
+    for nome, pedido in rotas.items():
+        latencias, sql = [], []
+        for n in range(aquecimento + repeticoes):
+            metodo, caminho, dados = pedido(n)
+            contador.total = 0
+            inicio = time.perf_counter()
+            resposta = cliente.open(caminho, method=metodo, data=dados)
+            duracao = time.perf_counter() - inicio
+            if resposta.status_code >= 400:
+                raise RuntimeError(f'{nome}: {metodo} {caminho} respondeu {resposta.status_code}')
+            if n >= aquecimento:
+                latencias.append(duracao)
+                sql.append(contador.total)
+        resultados[nome] = resumir(latencias, sql)
+    return resultados
+
+
+# --- gunicorn com vários workers ---
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def abrir_sessao(base):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    corpo = urllib.parse.urlencode({'username': 'tecnico0', 'password': SENHA}).encode()
+    opener.open(base + '/login', data=corpo, timeout=30).read()
+    return opener
+
+
+def medir_gunicorn(caminho_banco, rotas, repeticoes, workers, concorrencia):
+    porta = porta_livre()
+    base = f'http://127.0.0.1:{porta}'
+    ambiente = dict(os.environ, DATABASE_URL=f'sqlite:///{caminho_banco}', GUNICORN_BIND=f'127.0.0.1:{porta}',
+                    GUNICORN_WORKERS=str(workers), GUNICORN_LOGLEVEL='warning', GUNICORN_MAX_REQUESTS='0',
+                    BCRYPT_LOG_ROUNDS='4', ARQUIVAMENTO_SINCRONO='1', SECRET_KEY='benchmark')
+    processo = subprocess.Popen([sys.executable, '-m', 'gunicorn'], cwd=os.path.dirname(os.path.abspath(__file__)), env=ambiente,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(base + '/login', timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError('O gunicorn não arrancou.')
+        sessoes = [abrir_sessao(base) for _ in range(concorrencia)]
+        resultados = {}
+        for nome, pedido in rotas.items():
+            def executar(n):
+                metodo, caminho, dados = pedido(n)
+                corpo = urllib.parse.urlencode(dados).encode() if dados else None
+                inicio = time.perf_counter()
+                sessoes[n % concorrencia].open(urllib.request.Request(base + caminho, data=corpo, method=metodo), timeout=60).read()
+                return time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(concorrencia) as executor:
+                latencias = list(executor.map(executar, range(repeticoes)))
+            resultados[nome] = resumir(latencias, duracao_total=time.perf_counter() - inicio)
+        return resultados
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+
+# --- Comparação com uma execução anterior ---
+def comparar(atual, base, tolerancia):
+    regressoes = []
+    for modo in ('cliente', 'gunicorn'):
+        for rota, anterior in base.get(modo, {}).items():
+            novo = atual.get(modo, {}).get(rota)
+            if novo is None:
+                continue
+            if novo['p90_ms'] > anterior['p90_ms'] * (1 + tolerancia):
+                regressoes.append(f"{modo}/{rota}: p90 {anterior['p90_ms']}ms -> {novo['p90_ms']}ms")
+            if 'sql_max' in anterior and novo.get('sql_max', 0) > anterior['sql_max']:
+                regressoes.append(f"{modo}/{rota}: SQL por pedido {anterior['sql_max']} -> {novo['sql_max']}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das rotas do Gerenciador de Comissões.')
+    parser.add_argument('--usuarios', type=int, default=20)
+    parser.add_argument('--instalacoes', type=int, default=1000, help='Instalações abertas por técnico.')
+    parser.add_argument('--relatorios', type=int, default=5, help='Relatórios arquivados por técnico.')
+    parser.add_argument('--itens-relatorio', type=int, default=200)
+    parser.add_argument('--repeticoes', type=int, default=50)
+    parser.add_argument('--aquecimento', type=int, default=3)
+    parser.add_argument('--rotas', default=None, help='Lista separada por vírgulas (por omissão, todas).')
+    parser.add_argument('--gunicorn', action='store_true', help='Mede também um gunicorn com vários workers.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--banco', default=None, help='Arquivo SQLite (por omissão, um temporário).')
+    parser.add_argument('--saida', default=None, help='Arquivo JSON com os resultados (por omissão, stdout).')
+    parser.add_argument('--comparar', default=None, help='JSON de uma execução anterior.')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='Aumento de p90 aceite ao comparar (0.2 = 20%%).')
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix='benchmark_comissoes_')
+    caminho_banco = os.path.abspath(args.banco or os.path.join(pasta, 'benchmark.db'))
+    # O benchmark do gunicorn precisa dos dados ainda por arquivar: usa uma cópia do banco.
+    caminho_copia = os.path.join(pasta, 'gunicorn.db')
+
+    from app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho_banco}', 'BCRYPT_LOG_ROUNDS': 4,
+                      'ARQUIVAMENTO_SINCRONO': True, 'METRICAS_ATIVAS': False, 'SECRET_KEY': 'benchmark'})
+    inicio = time.perf_counter()
+    popular_banco(app, args.usuarios, args.instalacoes, args.relatorios, args.itens_relatorio)
+    tempo_popular = time.perf_counter() - inicio
+    if args.gunicorn:
+        with sqlite3.connect(caminho_banco) as origem, sqlite3.connect(caminho_copia) as destino:
+            origem.backup(destino)
+
+    rotas = cenarios(*ids_do_tecnico(app, 'tecnico0'))
+    if args.rotas:
+        rotas = {nome: rotas[nome] for nome in args.rotas.split(',')}
+
+    resultado = {
+        'ambiente': {
+            'data': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'parametros': {chave: valor for chave, valor in vars(args).items() if chave not in ('saida', 'comparar', 'banco')},
+            'segundos_a_popular': round(tempo_popular, 2),
+        },
+        'cliente': medir_cliente(app, rotas, args.repeticoes, args.aquecimento),
+    }
+    if args.gunicorn:
+        resultado['gunicorn'] = medir_gunicorn(caminho_copia, rotas, args.repeticoes, args.workers, args.concorrencia)
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto + '\n')
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            regressoes = comparar(resultado, json.load(arquivo), args.tolerancia)
+        for regressao in regressoes:
+            print('REGRESSÃO:', regressao, file=sys.stderr)
+        if regressoes:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
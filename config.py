@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import os
+
+
+def _env_int(nome, padrao):
+    return int(os.environ.get(nome, padrao))
+
+
+def _database_url():
+    url = os.environ.get('DATABASE_URL', 'sqlite:///database.db')
+    # Alguns provedores ainda fornecem o esquema antigo "postgres://", que o SQLAlchemy 2 não aceita.
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'uma-chave-secreta-muito-segura-e-dificil-de-adivinhar')
+    SQLALCHEMY_DATABASE_URI = _database_url()
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Pool de conexões (por processo/worker do gunicorn).
+    DB_POOL_SIZE = _env_int('DB_POOL_SIZE', 5)
+    DB_MAX_OVERFLOW = _env_int('DB_MAX_OVERFLOW', 10)
+    DB_POOL_TIMEOUT = _env_int('DB_POOL_TIMEOUT', 30)
+    DB_POOL_RECYCLE = _env_int('DB_POOL_RECYCLE', 1800)
+
+    # Cache das identidades usadas pelo user_loader (por processo).
+    USER_CACHE_TTL = _env_int('USER_CACHE_TTL', 60)
+    USER_CACHE_SIZE = _env_int('USER_CACHE_SIZE', 1024)
+
+    # Intervalo com que cada worker verifica se há uma nova versão do catálogo de combos.
+    CATALOGO_VERIFICAR_SEGUNDOS = _env_int('CATALOGO_VERIFICAR_SEGUNDOS', 5)
+
+    # Número de folhas de pagamento (intervalo + versão dos dados) guardadas em cache por processo.
+    FOLHA_CACHE_SIZE = _env_int('FOLHA_CACHE_SIZE', 64)
+
+    # Arquivamento de períodos: linhas movidas por lote; em modo síncrono corre no próprio pedido.
+    ARQUIVAMENTO_LOTE = _env_int('ARQUIVAMENTO_LOTE', 500)
+    ARQUIVAMENTO_SINCRONO = os.environ.get('ARQUIVAMENTO_SINCRONO', '0') == '1'
+    # Cada worker retoma as tarefas sem progresso há mais deste prazo (ex.: worker reciclado a meio).
+    ARQUIVAMENTO_RETOMAR = os.environ.get('ARQUIVAMENTO_RETOMAR', '1') == '1'
+    ARQUIVAMENTO_PRAZO_SEGUNDOS = _env_int('ARQUIVAMENTO_PRAZO_SEGUNDOS', 120)
+
+    # Compressão gzip das respostas HTML/JSON e executável usado por `flask ativos-construir`.
+    COMPRIMIR_RESPOSTAS = os.environ.get('COMPRIMIR_RESPOSTAS', '1') == '1'
+    COMPRIMIR_MINIMO_BYTES = _env_int('COMPRIMIR_MINIMO_BYTES', 500)
+    TAILWIND_CLI = os.environ.get('TAILWIND_CLI', 'tailwindcss')
+
+    # HTML dos relatórios arquivados: limite do LRU em memória e cópia em instance/cache_relatorios.
+    RELATORIO_CACHE_BYTES = _env_int('RELATORIO_CACHE_BYTES', 32 * 1024 * 1024)
+    RELATORIO_CACHE_DISCO = os.environ.get('RELATORIO_CACHE_DISCO', '0') == '1'
+
+    # Relatórios em PDF: processos por worker, tarefas em espera e tempo que o pedido aguarda o PDF.
+    PDF_PROCESSOS = _env_int('PDF_PROCESSOS', 2)
+    PDF_FILA = _env_int('PDF_FILA', 8)
+    PDF_ESPERA_SEGUNDOS = _env_int('PDF_ESPERA_SEGUNDOS', 10)
+    # Máximo de linhas de um PDF: todas são lidas para memória antes de ir para o pool.
+    PDF_LINHAS_MAX = _env_int('PDF_LINHAS_MAX', 20000)
+
+    # Templates: bytecode compilado em instance/cache_jinja e compilação de todos no arranque do worker.
+    JINJA_CACHE_BYTECODE = os.environ.get('JINJA_CACHE_BYTECODE', '1') == '1'
+    TEMPLATES_PRE_COMPILAR = os.environ.get('TEMPLATES_PRE_COMPILAR', '1') == '1'
+
+    # Custo do bcrypt e hashes simultâneos por worker (por omissão, uma thread a menos que as do gunicorn).
+    BCRYPT_LOG_ROUNDS = _env_int('BCRYPT_LOG_ROUNDS', 12)
+    BCRYPT_SIMULTANEOS = _env_int('BCRYPT_SIMULTANEOS', max(_env_int('GUNICORN_THREADS', 2) - 1, 1))
+
+    # Limite de tentativas de login falhadas por janela de tempo.
+    LOGIN_JANELA_SEGUNDOS = _env_int('LOGIN_JANELA_SEGUNDOS', 300)
+    LOGIN_MAX_TENTATIVAS_USUARIO = _env_int('LOGIN_MAX_TENTATIVAS_USUARIO', 5)
+    LOGIN_MAX_TENTATIVAS_IP = _env_int('LOGIN_MAX_TENTATIVAS_IP', 30)
+
+    # Número de proxies reversos à frente da aplicação cujos X-Forwarded-* são de confiança (0 = nenhum).
+    PROXY_SALTOS = _env_int('PROXY_SALTOS', 0)
+
+    # Métricas por endpoint e registo de pedidos lentos; /metrics (formato Prometheus) só existe com token.
+    METRICAS_ATIVAS = os.environ.get('METRICAS_ATIVAS', '1') == '1'
+    METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+    METRICAS_LENTO_MS = _env_int('METRICAS_LENTO_MS', 0)
+
+    # Guarda de consultas (desenvolvimento e testes): orçamento de SQL por rota, N+1 e varreduras
+    # completas. Sem CONSULTAS_GUARDA_ERRO definido, levanta erro só quando TESTING está ligado.
+    CONSULTAS_GUARDA = os.environ.get('CONSULTAS_GUARDA', '0') == '1'
+    CONSULTAS_GUARDA_ERRO = {'1': True, '0': False}.get(os.environ.get('CONSULTAS_GUARDA_ERRO'))
+    CONSULTAS_ORCAMENTO_PADRAO = _env_int('CONSULTAS_ORCAMENTO_PADRAO', 0)
+    CONSULTAS_REPETICOES_MAX = _env_int('CONSULTAS_REPETICOES_MAX', 10)
+
+    # Ajustes aplicados a cada nova conexão SQLite.
+    SQLITE_BUSY_TIMEOUT_MS = _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+
+def opcoes_engine(config):
+    """Monta SQLALCHEMY_ENGINE_OPTIONS a partir da URI e dos parâmetros de pool."""
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite'):
+        # SQLite em memória usa um pool próprio que não aceita estes parâmetros.
+        if uri in ('sqlite://', 'sqlite:///:memory:'):
+            return {}
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+        }
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
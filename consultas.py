@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Guarda de consultas SQL por pedido, para desenvolvimento e testes.
+
+Ligada com ``CONSULTAS_GUARDA=1``, conta as instruções SQL de cada pedido e verifica:
+
+* o orçamento da rota, declarado com ``@orcamento_consultas(n)`` (ou
+  ``CONSULTAS_ORCAMENTO_PADRAO`` para as rotas sem declaração);
+* instruções iguais repetidas mais de ``CONSULTAS_REPETICOES_MAX`` vezes no mesmo pedido,
+  o sinal típico de um N+1 (ex.: ``instalacao.author`` lido dentro de um ciclo do template);
+* em SQLite, o ``EXPLAIN QUERY PLAN`` de cada instrução nova (o resultado fica guardado por
+  texto da instrução), à procura de varreduras completas das tabelas grandes
+  (``CONSULTAS_TABELAS_VIGIADAS``).
+
+Com ``CONSULTAS_GUARDA_ERRO`` (por omissão, quando ``TESTING`` está ligado) um problema levanta
+``ViolacaoConsultas`` e o pedido do cliente de testes falha; caso contrário é registado como
+aviso. O número de instruções vai no cabeçalho ``X-Consultas-SQL`` da resposta. As instruções
+executadas depois do ``after_request`` (ex.: respostas em fluxo) não são contadas.
+"""
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+# Os INSERT ... VALUES não leem tabelas; os INSERT em lote do SQLAlchemy nem sempre têm os
+# parâmetros no formato da instrução que chega a este evento.
+INSTRUCOES_COM_PLANO = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+
+class ViolacaoConsultas(AssertionError):
+    pass
+
+
+def orcamento_consultas(maximo=None, permitir_varredura=False, permitir_repeticoes=False):
+    """Declara quantas instruções SQL a rota pode executar por pedido. `permitir_repeticoes` é
+    para rotas que trabalham em lotes (a mesma instrução uma vez por lote) e `permitir_varredura`
+    desliga o aviso de varredura completa (ex.: relatórios sobre toda a tabela). Vai logo acima
+    do ``def``, abaixo de ``@bp.route`` e ``@login_required``."""
+    def decorador(funcao):
+        funcao.orcamento_consultas = maximo
+        funcao.permitir_varredura = permitir_varredura
+        funcao.permitir_repeticoes = permitir_repeticoes
+        return funcao
+    return decorador
+
+
+class GuardaConsultas:
+    def __init__(self, app=None, db=None):
+        self._lock = threading.Lock()
+        self._planos = {}
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('CONSULTAS_GUARDA', False)
+        app.config.setdefault('CONSULTAS_GUARDA_ERRO', None)
+        app.config.setdefault('CONSULTAS_ORCAMENTO_PADRAO', 0)
+        app.config.setdefault('CONSULTAS_REPETICOES_MAX', 10)
+        app.config.setdefault('CONSULTAS_TABELAS_VIGIADAS', ('instalacao', 'relatorio_historico'))
+        if not app.config['CONSULTAS_GUARDA']:
+            return
+
+        tabelas = '|'.join(re.escape(tabela) for tabela in app.config['CONSULTAS_TABELAS_VIGIADAS'])
+        # "SCAN instalacao", "SCAN instalacao_1" (alias) ou "SCAN instalacao USING INDEX ...";
+        # não apanha as tabelas FTS (instalacao_fts).
+        self._varredura = re.compile(rf'^SCAN ({tabelas})(_\d+)?( |$)')
+        app.before_request(self._inicio_pedido)
+        app.after_request(self._fim_pedido)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._antes_sql)
+
+    # --- Recolha ---
+    def _inicio_pedido(self):
+        g.guarda_consultas = {'instrucoes': Counter(), 'varreduras': {}}
+
+    def _antes_sql(self, conn, cursor, statement, parameters, context, executemany):
+        dados = g.get('guarda_consultas') if has_request_context() else None
+        if dados is None:
+            return
+        dados['instrucoes'][statement] += 1
+        if dados['instrucoes'][statement] == 1 and conn.dialect.name == 'sqlite':
+            varreduras = self._varreduras(cursor, statement, parameters[0] if executemany and parameters else parameters)
+            if varreduras:
+                dados['varreduras'][statement] = varreduras
+
+    def _varreduras(self, cursor, statement, parameters):
+        with self._lock:
+            if statement in self._planos:
+                return self._planos[statement]
+        varreduras = []
+        if statement.lstrip().upper().startswith(INSTRUCOES_COM_PLANO):
+            # Usa a conexão DBAPI diretamente: não passa pelos eventos do SQLAlchemy e não
+            # executa a instrução, só pede o plano.
+            try:
+                plano = cursor.connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ()).fetchall()
+            except sqlite3.Error as erro:
+                current_app.logger.debug("Guarda de consultas: sem plano para %s (%s)", _resumo(statement), erro)
+                plano = []
+            varreduras = [linha[3] for linha in plano if self._varredura.match(linha[3])]
+        with self._lock:
+            self._planos[statement] = varreduras
+        return varreduras
+
+    def _fim_pedido(self, response):
+        dados = g.pop('guarda_consultas', None)
+        if dados is None:
+            return response
+        total = sum(dados['instrucoes'].values())
+        response.headers['X-Consultas-SQL'] = str(total)
+
+        view = current_app.view_functions.get(request.endpoint)
+        orcamento = _declaracao(view, 'orcamento_consultas', None) or current_app.config['CONSULTAS_ORCAMENTO_PADRAO']
+        problemas = []
+        if orcamento and total > orcamento:
+            problemas.append(f'{total} instruções SQL (orçamento {orcamento})')
+        repeticoes_max = current_app.config['CONSULTAS_REPETICOES_MAX']
+        for statement, vezes in dados['instrucoes'].most_common():
+            if vezes <= repeticoes_max or _declaracao(view, 'permitir_repeticoes', False):
+                break
+            problemas.append(f'instrução repetida {vezes} vezes (N+1?): {_resumo(statement)}')
+        if not _declaracao(view, 'permitir_varredura', False):
+            for statement, varreduras in dados['varreduras'].items():
+                problemas.append(f"varredura completa ({'; '.join(varreduras)}): {_resumo(statement)}")
+        if not problemas:
+            return response
+
+        mensagem = f"{request.method} {request.path} ({request.endpoint}): " + ' | '.join(problemas)
+        erro = current_app.config['CONSULTAS_GUARDA_ERRO']
+        if erro is None:
+            erro = current_app.testing
+        if erro:
+            raise ViolacaoConsultas(mensagem)
+        current_app.logger.warning("Guarda de consultas: %s", mensagem)
+        return response
+
+
+def _declaracao(view, atributo, padrao):
+    # A view registada pode ser o envoltório de outro decorador (ex.: login_required); desce pela
+    # cadeia de __wrapped__ até à função que tem a declaração.
+    while view is not None:
+        if hasattr(view, atributo):
+            return getattr(view, atributo)
+        view = getattr(view, '__wrapped__', None)
+    return padrao
+
+
+def _resumo(statement, tamanho=200):
+    texto = ' '.join(statement.split())
+    return texto if len(texto) <= tamanho else texto[:tamanho] + '...'
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Configuração do gunicorn para produção. Uso: gunicorn  (este arquivo é lido automaticamente)
+import multiprocessing
+import os
+
+# Sem o Flask-Migrate/Alembic: as migrações correm à parte com `flask db upgrade`.
+wsgi_app = 'app:create_app(migracoes=False)'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recicla os workers periodicamente para conter fugas de memória.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+
+# A aplicação é criada em cada worker (sem preload) para que nenhuma conexão
+# ao banco seja herdada do processo mestre através do fork.
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
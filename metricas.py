@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Métricas de desempenho por pedido, expostas em formato Prometheus em /metrics.
+
+Para cada endpoint são registados: latência (histograma), tamanho da resposta
+(histograma), número e tempo das instruções SQL e tempo de renderização de templates.
+Os valores são mantidos em memória em cada processo; com vários workers do gunicorn
+cada recolha do Prometheus vê o worker que atendeu o pedido (a etiqueta ``pid``
+permite distinguir as séries).
+
+/metrics só é exposto com ``METRICAS_TOKEN`` definido e exige ``Authorization: Bearer <token>``
+(os nomes das rotas e os tempos não devem ser públicos). Sem token as métricas continuam a ser
+recolhidas, para o registo de pedidos lentos (``METRICAS_LENTO_MS``).
+"""
+import hmac
+import os
+import threading
+import time
+
+from flask import Response, abort, current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_TAMANHO = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+        self.soma += valor
+        self.total += 1
+
+
+class Metricas:
+    def __init__(self, app=None, db=None):
+        self._lock = threading.Lock()
+        self._latencia = {}
+        self._tamanho = {}
+        self._pedidos = {}
+        self._sql_instrucoes = {}
+        self._sql_segundos = {}
+        self._template_segundos = {}
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('METRICAS_ATIVAS', True)
+        app.config.setdefault('METRICAS_TOKEN', None)
+        app.config.setdefault('METRICAS_LENTO_MS', 0)
+        if not app.config['METRICAS_ATIVAS']:
+            return
+
+        app.before_request(self._inicio_pedido)
+        app.after_request(self._fim_pedido)
+        before_render_template.connect(self._inicio_template, app)
+        template_rendered.connect(self._fim_template, app)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._inicio_sql)
+            event.listen(db.engine, 'after_cursor_execute', self._fim_sql)
+        if app.config['METRICAS_TOKEN']:
+            app.add_url_rule('/metrics', 'metricas', self._exportar)
+
+    # --- Recolha ---
+    def _inicio_pedido(self):
+        g.metricas = {'inicio': time.perf_counter(), 'sql_instrucoes': 0, 'sql_segundos': 0.0,
+                      'template_segundos': 0.0, 'templates_abertos': []}
+
+    # O início fica no contexto de execução da instrução, e não na conexão: uma instrução que
+    # falha não chega a after_cursor_execute e o seu início desaparece com o contexto.
+    def _inicio_sql(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.metricas_inicio_sql = time.perf_counter()
+
+    def _fim_sql(self, conn, cursor, statement, parameters, context, executemany):
+        inicio = getattr(context, 'metricas_inicio_sql', None)
+        dados = g.get('metricas') if has_request_context() else None
+        if dados is not None and inicio is not None:
+            dados['sql_instrucoes'] += 1
+            dados['sql_segundos'] += time.perf_counter() - inicio
+
+    def _inicio_template(self, app, template, context, **extra):
+        dados = g.get('metricas')
+        if dados is not None:
+            dados['templates_abertos'].append(time.perf_counter())
+
+    def _fim_template(self, app, template, context, **extra):
+        dados = g.get('metricas')
+        if dados is not None and dados['templates_abertos']:
+            inicio = dados['templates_abertos'].pop()
+            # Só conta o template mais externo, para não somar duas vezes os includes.
+            if not dados['templates_abertos']:
+                dados['template_segundos'] += time.perf_counter() - inicio
+
+    def _fim_pedido(self, response):
+        dados = g.pop('metricas', None)
+        if dados is None:
+            return response
+        duracao = time.perf_counter() - dados['inicio']
+        endpoint = request.endpoint or '<sem_rota>'
+        chave_pedido = (endpoint, request.method, str(response.status_code))
+        tamanho = response.content_length if not response.is_streamed else None
+        with self._lock:
+            self._pedidos[chave_pedido] = self._pedidos.get(chave_pedido, 0) + 1
+            self._latencia.setdefault(endpoint, Histograma(BUCKETS_LATENCIA)).observar(duracao)
+            if tamanho is not None:
+                self._tamanho.setdefault(endpoint, Histograma(BUCKETS_TAMANHO)).observar(tamanho)
+            self._sql_instrucoes[endpoint] = self._sql_instrucoes.get(endpoint, 0) + dados['sql_instrucoes']
+            self._sql_segundos[endpoint] = self._sql_segundos.get(endpoint, 0.0) + dados['sql_segundos']
+            self._template_segundos[endpoint] = self._template_segundos.get(endpoint, 0.0) + dados['template_segundos']
+
+        limite_ms = current_app.config['METRICAS_LENTO_MS']
+        if limite_ms and duracao * 1000 >= limite_ms:
+            current_app.logger.warning(
+                "Pedido lento: %s %s (%s) %.1fms, %d SQL em %.1fms, templates %.1fms, %s bytes",
+                request.method, request.path, endpoint, duracao * 1000, dados['sql_instrucoes'],
+                dados['sql_segundos'] * 1000, dados['template_segundos'] * 1000,
+                tamanho if tamanho is not None else 'stream')
+        return response
+
+    # --- Exportação ---
+    def _exportar(self):
+        token = current_app.config['METRICAS_TOKEN']
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(403)
+        return Response(self.texto_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    def texto_prometheus(self):
+        pid = os.getpid()
+        linhas = []
+
+        def etiquetas(**valores):
+            valores['pid'] = pid
+            return '{' + ','.join(f'{nome}="{valor}"' for nome, valor in valores.items()) + '}'
+
+        def histograma(nome, ajuda, series):
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} histogram')
+            for endpoint, hist in sorted(series.items()):
+                for limite, contagem in zip(hist.buckets, hist.contagens):
+                    linhas.append(f'{nome}_bucket{etiquetas(endpoint=endpoint, le=limite)} {contagem}')
+                linhas.append(f'{nome}_bucket{etiquetas(endpoint=endpoint, le="+Inf")} {hist.total}')
+                linhas.append(f'{nome}_sum{etiquetas(endpoint=endpoint)} {hist.soma}')
+                linhas.append(f'{nome}_count{etiquetas(endpoint=endpoint)} {hist.total}')
+
+        def contador(nome, ajuda, series):
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} counter')
+            for endpoint, valor in sorted(series.items()):
+                linhas.append(f'{nome}{etiquetas(endpoint=endpoint)} {valor}')
+
+        with self._lock:
+            linhas.append('# HELP comissoes_http_pedidos_total Pedidos atendidos.')
+            linhas.append('# TYPE comissoes_http_pedidos_total counter')
+            for (endpoint, metodo, status), total in sorted(self._pedidos.items()):
+                linhas.append(f'comissoes_http_pedidos_total{etiquetas(endpoint=endpoint, metodo=metodo, status=status)} {total}')
+            histograma('comissoes_http_latencia_segundos', 'Tempo de resposta por endpoint.', self._latencia)
+            histograma('comissoes_http_resposta_bytes', 'Tamanho do corpo da resposta por endpoint.', self._tamanho)
+            contador('comissoes_sql_instrucoes_total', 'Instruções SQL executadas por endpoint.', self._sql_instrucoes)
+            contador('comissoes_sql_segundos_total', 'Tempo gasto em SQL por endpoint.', self._sql_segundos)
+            contador('comissoes_template_segundos_total', 'Tempo de renderização de templates por endpoint.', self._template_segundos)
+        return '\n'.join(linhas) + '\n'
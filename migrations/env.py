@@ -45,6 +45,15 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+# O índice de texto (instalacao_fts, em SQLite) e as tabelas-sombra do FTS5 (instalacao_fts_data,
+# _idx, _docsize, _config) são criados pelas migrações e por eventos DDL, fora dos modelos; sem
+# este filtro o autogenerate proporia apagá-los.
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and name is not None and (name.endswith('_fts') or '_fts_' in name):
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +74,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +103,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
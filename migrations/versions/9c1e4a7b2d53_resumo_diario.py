@@ -0,0 +1,37 @@
+"""Tabela de resumo diário de comissões
+
+Revision ID: 9c1e4a7b2d53
+Revises: ffd8bdb52191
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1e4a7b2d53'
+down_revision = 'ffd8bdb52191'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resumo_diario',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('data', sa.String(length=20), nullable=False),
+    sa.Column('total_comissoes', sa.Float(), nullable=False),
+    sa.Column('num_instalacoes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_resumo_diario_user_id'),
+    sa.PrimaryKeyConstraint('user_id', 'data')
+    )
+    # ### Preenche o resumo com as instalações que já existem ###
+    op.execute(
+        "INSERT INTO resumo_diario (user_id, data, total_comissoes, num_instalacoes) "
+        "SELECT user_id, data_instalacao, SUM(comissao), COUNT(*) FROM instalacao "
+        "GROUP BY user_id, data_instalacao"
+    )
+
+
+def downgrade():
+    op.drop_table('resumo_diario')
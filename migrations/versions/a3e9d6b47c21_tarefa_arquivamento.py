@@ -0,0 +1,46 @@
+"""Tarefas de arquivamento em segundo plano
+
+Revision ID: a3e9d6b47c21
+Revises: f2c7a93e5b10
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e9d6b47c21'
+down_revision = 'f2c7a93e5b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tarefa_arquivamento',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('data_inicio', sa.Date(), nullable=False),
+    sa.Column('data_fim', sa.Date(), nullable=False),
+    sa.Column('estado', sa.String(length=20), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('processadas', sa.Integer(), nullable=False),
+    sa.Column('relatorio_id', sa.Integer(), nullable=True),
+    sa.Column('erro', sa.String(length=500), nullable=True),
+    sa.Column('data_criacao', sa.DateTime(), nullable=True),
+    sa.Column('data_conclusao', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_tarefa_arquivamento_user_id'),
+    sa.ForeignKeyConstraint(['relatorio_id'], ['relatorio_historico.id'], name='fk_tarefa_arquivamento_relatorio_id'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tarefa_arquivamento_user_id', 'tarefa_arquivamento', ['user_id'])
+
+    with op.batch_alter_table('relatorio_historico') as batch_op:
+        batch_op.add_column(sa.Column('concluido', sa.Boolean(), nullable=False, server_default=sa.true()))
+
+
+def downgrade():
+    with op.batch_alter_table('relatorio_historico') as batch_op:
+        batch_op.drop_column('concluido')
+    op.drop_index('ix_tarefa_arquivamento_user_id', table_name='tarefa_arquivamento')
+    op.drop_table('tarefa_arquivamento')
@@ -0,0 +1,49 @@
+"""Índice de texto (FTS5) sobre instalações e itens de relatório
+
+Revision ID: a7c2f5e91d46
+Revises: e8a4c61f0b37
+Create Date: 2026-10-17 18:00:00.000000
+
+Só em SQLite; noutros bancos a pesquisa usa LIKE e esta migração não faz nada.
+Atenção: no SQLite, migrações futuras que recriem instalacao ou relatorio_item em modo
+batch apagam os triggers; nesse caso devem voltar a criá-los.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c2f5e91d46'
+down_revision = 'e8a4c61f0b37'
+branch_labels = None
+depends_on = None
+
+TABELAS = ('instalacao', 'relatorio_item')
+COLUNAS = 'login_cliente, descricao_combo, observacoes'
+NOVOS = 'new.login_cliente, new.descricao_combo, new.observacoes'
+ANTIGOS = 'old.login_cliente, old.descricao_combo, old.observacoes'
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for tabela in TABELAS:
+        op.execute(f"CREATE VIRTUAL TABLE {tabela}_fts USING fts5({COLUNAS}, content='{tabela}', content_rowid='id', "
+                   "tokenize='unicode61 remove_diacritics 2')")
+        op.execute(f"CREATE TRIGGER {tabela}_fts_ai AFTER INSERT ON {tabela} BEGIN "
+                   f"INSERT INTO {tabela}_fts(rowid, {COLUNAS}) VALUES (new.id, {NOVOS}); END")
+        op.execute(f"CREATE TRIGGER {tabela}_fts_ad AFTER DELETE ON {tabela} BEGIN "
+                   f"INSERT INTO {tabela}_fts({tabela}_fts, rowid, {COLUNAS}) VALUES ('delete', old.id, {ANTIGOS}); END")
+        op.execute(f"CREATE TRIGGER {tabela}_fts_au AFTER UPDATE OF {COLUNAS} ON {tabela} BEGIN "
+                   f"INSERT INTO {tabela}_fts({tabela}_fts, rowid, {COLUNAS}) VALUES ('delete', old.id, {ANTIGOS}); "
+                   f"INSERT INTO {tabela}_fts(rowid, {COLUNAS}) VALUES (new.id, {NOVOS}); END")
+        # Indexa as linhas que já existem.
+        op.execute(f"INSERT INTO {tabela}_fts({tabela}_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for tabela in TABELAS:
+        for sufixo in ('ai', 'ad', 'au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {tabela}_fts_{sufixo}")
+        op.execute(f"DROP TABLE IF EXISTS {tabela}_fts")
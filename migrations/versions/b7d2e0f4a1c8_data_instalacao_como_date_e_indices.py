@@ -0,0 +1,79 @@
+"""data_instalacao como DATE e índices compostos por utilizador
+
+Revision ID: b7d2e0f4a1c8
+Revises: 9c1e4a7b2d53
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e0f4a1c8'
+down_revision = '9c1e4a7b2d53'
+branch_labels = None
+depends_on = None
+
+FORMATOS_ANTIGOS = ('%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S')
+
+
+def _converter_data(valor):
+    for formato in FORMATOS_ANTIGOS:
+        try:
+            return datetime.datetime.strptime(valor.strip(), formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Data de instalação inválida: {valor!r}")
+
+
+def upgrade():
+    # ### Nova coluna DATE preenchida a partir do texto antigo ###
+    # Não usamos alter_column direto porque no SQLite o batch copiaria os valores com
+    # CAST(... AS DATE), que transforma '2025-01-05' no número 2025.
+    with op.batch_alter_table('instalacao') as batch_op:
+        batch_op.add_column(sa.Column('data_instalacao_nova', sa.Date(), nullable=True))
+
+    conn = op.get_bind()
+    atualizar = sa.text("UPDATE instalacao SET data_instalacao_nova = :data WHERE data_instalacao = :valor").bindparams(sa.bindparam('data', type_=sa.Date()))
+    for valor in conn.execute(sa.text("SELECT DISTINCT data_instalacao FROM instalacao")).scalars():
+        conn.execute(atualizar, {'data': _converter_data(valor), 'valor': valor})
+
+    with op.batch_alter_table('instalacao') as batch_op:
+        batch_op.drop_column('data_instalacao')
+        batch_op.alter_column('data_instalacao_nova', new_column_name='data_instalacao', existing_type=sa.Date(), nullable=False)
+
+    op.create_index('ix_instalacao_user_id_data_instalacao', 'instalacao', ['user_id', 'data_instalacao'])
+    op.create_index('ix_instalacao_user_id_data_registro', 'instalacao', ['user_id', 'data_registro'])
+
+    # ### O resumo diário é derivado: recria com a coluna DATE e recalcula ###
+    op.drop_table('resumo_diario')
+    op.create_table('resumo_diario',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('data', sa.Date(), nullable=False),
+    sa.Column('total_comissoes', sa.Float(), nullable=False),
+    sa.Column('num_instalacoes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_resumo_diario_user_id'),
+    sa.PrimaryKeyConstraint('user_id', 'data')
+    )
+    op.execute(
+        "INSERT INTO resumo_diario (user_id, data, total_comissoes, num_instalacoes) "
+        "SELECT user_id, data_instalacao, SUM(comissao), COUNT(*) FROM instalacao "
+        "GROUP BY user_id, data_instalacao"
+    )
+
+    op.create_index('ix_relatorio_historico_user_id_data_salva', 'relatorio_historico', ['user_id', 'data_salva'])
+
+
+def downgrade():
+    op.drop_index('ix_relatorio_historico_user_id_data_salva', table_name='relatorio_historico')
+    op.drop_index('ix_instalacao_user_id_data_registro', table_name='instalacao')
+    op.drop_index('ix_instalacao_user_id_data_instalacao', table_name='instalacao')
+
+    with op.batch_alter_table('resumo_diario') as batch_op:
+        batch_op.alter_column('data', existing_type=sa.Date(), type_=sa.String(length=20), existing_nullable=False)
+
+    with op.batch_alter_table('instalacao') as batch_op:
+        batch_op.alter_column('data_instalacao', existing_type=sa.Date(), type_=sa.String(length=20), existing_nullable=False)
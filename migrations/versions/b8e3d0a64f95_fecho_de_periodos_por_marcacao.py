@@ -0,0 +1,131 @@
+"""Fecho de períodos por marcação: instalacao.relatorio_id no lugar de relatorio_item
+
+Revision ID: b8e3d0a64f95
+Revises: a7c2f5e91d46
+Create Date: 2026-10-17 20:00:00.000000
+
+As linhas de relatorio_item passam para instalacao, marcadas com o relatório. Os relatórios
+antigos não guardavam o valor do combo, por isso essas instalações ficam sem valor_original
+e valor_arredondado (as colunas passam a aceitar NULL) e com tipo_combo vazio quando ele
+também não tinha sido guardado.
+
+No SQLite o batch de instalacao recria a tabela e apaga os triggers do índice de texto;
+por isso são criados de novo aqui.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e3d0a64f95'
+down_revision = 'a7c2f5e91d46'
+branch_labels = None
+depends_on = None
+
+COLUNAS_FTS = 'login_cliente, descricao_combo, observacoes'
+NOVOS = 'new.login_cliente, new.descricao_combo, new.observacoes'
+ANTIGOS = 'old.login_cliente, old.descricao_combo, old.observacoes'
+ABERTAS = sa.text('relatorio_id IS NULL')
+
+
+def _sqlite():
+    return op.get_bind().dialect.name == 'sqlite'
+
+
+def _criar_indice_texto(tabela, virtual=True):
+    if virtual:
+        op.execute(f"CREATE VIRTUAL TABLE {tabela}_fts USING fts5({COLUNAS_FTS}, content='{tabela}', content_rowid='id', "
+                   "tokenize='unicode61 remove_diacritics 2')")
+    for sufixo in ('ai', 'ad', 'au'):
+        op.execute(f"DROP TRIGGER IF EXISTS {tabela}_fts_{sufixo}")
+    op.execute(f"CREATE TRIGGER {tabela}_fts_ai AFTER INSERT ON {tabela} BEGIN "
+               f"INSERT INTO {tabela}_fts(rowid, {COLUNAS_FTS}) VALUES (new.id, {NOVOS}); END")
+    op.execute(f"CREATE TRIGGER {tabela}_fts_ad AFTER DELETE ON {tabela} BEGIN "
+               f"INSERT INTO {tabela}_fts({tabela}_fts, rowid, {COLUNAS_FTS}) VALUES ('delete', old.id, {ANTIGOS}); END")
+    op.execute(f"CREATE TRIGGER {tabela}_fts_au AFTER UPDATE OF {COLUNAS_FTS} ON {tabela} BEGIN "
+               f"INSERT INTO {tabela}_fts({tabela}_fts, rowid, {COLUNAS_FTS}) VALUES ('delete', old.id, {ANTIGOS}); "
+               f"INSERT INTO {tabela}_fts(rowid, {COLUNAS_FTS}) VALUES (new.id, {NOVOS}); END")
+    op.execute(f"INSERT INTO {tabela}_fts({tabela}_fts) VALUES ('rebuild')")
+
+
+def _apagar_indice_texto(tabela):
+    for sufixo in ('ai', 'ad', 'au'):
+        op.execute(f"DROP TRIGGER IF EXISTS {tabela}_fts_{sufixo}")
+    op.execute(f"DROP TABLE IF EXISTS {tabela}_fts")
+
+
+def upgrade():
+    with op.batch_alter_table('relatorio_historico') as batch_op:
+        batch_op.add_column(sa.Column('reaberto', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.add_column(sa.Column('versao', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('instalacao') as batch_op:
+        batch_op.add_column(sa.Column('relatorio_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_instalacao_relatorio_id', 'relatorio_historico', ['relatorio_id'], ['id'])
+        batch_op.alter_column('valor_original_centavos', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('valor_arredondado_centavos', existing_type=sa.Integer(), nullable=True)
+    if _sqlite():
+        _criar_indice_texto('instalacao', virtual=False)
+
+    op.drop_index('ix_instalacao_user_id_data_registro', table_name='instalacao')
+    op.create_index('ix_instalacao_abertas_user_id_data_registro', 'instalacao', ['user_id', 'data_registro'],
+                    sqlite_where=ABERTAS, postgresql_where=ABERTAS)
+    op.create_index('ix_instalacao_relatorio_id_data_instalacao', 'instalacao', ['relatorio_id', 'data_instalacao'])
+
+    # ### Itens dos relatórios passam a ser instalações marcadas com o relatório ###
+    op.execute(
+        "INSERT INTO instalacao (tipo_combo, descricao_combo, login_cliente, data_instalacao, porcentagem_comissao, "
+        "comissao_centavos, observacoes, data_registro, user_id, relatorio_id) "
+        "SELECT COALESCE(i.tipo_combo, ''), i.descricao_combo, i.login_cliente, i.data_instalacao, "
+        "COALESCE(i.porcentagem_comissao, 0), i.comissao_centavos, i.observacoes, r.data_salva, r.user_id, i.relatorio_id "
+        "FROM relatorio_item i JOIN relatorio_historico r ON r.id = i.relatorio_id ORDER BY i.id"
+    )
+    op.execute("UPDATE relatorio_historico SET versao = 1 WHERE concluido")
+
+    if _sqlite():
+        _apagar_indice_texto('relatorio_item')
+    op.drop_index('ix_relatorio_item_data_instalacao', table_name='relatorio_item')
+    op.drop_index('ix_relatorio_item_relatorio_id_data_instalacao', table_name='relatorio_item')
+    op.drop_table('relatorio_item')
+
+
+def downgrade():
+    op.create_table('relatorio_item',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('relatorio_id', sa.Integer(), nullable=False),
+    sa.Column('tipo_combo', sa.String(length=50), nullable=True),
+    sa.Column('descricao_combo', sa.String(length=100), nullable=False),
+    sa.Column('login_cliente', sa.String(length=100), nullable=False),
+    sa.Column('data_instalacao', sa.Date(), nullable=False),
+    sa.Column('porcentagem_comissao', sa.Float(), nullable=True),
+    sa.Column('comissao_centavos', sa.Integer(), nullable=False),
+    sa.Column('observacoes', sa.String(length=300), nullable=True),
+    sa.ForeignKeyConstraint(['relatorio_id'], ['relatorio_historico.id'], name='fk_relatorio_item_relatorio_id'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_relatorio_item_relatorio_id_data_instalacao', 'relatorio_item', ['relatorio_id', 'data_instalacao'])
+    op.create_index('ix_relatorio_item_data_instalacao', 'relatorio_item', ['data_instalacao'])
+    op.execute(
+        "INSERT INTO relatorio_item (relatorio_id, tipo_combo, descricao_combo, login_cliente, data_instalacao, "
+        "porcentagem_comissao, comissao_centavos, observacoes) "
+        "SELECT relatorio_id, tipo_combo, descricao_combo, login_cliente, data_instalacao, porcentagem_comissao, "
+        "comissao_centavos, observacoes FROM instalacao WHERE relatorio_id IS NOT NULL ORDER BY relatorio_id, id"
+    )
+    op.execute("DELETE FROM instalacao WHERE relatorio_id IS NOT NULL")
+    if _sqlite():
+        _criar_indice_texto('relatorio_item')
+
+    op.drop_index('ix_instalacao_relatorio_id_data_instalacao', table_name='instalacao')
+    op.drop_index('ix_instalacao_abertas_user_id_data_registro', table_name='instalacao')
+    op.create_index('ix_instalacao_user_id_data_registro', 'instalacao', ['user_id', 'data_registro'])
+    with op.batch_alter_table('instalacao') as batch_op:
+        batch_op.alter_column('valor_arredondado_centavos', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('valor_original_centavos', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_constraint('fk_instalacao_relatorio_id', type_='foreignkey')
+        batch_op.drop_column('relatorio_id')
+    if _sqlite():
+        _criar_indice_texto('instalacao', virtual=False)
+
+    with op.batch_alter_table('relatorio_historico') as batch_op:
+        batch_op.drop_column('versao')
+        batch_op.drop_column('reaberto')
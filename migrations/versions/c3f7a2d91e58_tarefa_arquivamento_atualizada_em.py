@@ -0,0 +1,26 @@
+"""Última atualização das tarefas de arquivamento (retoma automática)
+
+Revision ID: c3f7a2d91e58
+Revises: b8e3d0a64f95
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f7a2d91e58'
+down_revision = 'b8e3d0a64f95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tarefa_arquivamento', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('atualizada_em', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('tarefa_arquivamento', schema=None) as batch_op:
+        batch_op.drop_column('atualizada_em')
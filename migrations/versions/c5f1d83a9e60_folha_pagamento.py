@@ -0,0 +1,31 @@
+"""Versão dos dados por técnico e índices por data para a folha de pagamento
+
+Revision ID: c5f1d83a9e60
+Revises: a3e9d6b47c21
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f1d83a9e60'
+down_revision = 'a3e9d6b47c21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.add_column(sa.Column('versao_dados', sa.Integer(), nullable=False, server_default='0'))
+
+    op.create_index('ix_instalacao_data_instalacao', 'instalacao', ['data_instalacao'])
+    op.create_index('ix_relatorio_item_data_instalacao', 'relatorio_item', ['data_instalacao'])
+
+
+def downgrade():
+    op.drop_index('ix_relatorio_item_data_instalacao', table_name='relatorio_item')
+    op.drop_index('ix_instalacao_data_instalacao', table_name='instalacao')
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('versao_dados')
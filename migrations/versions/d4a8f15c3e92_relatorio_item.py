@@ -0,0 +1,87 @@
+"""Itens de relatório em tabela própria no lugar de instalacoes_json
+
+Revision ID: d4a8f15c3e92
+Revises: b7d2e0f4a1c8
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+import datetime
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a8f15c3e92'
+down_revision = 'b7d2e0f4a1c8'
+branch_labels = None
+depends_on = None
+
+FORMATOS_ANTIGOS = ('%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S')
+
+
+def _converter_data(valor):
+    for formato in FORMATOS_ANTIGOS:
+        try:
+            return datetime.datetime.strptime(valor.strip(), formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Data de instalação inválida: {valor!r}")
+
+
+def upgrade():
+    relatorio_item = op.create_table('relatorio_item',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('relatorio_id', sa.Integer(), nullable=False),
+    sa.Column('tipo_combo', sa.String(length=50), nullable=True),
+    sa.Column('descricao_combo', sa.String(length=100), nullable=False),
+    sa.Column('login_cliente', sa.String(length=100), nullable=False),
+    sa.Column('data_instalacao', sa.Date(), nullable=False),
+    sa.Column('porcentagem_comissao', sa.Float(), nullable=True),
+    sa.Column('comissao', sa.Float(), nullable=False),
+    sa.Column('observacoes', sa.String(length=300), nullable=True),
+    sa.ForeignKeyConstraint(['relatorio_id'], ['relatorio_historico.id'], name='fk_relatorio_item_relatorio_id'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_relatorio_item_relatorio_id_data_instalacao', 'relatorio_item', ['relatorio_id', 'data_instalacao'])
+
+    # ### Converte os blobs JSON existentes, um relatório de cada vez ###
+    conn = op.get_bind()
+    relatorios = conn.execute(sa.text("SELECT id, instalacoes_json FROM relatorio_historico")).all()
+    for relatorio_id, instalacoes_json in relatorios:
+        itens = [{
+            'relatorio_id': relatorio_id,
+            'tipo_combo': item.get('tipo_combo'),
+            'descricao_combo': item['descricao_combo'],
+            'login_cliente': item['login_cliente'],
+            'data_instalacao': _converter_data(item['data_instalacao']),
+            'porcentagem_comissao': item.get('porcentagem_comissao'),
+            'comissao': item['comissao'],
+            'observacoes': item.get('observacoes'),
+        } for item in json.loads(instalacoes_json or '[]')]
+        if itens:
+            op.bulk_insert(relatorio_item, itens)
+
+    with op.batch_alter_table('relatorio_historico') as batch_op:
+        batch_op.drop_column('instalacoes_json')
+
+
+def downgrade():
+    with op.batch_alter_table('relatorio_historico') as batch_op:
+        batch_op.add_column(sa.Column('instalacoes_json', sa.String(), nullable=False, server_default='[]'))
+
+    conn = op.get_bind()
+    colunas = ('descricao_combo', 'login_cliente', 'data_instalacao', 'comissao', 'porcentagem_comissao', 'observacoes')
+    relatorio_ids = conn.execute(sa.text("SELECT id FROM relatorio_historico")).scalars().all()
+    for relatorio_id in relatorio_ids:
+        linhas = conn.execute(sa.text(
+            f"SELECT {', '.join(colunas)} FROM relatorio_item WHERE relatorio_id = :id ORDER BY id"
+        ), {'id': relatorio_id}).all()
+        instalacoes = [dict(zip(colunas, linha)) for linha in linhas]
+        for item in instalacoes:
+            item['data_instalacao'] = str(item['data_instalacao'])
+        conn.execute(sa.text("UPDATE relatorio_historico SET instalacoes_json = :blob WHERE id = :id"), {'blob': json.dumps(instalacoes), 'id': relatorio_id})
+
+    op.drop_index('ix_relatorio_item_relatorio_id_data_instalacao', table_name='relatorio_item')
+    op.drop_table('relatorio_item')
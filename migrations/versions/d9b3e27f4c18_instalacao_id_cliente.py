@@ -0,0 +1,28 @@
+"""id_cliente das instalações registadas offline
+
+Revision ID: d9b3e27f4c18
+Revises: c5f1d83a9e60
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9b3e27f4c18'
+down_revision = 'c5f1d83a9e60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('instalacao') as batch_op:
+        batch_op.add_column(sa.Column('id_cliente', sa.String(length=36), nullable=True))
+        batch_op.create_unique_constraint('uq_instalacao_user_id_id_cliente', ['user_id', 'id_cliente'])
+
+
+def downgrade():
+    with op.batch_alter_table('instalacao') as batch_op:
+        batch_op.drop_constraint('uq_instalacao_user_id_id_cliente', type_='unique')
+        batch_op.drop_column('id_cliente')
@@ -0,0 +1,26 @@
+"""Coluna is_admin no utilizador
+
+Revision ID: e61b0c9d7a24
+Revises: d4a8f15c3e92
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61b0c9d7a24'
+down_revision = 'd4a8f15c3e92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.add_column(sa.Column('is_admin', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('is_admin')
@@ -0,0 +1,61 @@
+"""Valores monetários em centavos inteiros
+
+Revision ID: e8a4c61f0b37
+Revises: d9b3e27f4c18
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a4c61f0b37'
+down_revision = 'd9b3e27f4c18'
+branch_labels = None
+depends_on = None
+
+# tabela -> [(coluna em reais, coluna em centavos)]
+COLUNAS = {
+    'instalacao': [('valor_original', 'valor_original_centavos'), ('valor_arredondado', 'valor_arredondado_centavos'), ('comissao', 'comissao_centavos')],
+    'relatorio_item': [('comissao', 'comissao_centavos')],
+    'relatorio_historico': [('total_comissoes', 'total_comissoes_centavos')],
+    'resumo_diario': [('total_comissoes', 'total_comissoes_centavos')],
+    'combo': [('preco', 'preco_centavos')],
+}
+
+
+def upgrade():
+    # Novas colunas inteiras preenchidas com o valor arredondado ao centavo; não se usa
+    # alter_column porque no SQLite o modo batch copiaria os valores com CAST.
+    for tabela, colunas in COLUNAS.items():
+        with op.batch_alter_table(tabela) as batch_op:
+            for _, centavos in colunas:
+                batch_op.add_column(sa.Column(centavos, sa.Integer(), nullable=False, server_default='0'))
+        op.execute(f"UPDATE {tabela} SET " + ', '.join(f"{centavos} = CAST(ROUND({reais} * 100) AS INTEGER)" for reais, centavos in colunas))
+
+    # Os totais passam a ser a soma exata das linhas, sem o erro acumulado das somas em float.
+    op.execute("UPDATE relatorio_historico SET total_comissoes_centavos = "
+               "(SELECT COALESCE(SUM(comissao_centavos), 0) FROM relatorio_item WHERE relatorio_item.relatorio_id = relatorio_historico.id) "
+               "WHERE EXISTS (SELECT 1 FROM relatorio_item WHERE relatorio_item.relatorio_id = relatorio_historico.id)")
+    op.execute("DELETE FROM resumo_diario")
+    op.execute("INSERT INTO resumo_diario (user_id, data, total_comissoes, total_comissoes_centavos, num_instalacoes) "
+               "SELECT user_id, data_instalacao, 0, SUM(comissao_centavos), COUNT(id) FROM instalacao GROUP BY user_id, data_instalacao")
+
+    for tabela, colunas in COLUNAS.items():
+        with op.batch_alter_table(tabela) as batch_op:
+            for reais, centavos in colunas:
+                batch_op.alter_column(centavos, server_default=None)
+                batch_op.drop_column(reais)
+
+
+def downgrade():
+    for tabela, colunas in COLUNAS.items():
+        with op.batch_alter_table(tabela) as batch_op:
+            for reais, _ in colunas:
+                batch_op.add_column(sa.Column(reais, sa.Float(), nullable=False, server_default='0'))
+        op.execute(f"UPDATE {tabela} SET " + ', '.join(f"{reais} = {centavos} / 100.0" for reais, centavos in colunas))
+        with op.batch_alter_table(tabela) as batch_op:
+            for reais, centavos in colunas:
+                batch_op.alter_column(reais, server_default=None)
+                batch_op.drop_column(centavos)
@@ -0,0 +1,68 @@
+"""Catálogo de combos versionado no banco
+
+Revision ID: f2c7a93e5b10
+Revises: e61b0c9d7a24
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c7a93e5b10'
+down_revision = 'e61b0c9d7a24'
+branch_labels = None
+depends_on = None
+
+# Catálogo que estava fixo no código até esta migração; vira a versão 1.
+COMBOS_INICIAIS = {
+    "CIDADE_FIBRA": { "300_MEGAS": {"preco": 99.90, "descricao": "300 MEGAS - CIDADE FIBRA ÓPTICA"}, "650_MEGAS": {"preco": 119.90, "descricao": "650 MEGAS - CIDADE FIBRA ÓPTICA"}, "800_MEGAS": {"preco": 139.90, "descricao": "800 MEGAS - CIDADE FIBRA ÓPTICA"}},
+    "RURAL_FIBRA": { "300_MEGAS": {"preco": 109.90, "descricao": "300 MEGAS - RURAL FIBRA ÓPTICA"}, "650_MEGAS": {"preco": 129.90, "descricao": "650 MEGAS - RURAL FIBRA ÓPTICA"}, "800_MEGAS": {"preco": 149.90, "descricao": "800 MEGAS - RURAL FIBRA ÓPTICA"}},
+    "RURAL_RADIO": { "4_MEGAS": {"preco": 109.90, "descricao": "4 MEGAS - RURAL VIA RÁDIO"}, "8_MEGAS": {"preco": 129.90, "descricao": "8 MEGAS - RURAL VIA RÁDIO"}, "14_MEGAS": {"preco": 159.90, "descricao": "14 MEGAS - RURAL VIA RÁDIO"}}
+}
+
+
+def upgrade():
+    catalogo_versao = op.create_table('catalogo_versao',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('descricao', sa.String(length=200), nullable=True),
+    sa.Column('data_publicacao', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    combo = op.create_table('combo',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('versao_id', sa.Integer(), nullable=False),
+    sa.Column('tipo_combo', sa.String(length=50), nullable=False),
+    sa.Column('chave', sa.String(length=50), nullable=False),
+    sa.Column('descricao', sa.String(length=100), nullable=False),
+    sa.Column('preco', sa.Float(), nullable=False),
+    sa.Column('porcentagem_padrao', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['versao_id'], ['catalogo_versao.id'], name='fk_combo_versao_id'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('versao_id', 'tipo_combo', 'chave', name='uq_combo_versao_tipo_chave')
+    )
+    op.create_index('ix_combo_versao_id', 'combo', ['versao_id'])
+
+    # ### Versão 1 = catálogo antigo ###
+    op.bulk_insert(catalogo_versao, [{'id': 1, 'descricao': 'Catálogo inicial', 'data_publicacao': datetime.datetime.now()}])
+    op.bulk_insert(combo, [
+        {'versao_id': 1, 'tipo_combo': tipo, 'chave': chave, 'descricao': dados['descricao'], 'preco': dados['preco'], 'porcentagem_padrao': 15.0}
+        for tipo, combos in COMBOS_INICIAIS.items() for chave, dados in combos.items()
+    ])
+
+    with op.batch_alter_table('instalacao') as batch_op:
+        batch_op.add_column(sa.Column('catalogo_versao_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_instalacao_catalogo_versao_id', 'catalogo_versao', ['catalogo_versao_id'], ['id'])
+    op.execute("UPDATE instalacao SET catalogo_versao_id = 1")
+
+
+def downgrade():
+    with op.batch_alter_table('instalacao') as batch_op:
+        batch_op.drop_constraint('fk_instalacao_catalogo_versao_id', type_='foreignkey')
+        batch_op.drop_column('catalogo_versao_id')
+    op.drop_index('ix_combo_versao_id', table_name='combo')
+    op.drop_table('combo')
+    op.drop_table('catalogo_versao')
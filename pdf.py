@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Relatórios de comissões em PDF, gerados no servidor.
+
+``gerar_pdf`` recebe o cabeçalho e as linhas do relatório como tuplas simples (já lidas do
+banco pelo pedido) e devolve os bytes do PDF. Usa o fpdf2, em Python puro; sem o pacote
+(``pip install fpdf2``) ``pdf_disponivel()`` devolve False e as rotas de PDF recusam o pedido.
+
+A geração de um relatório grande ocupa a CPU durante segundos, por isso ``FilaPdf`` corre-a
+num pool de processos pequeno e limitado: o worker do gunicorn só espera pelo resultado até
+um limite de tempo e, quando o pool e a fila estão cheios, o pedido é recusado em vez de
+esperar. Pedidos iguais enquanto um PDF está a ser gerado partilham a mesma tarefa, e o
+resultado fica guardado num cache (``CacheFragmentos`` em ``app.py``) pela chave do pedido.
+"""
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TempoEsgotado
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+
+try:
+    from fpdf import FPDF
+except ImportError:
+    FPDF = None
+
+# Incluída nas chaves do cache: mudar o layout invalida os PDFs já gerados.
+VERSAO_LAYOUT = 1
+
+# Data, combo, cliente, observações, comissão (largura em mm numa A4 com margens de 10 mm).
+COLUNAS = (('Data', 20, 'L'), ('Combo', 50, 'L'), ('Cliente', 42, 'L'), ('Observações', 48, 'L'), ('Comissão', 30, 'R'))
+ALTURA_LINHA = 6
+
+
+def pdf_disponivel():
+    return FPDF is not None
+
+
+class FilaCheia(RuntimeError):
+    pass
+
+
+class LinhasDemais(ValueError):
+    """O relatório passa de ``PDF_LINHAS_MAX`` linhas: as linhas ficariam todas em memória no
+    worker e no processo do pool, por isso o pedido é recusado (a exportação CSV não tem limite)."""
+
+
+# Pontuação tipográfica comum (ex.: colada do WhatsApp) que não existe em latin-1.
+PONTUACAO = str.maketrans({'\u2013': '-', '\u2014': '-', '\u2018': "'", '\u2019': "'", '\u201c': '"', '\u201d': '"', '\u2026': '...'})
+
+
+def _latin1(texto):
+    # As fontes base do PDF (Helvetica) só cobrem latin-1; o resto é trocado por '?'.
+    return (texto or '').translate(PONTUACAO).encode('latin-1', 'replace').decode('latin-1')
+
+
+def _reais(centavos):
+    valor = f"{Decimal(centavos or 0) / 100:,.2f}"
+    return 'R$ ' + valor.replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def _cortar(pdf, texto, largura):
+    # Soma as larguras da tabela da fonte em vez de chamar get_string_width a cada caractere:
+    # é o que domina o tempo de um relatório com milhares de linhas.
+    texto = _latin1(texto)
+    larguras = pdf.current_font.cw
+    limite = (largura - 2) * 1000 / pdf.font_size
+    if sum(larguras[c] for c in texto) <= limite:
+        return texto
+    limite -= 3 * larguras['.']
+    soma = 0
+    for i, c in enumerate(texto):
+        soma += larguras[c]
+        if soma > limite:
+            return texto[:i] + '...'
+    return texto
+
+
+class _Documento(FPDF if FPDF is not None else object):
+    def __init__(self, titulo, subtitulos):
+        super().__init__(format='A4')
+        self.titulo = _latin1(titulo)
+        self.subtitulos = [_latin1(s) for s in subtitulos]
+        self.set_margins(10, 10, 10)
+        self.set_auto_page_break(True, margin=15)
+
+    def header(self):
+        if self.page_no() == 1:
+            self.set_font('Helvetica', 'B', 16)
+            self.cell(0, 9, self.titulo, align='C', new_x='LMARGIN', new_y='NEXT')
+            self.set_font('Helvetica', '', 10)
+            for subtitulo in self.subtitulos:
+                self.cell(0, 5, subtitulo, align='C', new_x='LMARGIN', new_y='NEXT')
+            self.ln(4)
+        # O cabeçalho da tabela repete-se em todas as páginas.
+        self.set_font('Helvetica', 'B', 9)
+        self.set_fill_color(226, 232, 240)
+        for nome, largura, alinhamento in COLUNAS:
+            self.cell(largura, ALTURA_LINHA + 1, _latin1(nome), border=1, align=alinhamento, fill=True)
+        self.ln()
+        self.set_font('Helvetica', '', 8)
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font('Helvetica', 'I', 8)
+        self.cell(0, 5, f'Página {self.page_no()}/{{nb}}', align='C')
+
+
+def gerar_pdf(titulo, subtitulos, linhas, total_centavos):
+    """Monta o PDF. Cada linha é ``(data_instalacao, combo, cliente, observacoes,
+    comissao_centavos, porcentagem)``. Corre nos processos do pool: não pode depender da aplicação nem do banco."""
+    pdf = _Documento(titulo, subtitulos)
+    pdf.add_page()
+    for data_instalacao, combo, cliente, observacoes, comissao_centavos, porcentagem in linhas:
+        comissao = _reais(comissao_centavos)
+        if porcentagem:
+            comissao = f'{comissao} ({porcentagem:g}%)'
+        valores = (data_instalacao.strftime('%d/%m/%Y'), combo, cliente, observacoes, comissao)
+        for (_, largura, alinhamento), valor in zip(COLUNAS, valores):
+            pdf.cell(largura, ALTURA_LINHA, _cortar(pdf, valor, largura), border='B', align=alinhamento)
+        pdf.ln()
+    pdf.set_font('Helvetica', 'B', 10)
+    largura_rotulo = sum(largura for _, largura, _ in COLUNAS[:-1])
+    pdf.cell(largura_rotulo, ALTURA_LINHA + 2, _latin1('TOTAL DE COMISSÕES:'), align='R')
+    pdf.cell(COLUNAS[-1][1], ALTURA_LINHA + 2, _reais(total_centavos), align='R')
+    return bytes(pdf.output())
+
+
+class FilaPdf:
+    def __init__(self, processos=2, fila=8, espera=10):
+        self._executor = None
+        self._pendentes = {}
+        # Reentrante: add_done_callback chama _concluido na hora se a tarefa já tiver terminado.
+        self._lock = threading.RLock()
+        self.configurar(processos, fila, espera)
+
+    def configurar(self, processos, fila, espera):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            # O pool só é criado no primeiro PDF, já dentro do worker (e nunca nos comandos `flask`).
+            self._executor = None
+            self._pendentes.clear()
+        self.processos = processos
+        self.fila = fila
+        self.espera = espera
+
+    def obter(self, chave, cache, argumentos, em_disco=True):
+        """Devolve os bytes do PDF de `chave`, ou None se ainda não ficou pronto ao fim de
+        `espera` segundos (a geração continua e o resultado fica no cache). `argumentos` é uma
+        função que devolve os argumentos de ``gerar_pdf``; só é chamada se for preciso gerar."""
+        pdf = cache.obter(chave)
+        if pdf is not None:
+            return pdf
+        with self._lock:
+            futuro = self._pendentes.get(chave)
+        if futuro is None:
+            # As linhas são lidas fora do lock; se outro pedido submeteu a mesma chave
+            # entretanto, usa-se a tarefa dele.
+            args = argumentos()
+            with self._lock:
+                futuro = self._pendentes.get(chave)
+                if futuro is None:
+                    if len(self._pendentes) >= self.processos + self.fila:
+                        raise FilaCheia()
+                    if self._executor is None:
+                        # spawn: os processos não herdam as conexões do banco nem as threads do worker.
+                        self._executor = ProcessPoolExecutor(self.processos, mp_context=multiprocessing.get_context('spawn'))
+                    futuro = self._executor.submit(gerar_pdf, *args)
+                    self._pendentes[chave] = futuro
+                    futuro.add_done_callback(functools.partial(self._concluido, chave, cache, em_disco))
+        try:
+            return futuro.result(timeout=self.espera)
+        except TempoEsgotado:
+            return None
+
+    def _concluido(self, chave, cache, em_disco, futuro):
+        # Guarda antes de retirar dos pendentes, para que um pedido seguinte encontre o PDF no cache.
+        if not futuro.cancelled() and futuro.exception() is None:
+            cache.guardar(chave, futuro.result(), em_disco=em_disco)
+        with self._lock:
+            if self._pendentes.get(chave) is futuro:
+                del self._pendentes[chave]
+            if not futuro.cancelled() and isinstance(futuro.exception(), BrokenProcessPool):
+                # Um processo morreu (ex.: falta de memória); o próximo PDF cria um pool novo.
+                self._executor = None
@@ -0,0 +1,118 @@
+// Fila de instalações registadas sem ligação, guardada em IndexedDB. É usada pela página
+// (ao submeter o formulário) e pelo service worker (no evento de sincronização em segundo plano).
+(function (global) {
+    const BANCO = 'comissoes-offline';
+    const LOJA = 'instalacoes_pendentes';
+    const URL_LOTE = '/api/v1/instalacoes/lote';
+    const TAMANHO_LOTE = 100;
+
+    function pedido(req) {
+        return new Promise((resolve, reject) => {
+            req.onsuccess = () => resolve(req.result);
+            req.onerror = () => reject(req.error);
+        });
+    }
+
+    function abrir() {
+        const req = global.indexedDB.open(BANCO, 1);
+        req.onupgradeneeded = () => req.result.createObjectStore(LOJA, { keyPath: 'id_cliente' });
+        return pedido(req);
+    }
+
+    async function loja(modo) {
+        const banco = await abrir();
+        return banco.transaction(LOJA, modo).objectStore(LOJA);
+    }
+
+    function novoId() {
+        if (global.crypto && global.crypto.randomUUID) {
+            return global.crypto.randomUUID();
+        }
+        const bytes = global.crypto.getRandomValues(new Uint8Array(16));
+        return Array.from(bytes, (b) => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function adicionar(entrada) {
+        return pedido((await loja('readwrite')).put(entrada));
+    }
+
+    async function listar() {
+        return pedido((await loja('readonly')).getAll());
+    }
+
+    async function contar() {
+        return pedido((await loja('readonly')).count());
+    }
+
+    async function remover(ids) {
+        const l = await loja('readwrite');
+        await Promise.all(ids.map((id) => pedido(l.delete(id))));
+    }
+
+    // O fetch só é rejeitado (com TypeError) quando não há ligação; qualquer resposta do
+    // servidor, mesmo 4xx ou 5xx, chega como resposta e vira ErroServidor.
+    class SemLigacao extends Error {}
+
+    class ErroServidor extends Error {
+        constructor(status, mensagem) {
+            super(mensagem || `Falha no envio (${status})`);
+            this.status = status;
+        }
+    }
+
+    async function enviarLote(entradas) {
+        let resposta;
+        try {
+            resposta = await fetch(URL_LOTE, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: { 'Content-Type': 'application/json', 'Accept': 'application/json' },
+                body: JSON.stringify({ instalacoes: entradas }),
+            });
+        } catch (erro) {
+            if (erro instanceof TypeError) throw new SemLigacao(erro.message);
+            throw erro;
+        }
+        if (!resposta.ok) {
+            const dados = await resposta.json().catch(() => null);
+            throw new ErroServidor(resposta.status, dados && dados.erro);
+        }
+        return (await resposta.json()).resultados;
+    }
+
+    function contabilizar(resumo, resultados) {
+        for (const r of resultados) {
+            if (r.estado === 'criada') resumo.criadas += 1;
+            if (r.estado === 'erro') resumo.erros.push(r);
+        }
+        return resumo;
+    }
+
+    // Envia uma instalação nova. Só vai para a fila se não houver ligação (SemLigacao); um erro
+    // do servidor é lançado sem guardar nada, para ser mostrado logo.
+    async function registar(entrada) {
+        try {
+            return contabilizar({ criadas: 0, erros: [] }, await enviarLote([entrada]));
+        } catch (erro) {
+            if (erro instanceof SemLigacao) await adicionar(entrada);
+            throw erro;
+        }
+    }
+
+    // Envia a fila em lotes. Sem ligação ou com um erro do servidor lança SemLigacao ou
+    // ErroServidor, e as entradas ainda por enviar ficam guardadas.
+    async function enviar() {
+        const resumo = { criadas: 0, erros: [] };
+        const pendentes = await listar();
+        for (let i = 0; i < pendentes.length; i += TAMANHO_LOTE) {
+            const resultados = await enviarLote(pendentes.slice(i, i + TAMANHO_LOTE));
+            // Criadas e duplicadas já estão no servidor; as com erro nunca seriam aceites,
+            // por isso também saem da fila (e são devolvidas para serem mostradas).
+            await remover(resultados.map((r) => r.id_cliente));
+            contabilizar(resumo, resultados);
+        }
+        return resumo;
+    }
+
+    global.FilaOffline = { SemLigacao, ErroServidor, novoId, adicionar, listar, contar, registar, enviar };
+})(self);
@@ -0,0 +1,116 @@
+// Service worker da PWA: guarda os arquivos estáticos e a última versão das páginas e da API
+// para uso offline, e envia em segundo plano as instalações registadas sem ligação.
+importScripts('/static/js/fila-offline.js');
+
+// Alterar o nome quando mudar a forma de guardar, para descartar as cópias antigas.
+const CACHE = 'comissoes-v2';
+// Guardados na instalação para a primeira abertura sem rede. Os arquivos sem hash no nome são
+// pedidos primeiro à rede (uma cópia guardada podia ficar desatualizada para sempre); só os de
+// static/dist/ (com hash, `flask ativos-construir`) e os externos são servidos do cache.
+const ESTATICOS = [
+    '/manifest.json',
+    '/static/img/ic_launcher.png',
+    '/static/js/fila-offline.js',
+];
+const PAGINA_INICIAL = '/';
+const IMUTAVEIS = '/static/dist/';
+const ORIGENS_EXTERNAS = ['https://cdn.tailwindcss.com'];
+
+// A página inicial é a alternativa offline das navegações. Só é guardada se o pedido não foi
+// redirecionado para o login; se falhar, a instalação continua e fica guardada na próxima visita.
+async function guardarPaginaInicial(cache) {
+    try {
+        const resposta = await fetch(PAGINA_INICIAL);
+        if (resposta.status === 200 && !resposta.redirected) {
+            await cache.put(PAGINA_INICIAL, resposta);
+        }
+    } catch (erro) {
+        // Sem rede: fica para depois.
+    }
+}
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(
+        caches.open(CACHE)
+            .then((cache) => Promise.all([cache.addAll(ESTATICOS), guardarPaginaInicial(cache)]))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then((nomes) => Promise.all(nomes.filter((nome) => nome !== CACHE).map((nome) => caches.delete(nome))))
+            .then(() => self.clients.claim())
+    );
+});
+
+async function primeiroCache(request) {
+    const guardada = await caches.match(request);
+    if (guardada) return guardada;
+    const resposta = await fetch(request);
+    if (resposta.ok || resposta.type === 'opaque') {
+        (await caches.open(CACHE)).put(request, resposta.clone());
+    }
+    return resposta;
+}
+
+// Páginas, API e estáticos sem hash: sempre a versão da rede (o cache HTTP do navegador faz a
+// revalidação por ETag); a cópia guardada só é usada quando não há ligação.
+async function primeiroRede(request, paginaAlternativa) {
+    try {
+        const resposta = await fetch(request);
+        // Só 200: o 202 de um PDF ainda em geração não deve ficar como cópia offline.
+        if (resposta.status === 200 && !resposta.redirected) {
+            (await caches.open(CACHE)).put(request, resposta.clone());
+        }
+        return resposta;
+    } catch (erro) {
+        const guardada = await caches.match(request) || (paginaAlternativa && await caches.match(paginaAlternativa));
+        if (guardada) return guardada;
+        throw erro;
+    }
+}
+
+// No logout apagam-se as páginas e respostas da API guardadas (dados do técnico); os
+// arquivos estáticos ficam. A fila offline (IndexedDB) não é tocada.
+async function apagarDadosDoUtilizador() {
+    const cache = await caches.open(CACHE);
+    const pedidos = await cache.keys();
+    await Promise.all(pedidos.filter((pedido) => {
+        const url = new URL(pedido.url);
+        return url.origin === self.location.origin && !url.pathname.startsWith('/static/') && !ESTATICOS.includes(url.pathname);
+    }).map((pedido) => cache.delete(pedido)));
+}
+
+async function sair(request) {
+    await apagarDadosDoUtilizador();
+    return fetch(request);
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+    if (ORIGENS_EXTERNAS.includes(url.origin)) {
+        event.respondWith(primeiroCache(request));
+    } else if (url.origin !== self.location.origin) {
+        return;
+    } else if (url.pathname === '/logout') {
+        event.respondWith(sair(request));
+    } else if (url.pathname.startsWith(IMUTAVEIS)) {
+        event.respondWith(primeiroCache(request));
+    } else if (url.pathname.startsWith('/static/') || ESTATICOS.includes(url.pathname)) {
+        event.respondWith(primeiroRede(request));
+    } else if (request.mode === 'navigate') {
+        event.respondWith(primeiroRede(request, PAGINA_INICIAL));
+    } else if (url.pathname.startsWith('/api/')) {
+        event.respondWith(primeiroRede(request));
+    }
+});
+
+self.addEventListener('sync', (event) => {
+    if (event.tag === 'enviar-instalacoes') {
+        event.waitUntil(self.FilaOffline.enviar());
+    }
+});
@@ -0,0 +1,6 @@
+/** Usado por `flask ativos-construir` para gerar static/css/app.css. */
+module.exports = {
+  content: ['./templates/**/*.html', './static/js/**/*.js'],
+  theme: { extend: {} },
+  plugins: [],
+};
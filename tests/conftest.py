@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from app import create_app, db, User
+
+CONFIG_TESTES = {
+    'TESTING': True,
+    'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    'BCRYPT_LOG_ROUNDS': 4,
+    'ARQUIVAMENTO_SINCRONO': True,
+    'JINJA_CACHE_BYTECODE': False,
+    'TEMPLATES_PRE_COMPILAR': False,
+    'RELATORIO_CACHE_DISCO': False,
+}
+
+
+@pytest.fixture
+def config():
+    return dict(CONFIG_TESTES)
+
+
+@pytest.fixture
+def app(config):
+    app = create_app(config, migracoes=False)
+    with app.app_context():
+        db.create_all()
+        usuario = User(username='tecnico')
+        usuario.set_password('senha')
+        db.session.add(usuario)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def cliente(app):
+    cliente = app.test_client()
+    resposta = cliente.post('/login', data={'username': 'tecnico', 'password': 'senha'})
+    assert resposta.status_code == 302
+    return cliente
+
+
+def nova_instalacao(cliente, login_cliente, data, combo_key='300_MEGAS'):
+    resposta = cliente.post('/', data={'tipo_combo': 'CIDADE_FIBRA', 'combo_key': combo_key, 'login_cliente': login_cliente,
+                                       'data_instalacao': data, 'porcentagem_comissao': '15'})
+    assert resposta.status_code == 302
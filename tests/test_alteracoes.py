@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+from app import db, Instalacao, ResumoDiario, User
+from conftest import nova_instalacao
+
+
+@pytest.fixture
+def config(config):
+    config['CONSULTAS_GUARDA'] = True
+    return config
+
+
+def criar(login_cliente, data, combo_key='300_MEGAS'):
+    return {'acao': 'criar', 'tipo_combo': 'CIDADE_FIBRA', 'combo_key': combo_key, 'login_cliente': login_cliente,
+            'data_instalacao': data, 'porcentagem_comissao': '15'}
+
+
+def enviar(cliente, operacoes, **extra):
+    return cliente.post('/api/v1/instalacoes/alteracoes', json={'operacoes': operacoes, **extra})
+
+
+def estado(app):
+    with app.app_context():
+        instalacoes = [(i.id, i.login_cliente, i.data_instalacao, i.comissao_centavos) for i in Instalacao.query.order_by(Instalacao.id)]
+        resumos = [(r.data, r.total_comissoes_centavos, r.num_instalacoes) for r in ResumoDiario.query.order_by(ResumoDiario.data)]
+        return instalacoes, resumos, db.session.get(User, 1).versao_dados
+
+
+def test_lote_valido_atualiza_o_resumo_e_a_versao(app, cliente):
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    nova_instalacao(cliente, 'b', '2025-01-05')
+    _, _, versao = estado(app)
+    resposta = enviar(cliente, [criar('c', '2025-01-06', '800_MEGAS'),
+                                {**criar('a2', '2025-01-06'), 'acao': 'editar', 'id': 1},
+                                {'acao': 'excluir', 'id': 2}], versao=versao)
+    assert resposta.status_code == 200
+    assert [r['estado'] for r in resposta.json['resultados']] == ['criada', 'atualizada', 'excluida']
+    instalacoes, resumos, nova_versao = estado(app)
+    assert resposta.json['versao'] == nova_versao == versao + 1
+    assert [(i[1], i[2]) for i in instalacoes] == [('a2', datetime.date(2025, 1, 6)), ('c', datetime.date(2025, 1, 6))]
+    assert resumos == [(datetime.date(2025, 1, 6), 1500 + 2100, 2)]
+
+
+def test_linha_invalida_nao_grava_nada(app, cliente):
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    antes = estado(app)
+    resposta = enviar(cliente, [criar('c', '2025-01-06'), {'acao': 'excluir', 'id': 1},
+                                {**criar('d', '2025-01-07'), 'porcentagem_comissao': 'inf'}])
+    assert resposta.status_code == 422
+    assert [r['estado'] for r in resposta.json['resultados']] == ['ignorada', 'ignorada', 'erro']
+    assert estado(app) == antes
+
+
+def test_versao_desatualizada_nao_grava_nada(app, cliente):
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    antes = estado(app)
+    resposta = enviar(cliente, [criar('c', '2025-01-06'), {'acao': 'excluir', 'id': 1}], versao=antes[2] - 1)
+    assert resposta.status_code == 409
+    assert resposta.json['versao'] == antes[2]
+    assert estado(app) == antes
+
+
+def test_versao_que_nao_e_inteira(app, cliente):
+    assert enviar(cliente, [criar('c', '2025-01-06')], versao='1').status_code == 400
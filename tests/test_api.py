@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from conftest import nova_instalacao
+
+
+def test_etag_da_api_muda_com_os_dados(cliente):
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    resposta = cliente.get('/api/v1/totais')
+    assert resposta.status_code == 200
+    etag = resposta.headers['ETag']
+    versao = resposta.headers['X-Versao-Dados']
+
+    repetida = cliente.get('/api/v1/totais', headers={'If-None-Match': etag})
+    assert repetida.status_code == 304
+    assert repetida.headers['ETag'] == etag
+    # Outra URL tem outro ETag, mesmo com os mesmos dados.
+    assert cliente.get('/api/v1/instalacoes', headers={'If-None-Match': etag}).status_code == 200
+
+    nova_instalacao(cliente, 'b', '2025-01-06')
+    depois = cliente.get('/api/v1/totais', headers={'If-None-Match': etag})
+    assert depois.status_code == 200
+    assert depois.headers['ETag'] != etag
+    assert int(depois.headers['X-Versao-Dados']) > int(versao)
+
+
+def test_api_sem_sessao(app):
+    assert app.test_client().get('/api/v1/totais').status_code == 401
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from app import db, User
+from conftest import nova_instalacao
+
+
+def test_drop_all_e_create_all_recriam_o_indice_de_texto(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        usuario = User(username='tecnico')
+        usuario.set_password('senha')
+        db.session.add(usuario)
+        db.session.commit()
+    cliente = app.test_client()
+    assert cliente.post('/login', data={'username': 'tecnico', 'password': 'senha'}).status_code == 302
+    nova_instalacao(cliente, 'José da Silva', '2025-01-05')
+    resposta = cliente.get('/api/v1/busca?q=jose')
+    assert resposta.status_code == 200
+    assert [r['login_cliente'] for r in resposta.get_json()['resultados']] == ['José da Silva']
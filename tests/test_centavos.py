@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+from app import (db, Instalacao, ResumoDiario, User, arredondar_centavos, calcular_comissao_centavos, ler_porcentagem,
+                 para_centavos, recalcular_comissoes)
+from conftest import nova_instalacao
+
+
+def test_conversao_para_centavos():
+    assert para_centavos('99,90') == 9990
+    assert para_centavos(0.1 + 0.2) == 30
+    assert arredondar_centavos(9990) == 10000
+    assert arredondar_centavos(10000) == 10000
+    assert calcular_comissao_centavos(10000, 15) == 1500
+    # A percentagem passa a pontos-base (12,345% -> 1235) e a comissão arredonda o meio centavo para cima.
+    assert calcular_comissao_centavos(14000, 12.345) == 1729
+    assert calcular_comissao_centavos(100, 0.5) == 1
+
+
+@pytest.mark.parametrize('valor', ['inf', '-inf', 'nan', '1e400', '-1', '100.01', 'abc'])
+def test_porcentagem_invalida(valor):
+    with pytest.raises(ValueError):
+        ler_porcentagem(valor)
+
+
+def test_porcentagem_valida():
+    assert ler_porcentagem('12,5') == 12.5
+    assert ler_porcentagem(0) == 0
+    assert ler_porcentagem('100') == 100
+
+
+@pytest.mark.parametrize('valor', ['inf', '1e400'])
+def test_formulario_recusa_porcentagem_nao_finita(app, cliente, valor):
+    resposta = cliente.post('/', data={'tipo_combo': 'CIDADE_FIBRA', 'combo_key': '300_MEGAS', 'login_cliente': 'a',
+                                       'data_instalacao': '2025-01-05', 'porcentagem_comissao': valor})
+    assert resposta.status_code == 302
+    assert 'Percentagem de comissão inválida' in cliente.get('/').get_data(as_text=True)
+    with app.app_context():
+        assert Instalacao.query.count() == 0
+
+
+def test_api_recusa_porcentagem_nao_finita(app, cliente):
+    entradas = [{'id_cliente': 'x1', 'tipo_combo': 'CIDADE_FIBRA', 'combo_key': '300_MEGAS', 'login_cliente': 'a',
+                 'data_instalacao': '2025-01-05', 'porcentagem_comissao': 'inf'}]
+    resposta = cliente.post('/api/v1/instalacoes/lote', json={'instalacoes': entradas})
+    assert resposta.status_code == 200
+    assert resposta.get_json()['resultados'][0]['estado'] == 'erro'
+    with app.app_context():
+        assert Instalacao.query.count() == 0
+
+
+def test_recalcular_comissoes_num_update(app, cliente):
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    nova_instalacao(cliente, 'b', '2025-01-06', combo_key='800_MEGAS')
+    with app.app_context():
+        assert recalcular_comissoes(porcentagem='12,5') == 2
+        assert sorted(i.comissao_centavos for i in Instalacao.query) == [1250, 1750]
+        assert [(r.data, r.total_comissoes_centavos) for r in ResumoDiario.query.order_by(ResumoDiario.data)] == [
+            (datetime.date(2025, 1, 5), 1250), (datetime.date(2025, 1, 6), 1750)]
+        assert db.session.get(User, 1).versao_dados > 0
+        with pytest.raises(ValueError):
+            recalcular_comissoes(porcentagem='inf')
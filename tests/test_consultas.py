@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from consultas import _declaracao
+from conftest import nova_instalacao
+
+
+@pytest.fixture
+def config(config):
+    # Com TESTING, uma violação levanta ViolacaoConsultas e o pedido falha.
+    config['CONSULTAS_GUARDA'] = True
+    return config
+
+
+ROTAS = [
+    ('GET', '/', None),
+    ('GET', '/instalacoes/pagina', None),
+    ('GET', '/editar/1', None),
+    ('POST', '/editar/1', {'tipo_combo': 'CIDADE_FIBRA', 'combo_key': '650_MEGAS', 'login_cliente': 'c1',
+                           'data_instalacao': '2025-02-03', 'porcentagem_comissao': '15'}),
+    ('POST', '/excluir/2', None),
+    ('POST', '/salvar-periodo', {'start_date': '2025-01-01', 'end_date': '2025-01-31'}),
+    ('GET', '/tarefas/1', None),
+    ('GET', '/relatorio-historico/1', None),
+    ('GET', '/relatorio-historico/1/imprimir', None),
+    ('GET', '/relatorio/imprimir', None),
+    ('GET', '/exportar/instalacoes.csv', None),
+    ('GET', '/api/v1/instalacoes', None),
+    ('GET', '/api/v1/totais', None),
+    ('GET', '/api/v1/busca?q=c1', None),
+    ('GET', '/api/v1/combos', None),
+    ('GET', '/api/v1/relatorios', None),
+    ('GET', '/api/v1/relatorios/1', None),
+]
+
+
+def test_rotas_principais_dentro_do_orcamento(app, cliente):
+    for i in range(30):
+        nova_instalacao(cliente, f'c{i}', f'2025-{i % 2 + 1:02d}-{i % 28 + 1:02d}')
+    adaptador = app.url_map.bind('localhost')
+    for metodo, caminho, dados in ROTAS:
+        resposta = cliente.open(caminho, method=metodo, data=dados)
+        assert resposta.status_code < 400, (metodo, caminho, resposta.status_code)
+        endpoint, _ = adaptador.match(caminho.split('?')[0], method=metodo)
+        # As rotas em lotes (ex.: salvar-periodo) declaram só permitir_repeticoes, sem máximo.
+        orcamento = _declaracao(app.view_functions[endpoint], 'orcamento_consultas', None) or app.config['CONSULTAS_ORCAMENTO_PADRAO']
+        assert 'X-Consultas-SQL' in resposta.headers, (metodo, caminho)
+        if orcamento:
+            assert int(resposta.headers['X-Consultas-SQL']) <= orcamento, (metodo, caminho)
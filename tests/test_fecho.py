@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from app import db, Instalacao, RelatorioHistorico, TarefaArquivamento, executar_arquivamento, reservar_tarefas_paradas
+from conftest import nova_instalacao
+
+
+def agendar(app, data_inicio, data_fim, estado='pendente', atualizada_em=None):
+    with app.app_context():
+        tarefa = TarefaArquivamento(user_id=1, data_inicio=data_inicio, data_fim=data_fim, total=0, estado=estado,
+                                    atualizada_em=atualizada_em or datetime.datetime.now())
+        db.session.add(tarefa)
+        db.session.commit()
+        return tarefa.id
+
+
+def reserva(tarefa_id):
+    return db.session.get(TarefaArquivamento, tarefa_id).atualizada_em
+
+
+def test_totais_somam_as_linhas_marcadas(app, cliente):
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    nova_instalacao(cliente, 'b', '2025-01-06', combo_key='800_MEGAS')
+    nova_instalacao(cliente, 'fora', '2025-02-01')
+    resposta = cliente.post('/salvar-periodo', data={'start_date': '2025-01-01', 'end_date': '2025-01-31'})
+    assert resposta.status_code == 302
+    with app.app_context():
+        relatorio = RelatorioHistorico.query.one()
+        marcadas = Instalacao.query.filter_by(relatorio_id=relatorio.id).all()
+        assert relatorio.concluido
+        assert relatorio.num_instalacoes == len(marcadas) == 2
+        assert relatorio.total_comissoes_centavos == sum(i.comissao_centavos for i in marcadas)
+
+
+def test_recusa_fecho_sobreposto_a_outro_em_curso(app, cliente):
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    agendar(app, datetime.date(2025, 1, 1), datetime.date(2025, 1, 10), estado='em_andamento')
+    resposta = cliente.post('/salvar-periodo', data={'start_date': '2025-01-05', 'end_date': '2025-01-31'},
+                            headers={'Accept': 'application/json'})
+    assert resposta.status_code == 409
+    with app.app_context():
+        assert TarefaArquivamento.query.count() == 1
+        assert Instalacao.query.filter(Instalacao.relatorio_id.isnot(None)).count() == 0
+
+
+def test_fecho_sem_linhas_por_marcar_nao_deixa_relatorio_vazio(app, cliente):
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    primeira = agendar(app, datetime.date(2025, 1, 1), datetime.date(2025, 1, 31))
+    segunda = agendar(app, datetime.date(2025, 1, 1), datetime.date(2025, 1, 31))
+    with app.app_context():
+        assert executar_arquivamento(primeira, 500, reserva(primeira))
+        assert executar_arquivamento(segunda, 500, reserva(segunda))
+        relatorio = RelatorioHistorico.query.one()
+        assert (relatorio.num_instalacoes, relatorio.total_comissoes_centavos) == (1, Instalacao.query.one().comissao_centavos)
+        assert db.session.get(TarefaArquivamento, segunda).relatorio_id is None
+
+
+def test_retoma_so_as_tarefas_paradas(app):
+    agora = datetime.datetime.now()
+    parada = agendar(app, datetime.date(2025, 1, 1), datetime.date(2025, 1, 31), estado='em_andamento',
+                     atualizada_em=agora - datetime.timedelta(minutes=10))
+    agendar(app, datetime.date(2025, 2, 1), datetime.date(2025, 2, 28), estado='em_andamento', atualizada_em=agora)
+    agendar(app, datetime.date(2025, 3, 1), datetime.date(2025, 3, 31), estado='erro',
+            atualizada_em=agora - datetime.timedelta(minutes=10))
+    with app.app_context():
+        assert reservar_tarefas_paradas(120) == [(parada, reserva(parada))]
+        # Já reservada: outro worker que procure logo a seguir não a encontra.
+        assert reservar_tarefas_paradas(120) == []
+
+
+def test_entrada_antiga_da_fila_nao_volta_a_executar_a_tarefa(app, cliente):
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    antiga = datetime.datetime.now() - datetime.timedelta(minutes=10)
+    tarefa_id = agendar(app, datetime.date(2025, 1, 1), datetime.date(2025, 1, 31), atualizada_em=antiga)
+    with app.app_context():
+        # Outro worker retoma a tarefa parada e conclui-a.
+        [(_, retomada)] = reservar_tarefas_paradas(120)
+        assert executar_arquivamento(tarefa_id, 500, retomada)
+    nova_instalacao(cliente, 'depois', '2025-01-06')
+    with app.app_context():
+        # O worker original chega à sua entrada da fila, com a reserva que viu ao enfileirar.
+        assert not executar_arquivamento(tarefa_id, 500, antiga)
+        relatorio = RelatorioHistorico.query.one()
+        assert (relatorio.num_instalacoes, relatorio.versao) == (1, 1)
+        assert Instalacao.query.filter_by(login_cliente='depois').one().relatorio_id is None
+
+
+def test_so_marca_as_instalacoes_registadas_ate_ao_pedido(app, cliente):
+    nova_instalacao(cliente, 'antes', '2025-01-05')
+    tarefa_id = agendar(app, datetime.date(2025, 1, 1), datetime.date(2025, 1, 31))
+    nova_instalacao(cliente, 'depois', '2025-01-06')
+    with app.app_context():
+        assert executar_arquivamento(tarefa_id, 500, reserva(tarefa_id))
+        assert [i.login_cliente for i in Instalacao.query.filter(Instalacao.relatorio_id.isnot(None))] == ['antes']
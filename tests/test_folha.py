@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from app import db, User, cache_folha
+from conftest import nova_instalacao
+
+
+def folha(cliente):
+    resposta = cliente.get('/admin/folha?inicio=2025-01-01&fim=2025-01-31', headers={'Accept': 'application/json'})
+    assert resposta.status_code == 200
+    return resposta.json
+
+
+def test_totais_por_tecnico_e_cache_invalidado(app, cliente):
+    with app.app_context():
+        admin = User(username='admin', is_admin=True)
+        admin.set_password('senha')
+        db.session.add(admin)
+        db.session.commit()
+    gestor = app.test_client()
+    assert gestor.post('/login', data={'username': 'admin', 'password': 'senha'}).status_code == 302
+    cache_folha._entradas.clear()
+
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    nova_instalacao(cliente, 'b', '2025-01-06', combo_key='800_MEGAS')
+    nova_instalacao(cliente, 'fora', '2025-02-01')
+    nova_instalacao(gestor, 'c', '2025-01-07')
+
+    resultado = folha(gestor)
+    assert (resultado['total_comissoes_centavos'], resultado['num_instalacoes']) == (1500 + 2100 + 1500, 3)
+    assert [(t['username'], t['total_comissoes_centavos'], t['num_instalacoes']) for t in resultado['tecnicos']] == [
+        ('admin', 1500, 1), ('tecnico', 3600, 2)]
+    assert folha(gestor) == resultado
+
+    # Uma alteração de qualquer técnico muda a versão e a folha é recalculada.
+    assert cliente.post('/excluir/2').status_code == 302
+    resultado = folha(gestor)
+    assert [(t['username'], t['total_comissoes_centavos']) for t in resultado['tecnicos']] == [('admin', 1500), ('tecnico', 1500)]
+
+
+def test_folha_so_para_administradores(cliente):
+    assert cliente.get('/admin/folha').status_code == 403
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import datetime
+import io
+
+import app as modulo_app
+from app import db, Instalacao, ResumoDiario
+
+CABECALHO = 'tipo_combo,combo_key,login_cliente,data_instalacao,porcentagem_comissao\n'
+
+
+def importar(cliente, linhas):
+    arquivo = (io.BytesIO((CABECALHO + ''.join(linhas)).encode('utf-8')), 'instalacoes.csv')
+    return cliente.post('/importar', data={'arquivo': arquivo}, headers={'Accept': 'application/json'})
+
+
+def test_importacao_em_lotes_com_erros_por_linha(app, cliente, monkeypatch):
+    monkeypatch.setattr(modulo_app, 'TAMANHO_LOTE_IMPORTACAO', 2)
+    resposta = importar(cliente, [
+        'CIDADE_FIBRA,300_MEGAS,a,2025-01-05,15\n',
+        'CIDADE_FIBRA,300_MEGAS,b,05/01/2025,15\n',
+        'CIDADE_FIBRA,999_MEGAS,c,2025-01-05,15\n',
+        'CIDADE_FIBRA,300_MEGAS,d,2025-01-05,inf\n',
+        'CIDADE_FIBRA,300_MEGAS,e,2025-01-05,1e400\n',
+        'CIDADE_FIBRA,300_MEGAS,f,2025-02-30,15\n',
+        ',,,,\n',
+        'CIDADE_FIBRA,800_MEGAS,g,2025-01-06,\n',
+    ])
+    assert resposta.status_code == 200
+    corpo = resposta.get_json()
+    assert corpo['importadas'] == 3
+    assert [erro['linha'] for erro in corpo['erros']] == [4, 5, 6, 7]
+    with app.app_context():
+        assert sorted(i.login_cliente for i in Instalacao.query) == ['a', 'b', 'g']
+        assert [(r.data, r.total_comissoes_centavos, r.num_instalacoes) for r in ResumoDiario.query.order_by(ResumoDiario.data)] == [
+            (datetime.date(2025, 1, 5), 3000, 2), (datetime.date(2025, 1, 6), 2100, 1)]
+
+
+def test_importacao_sem_arquivo(cliente):
+    resposta = cliente.post('/importar', headers={'Accept': 'application/json'})
+    assert resposta.status_code == 400
+
+
+def test_importacao_em_formulario_mostra_os_erros(app, cliente):
+    resposta = importar(cliente, ['CIDADE_FIBRA,300_MEGAS,a,2025-01-05,1e400\n'])
+    corpo = resposta.get_json()
+    assert corpo['importadas'] == 0 and [erro['linha'] for erro in corpo['erros']] == [2]
+    arquivo = (io.BytesIO((CABECALHO + 'CIDADE_FIBRA,300_MEGAS,a,2025-01-05,inf\n').encode('utf-8')), 'instalacoes.csv')
+    assert cliente.post('/importar', data={'arquivo': arquivo}).status_code == 302
+    assert 'Linha 2: Percentagem de comissão inválida' in cliente.get('/').get_data(as_text=True)
+    with app.app_context():
+        assert db.session.query(Instalacao).count() == 0
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from app import create_app
+
+
+def test_sem_token_nao_ha_metrics(cliente):
+    assert cliente.get('/metrics').status_code == 404
+
+
+def test_metrics_exige_o_token(config):
+    config['METRICAS_TOKEN'] = 'segredo'
+    cliente = create_app(config, migracoes=False).test_client()
+    assert cliente.get('/metrics').status_code == 403
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer outro'}).status_code == 403
+    resposta = cliente.get('/metrics', headers={'Authorization': 'Bearer segredo'})
+    assert resposta.status_code == 200
+    assert resposta.mimetype == 'text/plain'
+
+
+
+def test_instrucao_que_falha_nao_conta_nem_desacerta_as_seguintes(app):
+    from flask import g
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from app import db
+
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        with pytest.raises(OperationalError):
+            db.session.execute(text('SELECT * FROM tabela_que_nao_existe'))
+        db.session.rollback()
+        db.session.execute(text('SELECT 1'))
+        assert g.metricas['sql_instrucoes'] == 1
+        assert 0 <= g.metricas['sql_segundos'] < 1
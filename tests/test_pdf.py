@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from app import Instalacao, linhas_pdf
+from conftest import nova_instalacao
+from pdf import LinhasDemais
+
+
+@pytest.fixture
+def config(config):
+    config['PDF_LINHAS_MAX'] = 2
+    return config
+
+
+def test_linhas_pdf_respeita_o_limite(app, cliente):
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    nova_instalacao(cliente, 'b', '2025-01-06')
+    with app.app_context():
+        assert [linha[2] for linha in linhas_pdf(Instalacao.user_id == 1)] == ['a', 'b']
+        nova_instalacao(cliente, 'c', '2025-01-07')
+        with pytest.raises(LinhasDemais):
+            linhas_pdf(Instalacao.user_id == 1)
+
+
+def test_pdf_acima_do_limite_e_recusado(cliente):
+    for login_cliente in ('a', 'b', 'c'):
+        nova_instalacao(cliente, login_cliente, '2025-01-05')
+    resposta = cliente.get('/relatorio/imprimir.pdf')
+    assert resposta.status_code == 302
+    assert 'exportação CSV' in cliente.get('/').get_data(as_text=True)
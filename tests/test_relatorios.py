@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from conftest import nova_instalacao
+
+
+def test_relatorio_reaberto_nao_fica_em_cache_no_navegador(cliente):
+    nova_instalacao(cliente, 'cliente', '2025-01-05')
+    assert cliente.post('/salvar-periodo', data={'start_date': '2025-01-01', 'end_date': '2025-01-31'}).status_code == 302
+    fechado = cliente.get('/relatorio-historico/1')
+    assert fechado.headers['Cache-Control'] == 'private, no-cache'
+    assert cliente.get('/relatorio-historico/1', headers={'If-None-Match': fechado.headers['ETag']}).status_code == 304
+
+    assert cliente.post('/relatorio-historico/1/reabrir').status_code == 302
+    reaberto = cliente.get('/relatorio-historico/1', headers={'If-None-Match': fechado.headers['ETag']})
+    assert reaberto.status_code == 200
+    assert 'Fechar Período' in reaberto.get_data(as_text=True)
+
+
+def test_cache_so_guarda_paginas_sem_filtro_e_data_e_atual(app, cliente, monkeypatch):
+    import datetime
+    import app as modulo_app
+    from app import cache_relatorios
+
+    nova_instalacao(cliente, 'cliente', '2025-01-05')
+    cliente.post('/salvar-periodo', data={'start_date': '2025-01-01', 'end_date': '2025-01-31'})
+    for filtro in ('a', 'b', 'c'):
+        assert cliente.get(f'/relatorio-historico/1?cliente={filtro}').status_code == 200
+    assert len(cache_relatorios._entradas) == 0
+    assert cliente.get('/relatorio-historico/1?page=9').status_code == 404
+    assert len(cache_relatorios._entradas) == 0
+
+    primeira = cliente.get('/relatorio-historico/1').get_data(as_text=True)
+    assert len(cache_relatorios._entradas) == 1
+
+    class Amanha(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.datetime(2030, 1, 2, 10, 30)
+    monkeypatch.setattr(modulo_app.datetime, 'datetime', Amanha)
+    segunda = cliente.get('/relatorio-historico/1').get_data(as_text=True)
+    assert 'Gerado em: 02/01/2030 às 10:30' in segunda
+    assert 'Gerado em: 02/01/2030' not in primeira
+    assert '<!--data-hoje-->' not in segunda
+
+
+def test_mensagens_aparecem_na_pagina_em_cache(cliente):
+    nova_instalacao(cliente, 'cliente', '2025-01-05')
+    cliente.post('/salvar-periodo', data={'start_date': '2025-01-01', 'end_date': '2025-01-31'})
+    etag = cliente.get('/relatorio-historico/1').headers['ETag']
+
+    assert cliente.post('/relatorio-historico/1/fechar').status_code == 302
+    resposta = cliente.get('/relatorio-historico/1', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert 'Este período não está reaberto.' in resposta.get_data(as_text=True)
+    assert '<!--mensagens-->' not in resposta.get_data(as_text=True)
+
+    seguinte = cliente.get('/relatorio-historico/1')
+    assert 'Este período não está reaberto.' not in seguinte.get_data(as_text=True)
+    assert cliente.get('/relatorio-historico/1', headers={'If-None-Match': etag}).status_code == 304
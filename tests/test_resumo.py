@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from app import db, Instalacao, ResumoDiario
+from conftest import nova_instalacao
+
+
+def resumos():
+    return [(r.data, r.total_comissoes_centavos, r.num_instalacoes) for r in ResumoDiario.query.order_by(ResumoDiario.data)]
+
+
+def editar(cliente, instalacao_id, login_cliente, data, combo_key='300_MEGAS'):
+    return cliente.post(f'/editar/{instalacao_id}', data={'tipo_combo': 'CIDADE_FIBRA', 'combo_key': combo_key, 'login_cliente': login_cliente,
+                                                           'data_instalacao': data, 'porcentagem_comissao': '15'})
+
+
+def test_editar_duas_vezes_a_unica_instalacao_do_dia(app, cliente):
+    nova_instalacao(cliente, 'cliente', '2025-01-05')
+    for vez in range(2):
+        assert editar(cliente, 1, f'cliente {vez}', '2025-01-05').status_code == 302
+        with app.app_context():
+            comissao = db.session.get(Instalacao, 1).comissao_centavos
+            assert resumos() == [(datetime.date(2025, 1, 5), comissao, 1)]
+    assert cliente.post('/excluir/1').status_code == 302
+    with app.app_context():
+        assert resumos() == []
+
+
+def test_editar_muda_a_data_e_o_valor(app, cliente):
+    nova_instalacao(cliente, 'a', '2025-01-05')
+    nova_instalacao(cliente, 'b', '2025-01-05')
+    assert editar(cliente, 2, 'b', '2025-01-06', combo_key='800_MEGAS').status_code == 302
+    with app.app_context():
+        esperado = {}
+        for instalacao in Instalacao.query:
+            total, quantidade = esperado.get(instalacao.data_instalacao, (0, 0))
+            esperado[instalacao.data_instalacao] = (total + instalacao.comissao_centavos, quantidade + 1)
+        assert resumos() == [(data, total, quantidade) for data, (total, quantidade) in sorted(esperado.items())]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from app import limite_bcrypt, limite_login_ip, limite_login_usuario
+
+
+@pytest.fixture
+def config(config, request):
+    config.update(getattr(request, 'param', {}))
+    return config
+
+
+def test_logout_apaga_o_cache_do_navegador(cliente):
+    resposta = cliente.get('/logout')
+    assert resposta.status_code == 302
+    assert resposta.headers['Clear-Site-Data'] == '"cache"'
+
+
+def falhar_login(cliente, ip):
+    return cliente.post('/login', data={'username': 'tecnico', 'password': 'errada'}, headers={'X-Forwarded-For': ip})
+
+
+@pytest.mark.parametrize('config, outro_cliente', [
+    ({'PROXY_SALTOS': 1, 'LOGIN_MAX_TENTATIVAS_IP': 2, 'LOGIN_MAX_TENTATIVAS_USUARIO': 100}, 200),
+    # Sem ProxyFix todos os clientes partilham o IP do proxy.
+    ({'PROXY_SALTOS': 0, 'LOGIN_MAX_TENTATIVAS_IP': 2, 'LOGIN_MAX_TENTATIVAS_USUARIO': 100}, 429),
+], indirect=['config'])
+def test_limite_por_ip_atras_do_proxy(app, outro_cliente):
+    cliente = app.test_client()
+    try:
+        for _ in range(2):
+            assert falhar_login(cliente, '203.0.113.1').status_code == 200
+        assert falhar_login(cliente, '203.0.113.1').status_code == 429
+        assert falhar_login(cliente, '203.0.113.2').status_code == outro_cliente
+    finally:
+        # Os limites guardam as tentativas no processo; não passam para os outros testes.
+        limite_login_ip._tentativas.clear()
+        limite_login_usuario._tentativas.clear()
+
+
+def test_bcrypt_sem_vaga_recusa_na_hora(app):
+    cliente = app.test_client()
+    assert limite_bcrypt._vagas.acquire(blocking=False)
+    try:
+        assert cliente.post('/login', data={'username': 'tecnico', 'password': 'senha'}).status_code == 503
+    finally:
+        limite_bcrypt._vagas.release()
+    assert cliente.post('/login', data={'username': 'tecnico', 'password': 'senha'}).status_code == 302